@@ -13,11 +13,394 @@ Funcionalidades:
 Nota: Este módulo pode usar OpenAI, Anthropic, ou modelos locais via Ollama.
 """
 
+import json
 import logging
 import os
-from typing import List, Dict, Optional
+import re
+import sqlite3
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from typing import List, Dict, Optional, Tuple
+import numpy as np
 import pandas as pd
 
+from chatbot_sql import (
+    QueryTimeoutError,
+    connect_read_only,
+    fill_sql_template,
+    question_template,
+    run_bounded_query,
+    sql_template_cache,
+    sql_to_template,
+)
+from data_loader import stats_from_summary
+from llm_client import (
+    RateLimiter,
+    TokenBudget,
+    budget_limit,
+    chat_completion,
+    estimate_tokens,
+    get_client,
+    llm_settings,
+)
+from utils import ensure_dir
+
+DEFAULT_CATEGORY = 'outro'
+
+# Nota abaixo da qual o imóvel entra nos alertas de qualidade
+LOW_RATING_THRESHOLD = 4.0
+
+FEEDBACK_TEXT_COLUMNS = ['feedback_text', 'comentarios_qualitativos']
+
+# Categorias do classificador por palavras-chave, em ordem de precedência:
+# um texto que casa com várias categorias recebe a primeira da lista. As mais
+# específicas (wifi, água quente, estacionamento, barulho) vêm antes das que
+# usam termos genéricos ('local', 'acesso', 'contato', 'entrada').
+KEYWORD_CATEGORIES = [
+    ('wifi', ['wifi', 'wi-fi', 'internet', 'conexão']),
+    ('água quente', ['água', 'chuveiro', 'banho', 'quente']),
+    ('estacionamento', ['estacionamento', 'garagem', 'vaga', 'carro']),
+    ('barulho', ['barulho', 'ruído', 'barulhento', 'silencioso']),
+    ('limpeza', ['sujo', 'limpo', 'limpeza', 'sujeira', 'higiene']),
+    ('equipamentos', ['equipamento', 'aparelho', 'eletrodoméstico', 'tv', 'geladeira']),
+    ('manutenção', ['quebrado', 'estragado', 'manutenção', 'defeito', 'conserto']),
+    ('check-in', ['check-in', 'checkin', 'entrada', 'chave', 'recepção']),
+    ('comunicação', ['comunicação', 'resposta', 'contato', 'atendimento']),
+    ('localização', ['localização', 'local', 'distante', 'longe', 'acesso']),
+]
+
+# Categorias aceitas na classificação com IA
+CLASSIFY_CATEGORIES = [category for category, _ in KEYWORD_CATEGORIES] + [DEFAULT_CATEGORY]
+
+# Palavra-chave -> posição da categoria em KEYWORD_CATEGORIES
+KEYWORD_RANK = {
+    keyword: rank
+    for rank, (_, keywords) in enumerate(KEYWORD_CATEGORIES)
+    for keyword in keywords
+}
+
+# Todas as palavras-chave numa única regex pré-compilada (mais longas primeiro),
+# para classificar um texto avulso: a categoria é a de menor posição entre as
+# encontradas. Nenhuma palavra-chave contém outra de categoria diferente, então
+# os casamentos sem sobreposição de findall não escondem categorias.
+KEYWORD_PATTERN = re.compile(
+    '|'.join(re.escape(k) for k in sorted(KEYWORD_RANK, key=len, reverse=True))
+)
+
+# Uma regex por categoria, na ordem de KEYWORD_CATEGORIES (classificação por coluna)
+KEYWORD_CATEGORY_PATTERNS = [
+    '|'.join(re.escape(k) for k in keywords) for _, keywords in KEYWORD_CATEGORIES
+]
+
+
+def feedback_text(df: pd.DataFrame) -> pd.Series:
+    """
+    Texto livre dos feedbacks: 'feedback_text' ou, no formato da API,
+    'comentarios_qualitativos'. Vazio se nenhuma das colunas existir.
+    """
+    for column in FEEDBACK_TEXT_COLUMNS:
+        if column in df:
+            return df[column].fillna('').astype(str)
+    return pd.Series('', index=df.index, dtype=object)
+
+
+def _fold_text(texts: pd.Series) -> pd.Series:
+    """
+    Casefold e remoção de acentos ("Não" -> "nao").
+    """
+    return (
+        texts.fillna('').astype(str).str.casefold()
+        .str.normalize('NFKD')
+        .str.encode('ascii', 'ignore').str.decode('ascii')
+    )
+
+
+def normalize_feedback_text(texts: pd.Series) -> pd.Series:
+    """
+    Forma canônica para deduplicar feedbacks: casefold, sem acentos e com
+    pontuação e espaços colapsados ("Wi-Fi não funciona!" -> "wi fi nao funciona").
+    """
+    return _fold_text(texts).str.replace(r'[\W_]+', ' ', regex=True).str.strip()
+
+
+def parse_categories(content: str, expected: int) -> List[str]:
+    """
+    Interpreta a resposta de um lote: array JSON com `expected` categorias.
+    Categorias fora da lista viram 'outro'. Levanta ValueError se o formato não bate.
+    """
+    start, end = content.find('['), content.rfind(']')
+    if start < 0 or end < start:
+        raise ValueError("resposta sem array JSON")
+    categories = json.loads(content[start:end + 1])
+    if not isinstance(categories, list) or len(categories) != expected:
+        raise ValueError(f"esperadas {expected} categorias, recebidas {len(categories)}")
+    allowed = set(CLASSIFY_CATEGORIES)
+    normalized = [str(c).strip().lower() for c in categories]
+    return [c if c in allowed else DEFAULT_CATEGORY for c in normalized]
+
+
+_TOKEN_PATTERN = re.compile(r'[^\W_]+')
+
+
+def _tokenize(texts: pd.Series) -> List[List[str]]:
+    """
+    Palavras de cada texto, nos mesmos termos de normalize_feedback_text.
+    """
+    return [_TOKEN_PATTERN.findall(text) for text in _fold_text(texts)]
+
+
+class OfflineFeedbackClassifier:
+    """
+    Classificador estatístico de feedbacks, sem chamadas externas: TF-IDF de
+    palavras e bigramas e centróide mais próximo por similaridade de cosseno,
+    tudo com NumPy. Treinado com os feedbacks já classificados pelo LLM e
+    salvo em disco (.npz).
+
+    Bigramas são identificados pelo par de ids das palavras (id_a * V + id_b),
+    o que evita montar strings para eles. Espaço de features: V palavras
+    seguidas dos bigramas conhecidos.
+    """
+
+    def __init__(
+        self,
+        vocab: np.ndarray,
+        bigrams: np.ndarray,
+        idf: np.ndarray,
+        centroids: np.ndarray,
+        classes: np.ndarray
+    ):
+        self.vocab = vocab
+        self.bigrams = bigrams
+        self.idf = idf
+        self.centroids = centroids
+        self.classes = classes
+        self._vocab_index = pd.Index(vocab)
+        self._bigram_index = pd.Index(bigrams)
+
+    @staticmethod
+    def _pairs(token_lists: List[List[str]], vocab_index: pd.Index):
+        """
+        Pares (documento, id da palavra) e (documento, chave do bigrama) para
+        palavras presentes no vocabulário.
+        """
+        lengths = np.fromiter(map(len, token_lists), dtype=np.int64, count=len(token_lists))
+        docs = np.repeat(np.arange(len(token_lists)), lengths)
+        words = np.fromiter(chain.from_iterable(token_lists), dtype=object, count=int(lengths.sum()))
+        word_ids = vocab_index.get_indexer(words)
+
+        # Bigramas: palavras vizinhas do mesmo documento, ambas conhecidas
+        adjacent = (docs[1:] == docs[:-1]) & (word_ids[1:] >= 0) & (word_ids[:-1] >= 0)
+        bigram_keys = word_ids[:-1][adjacent] * len(vocab_index) + word_ids[1:][adjacent]
+        known = word_ids >= 0
+        return docs[known], word_ids[known], docs[:-1][adjacent], bigram_keys
+
+    @classmethod
+    def fit(cls, texts: pd.Series, labels: pd.Series) -> "OfflineFeedbackClassifier":
+        token_lists = _tokenize(texts)
+        n_docs = len(token_lists)
+        vocab = np.unique(np.fromiter(chain.from_iterable(token_lists), dtype=object).astype(str))
+        word_docs, word_ids, bigram_docs, bigram_keys = cls._pairs(token_lists, pd.Index(vocab))
+        bigrams, bigram_ids = np.unique(bigram_keys, return_inverse=True)
+
+        docs = np.concatenate([word_docs, bigram_docs])
+        terms = np.concatenate([word_ids, len(vocab) + bigram_ids])
+        n_terms = len(vocab) + len(bigrams)
+
+        # Frequência de cada termo por documento e em quantos documentos aparece
+        pairs, tf = np.unique(docs * n_terms + terms, return_counts=True)
+        pair_docs, pair_terms = pairs // n_terms, pairs % n_terms
+        doc_freq = np.bincount(pair_terms, minlength=n_terms)
+        idf = np.log((1 + n_docs) / (1 + doc_freq)) + 1
+
+        # Vetores TF-IDF normalizados, somados por classe e normalizados de novo
+        weights = tf * idf[pair_terms]
+        norms = np.sqrt(np.bincount(pair_docs, weights=weights ** 2, minlength=n_docs))
+        weights = weights / norms[pair_docs]
+        classes, y = np.unique(labels.astype(str).to_numpy(), return_inverse=True)
+        centroids = np.bincount(
+            y[pair_docs] * n_terms + pair_terms, weights=weights, minlength=len(classes) * n_terms
+        ).reshape(len(classes), n_terms)
+        centroid_norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        centroids = centroids / np.where(centroid_norms > 0, centroid_norms, 1)
+        return cls(vocab, bigrams, idf, centroids, classes)
+
+    def predict(self, texts: pd.Series) -> np.ndarray:
+        """
+        Categoria prevista por texto; None quando nenhum termo é conhecido.
+        """
+        token_lists = _tokenize(texts)
+        word_docs, word_ids, bigram_docs, bigram_keys = self._pairs(token_lists, self._vocab_index)
+        bigram_ids = self._bigram_index.get_indexer(bigram_keys)
+        known = bigram_ids >= 0
+        docs = np.concatenate([word_docs, bigram_docs[known]])
+        terms = np.concatenate([word_ids, len(self.vocab) + bigram_ids[known]])
+
+        # Similaridade com cada centróide (a norma do documento não muda o argmax)
+        weights = self.idf[terms]
+        scores = np.vstack([
+            np.bincount(docs, weights=weights * centroid[terms], minlength=len(token_lists))
+            for centroid in self.centroids
+        ])
+        predicted = self.classes.astype(object)[scores.argmax(axis=0)]
+        predicted[scores.max(axis=0) <= 0] = None
+        return predicted
+
+    def accuracy(self, texts: pd.Series, labels: pd.Series) -> float:
+        predicted = self.predict(texts)
+        return float(np.mean(predicted == labels.astype(str).to_numpy())) if len(predicted) else 0.0
+
+    def save(self, path: str) -> None:
+        ensure_dir(os.path.dirname(path) or ".")
+        tmp_path = path + ".tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            vocab=self.vocab.astype(str),
+            bigrams=self.bigrams,
+            idf=self.idf,
+            centroids=self.centroids,
+            classes=self.classes.astype(str),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "OfflineFeedbackClassifier":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                data["vocab"], data["bigrams"], data["idf"], data["centroids"], data["classes"]
+            )
+
+
+# Léxico de polaridade (forma sem acentos, como sai de _tokenize): peso de
+# -2 (muito negativo) a +2 (muito positivo). Sem stemming: flexões comuns
+# entram como palavras próprias.
+SENTIMENT_LEXICON = {
+    # Positivas
+    'excelente': 2, 'otimo': 2, 'otima': 2, 'perfeito': 2, 'perfeita': 2,
+    'maravilhoso': 2, 'maravilhosa': 2, 'incrivel': 2, 'impecavel': 2,
+    'adorei': 2, 'amei': 2, 'recomendo': 2, 'sensacional': 2, 'fantastico': 2,
+    'bom': 1, 'boa': 1, 'bons': 1, 'boas': 1, 'gostei': 1, 'limpo': 1, 'limpa': 1,
+    'confortavel': 1, 'aconchegante': 1, 'agradavel': 1, 'tranquilo': 1,
+    'tranquila': 1, 'silencioso': 1, 'silenciosa': 1, 'lindo': 1, 'linda': 1,
+    'bonito': 1, 'bonita': 1, 'atencioso': 1, 'atenciosa': 1, 'prestativo': 1,
+    'prestativa': 1, 'educado': 1, 'rapido': 1, 'rapida': 1, 'facil': 1,
+    'pratico': 1, 'organizado': 1, 'organizada': 1, 'funciona': 1, 'funcionou': 1,
+    'funcionando': 1, 'seguro': 1, 'segura': 1, 'espacoso': 1, 'espacosa': 1,
+    'satisfeito': 1, 'satisfeita': 1, 'obrigado': 1, 'obrigada': 1,
+    # Negativas
+    'pessimo': -2, 'pessima': -2, 'horrivel': -2, 'terrivel': -2, 'nojento': -2,
+    'nojenta': -2, 'decepcionante': -2, 'decepcao': -2, 'absurdo': -2,
+    'inaceitavel': -2, 'odiei': -2, 'lamentavel': -2,
+    'ruim': -1, 'ruins': -1, 'sujo': -1, 'suja': -1, 'sujos': -1, 'sujas': -1,
+    'sujeira': -1, 'barulho': -1, 'barulhento': -1, 'barulhenta': -1,
+    'quebrado': -1, 'quebrada': -1, 'quebrou': -1, 'estragado': -1,
+    'estragada': -1, 'problema': -1, 'problemas': -1, 'defeito': -1,
+    'demora': -1, 'demorou': -1, 'demorado': -1, 'atraso': -1, 'atrasou': -1,
+    'lento': -1, 'lenta': -1, 'falha': -1, 'falhou': -1, 'falta': -1,
+    'faltou': -1, 'faltando': -1, 'mofo': -1, 'fedor': -1, 'desconfortavel': -1,
+    'apertado': -1, 'apertada': -1, 'caro': -1, 'cara': -1, 'inseguro': -1,
+    'insegura': -1, 'infelizmente': -1, 'reclamar': -1, 'reclamacao': -1,
+    'dificil': -1, 'vazamento': -1, 'goteira': -1, 'insuficiente': -1,
+    'precario': -1, 'precaria': -1, 'desorganizado': -1, 'mal': -1,
+}
+
+# Palavras que invertem a polaridade dos termos seguintes ("não funciona",
+# "sem problemas", "nada a reclamar")
+NEGATION_WORDS = ['nao', 'nem', 'nunca', 'jamais', 'sem', 'nada', 'nenhum', 'nenhuma']
+NEGATION_WINDOW = 3
+
+# |score| mínimo para positivo/negativo; abaixo disso, neutro
+SENTIMENT_THRESHOLD = 0.25
+
+_JOINED_TOKEN_PATTERN = re.compile(r'[a-z0-9]+|\x1e')
+_LEXICON_INDEX = pd.Index(list(SENTIMENT_LEXICON))
+_LEXICON_POLARITY = np.array(list(SENTIMENT_LEXICON.values()), dtype=np.float64)
+_NEGATION_INDEX = pd.Index(NEGATION_WORDS)
+
+
+def _tokenize_joined(texts) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Palavras (nos termos de _tokenize) de vários textos, como um par de
+    arrays (índice do texto, palavra). Os textos são unidos por um separador
+    (RS, \\x1e) e normalizados e tokenizados de uma vez, bem mais rápido
+    que texto a texto.
+    """
+    texts = np.asarray(texts, dtype=object).tolist()
+    joined = '\x1e'.join(texts)
+    if joined.count('\x1e') > len(texts) - 1:
+        joined = '\x1e'.join(text.replace('\x1e', ' ') for text in texts)
+    joined = unicodedata.normalize('NFKD', joined.casefold())
+    tokens = _JOINED_TOKEN_PATTERN.findall(joined.encode('ascii', 'ignore').decode('ascii'))
+    tokens = np.array(tokens, dtype=object)
+    breaks = tokens == '\x1e'
+    docs = np.cumsum(breaks)
+    return docs[~breaks], tokens[~breaks]
+
+
+def lexicon_sentiment(texts: pd.Series) -> pd.DataFrame:
+    """
+    Sentimento por léxico, sem chamadas externas: sentiment_score em [-1, 1],
+    sentiment_label (positivo, negativo ou neutro) e sentiment_ambiguous.
+
+    Todas as palavras dos textos únicos viram um único array; a polaridade sai
+    de uma busca no índice do léxico, a negação de comparações com o array
+    deslocado (negador até NEGATION_WINDOW palavras antes, no mesmo texto) e
+    o score de bincount por texto: soma das polaridades dividida pela soma dos
+    pesos (mínimo 2, para que um único "bom" não valha tanto quanto "ótimo").
+
+    Ambíguos: textos com termos positivos e negativos que se anulam, ou com
+    4+ palavras e nenhum termo do léxico.
+    """
+    codes, uniques = pd.factorize(texts.fillna('').astype(str))
+    n_docs = len(uniques)
+    docs, words = _tokenize_joined(uniques)
+    lengths = np.bincount(docs, minlength=n_docs)
+
+    ids = _LEXICON_INDEX.get_indexer(words)
+    polarity = np.where(ids >= 0, _LEXICON_POLARITY[ids], 0.0)
+    negator = _NEGATION_INDEX.get_indexer(words) >= 0
+    negated = np.zeros(len(words), dtype=bool)
+    for k in range(1, NEGATION_WINDOW + 1):
+        negated[k:] |= negator[:-k] & (docs[k:] == docs[:-k])
+    polarity = np.where(negated, -polarity, polarity)
+
+    total = np.bincount(docs, weights=polarity, minlength=n_docs)
+    weight = np.bincount(docs, weights=np.abs(polarity), minlength=n_docs)
+    positive = np.bincount(docs, weights=polarity > 0, minlength=n_docs) > 0
+    negative = np.bincount(docs, weights=polarity < 0, minlength=n_docs) > 0
+    score = total / np.maximum(weight, 2.0)
+
+    label = np.select(
+        [score >= SENTIMENT_THRESHOLD, score <= -SENTIMENT_THRESHOLD],
+        ['positivo', 'negativo'],
+        'neutro',
+    ).astype(object)
+    ambiguous = (
+        (positive & negative & (np.abs(score) < SENTIMENT_THRESHOLD))
+        | ((weight == 0) & (lengths >= 4))
+    )
+    return pd.DataFrame({
+        'sentiment_score': score[codes].round(3),
+        'sentiment_label': label[codes],
+        'sentiment_ambiguous': ambiguous[codes],
+    }, index=texts.index)
+
+
+def parse_scores(content: str, expected: int) -> List[float]:
+    """
+    Interpreta a resposta de um lote de sentimento: array JSON com `expected`
+    scores, limitados a [-1, 1]. Levanta ValueError se o formato não bate.
+    """
+    start, end = content.find('['), content.rfind(']')
+    if start < 0 or end < start:
+        raise ValueError("resposta sem array JSON")
+    scores = json.loads(content[start:end + 1])
+    if not isinstance(scores, list) or len(scores) != expected:
+        raise ValueError(f"esperados {expected} scores, recebidos {len(scores)}")
+    return [min(max(float(score), -1.0), 1.0) for score in scores]
+
+
 class AIInsightsGenerator:
     """
     Gerador de insights inteligentes usando LLM.
@@ -27,6 +410,16 @@ class AIInsightsGenerator:
         self.api_key = os.getenv("OPENAI_API_KEY", "")
         self.model = os.getenv("LLM_MODEL", "gpt-4")
         self.enabled = bool(self.api_key)
+        # Motor de classificação: auto (LLM, senão offline, senão palavras-chave),
+        # llm, offline ou keywords
+        self.classifier_engine = os.getenv("CLASSIFIER_ENGINE", "auto").lower()
+        self.offline_model_path = os.getenv(
+            "OFFLINE_CLASSIFIER_PATH", "data/feedback_classifier.npz"
+        )
+        self._offline_model = None
+        # Revisão pelo LLM dos feedbacks que o léxico não resolve
+        self.sentiment_llm_refine = os.getenv("SENTIMENT_LLM_REFINE", "true").lower() in ("1", "true", "yes")
+        self.sentiment_llm_max_texts = int(os.getenv("SENTIMENT_LLM_MAX_TEXTS", "200"))
         
         if not self.enabled:
             logging.warning(
@@ -40,116 +433,417 @@ class AIInsightsGenerator:
         
         Categorias: limpeza, manutenção, check-in, localização, 
                    comunicação, equipamentos, barulho, etc.
+
+        Feedbacks com o mesmo texto normalizado (normalize_feedback_text) são
+        classificados uma única vez e a categoria é replicada para todos.
         """
-        if not self.enabled:
-            logging.info("IA desabilitada - usando classificação por palavras-chave")
-            return self._classify_by_keywords(feedback_df)
+        texts = feedback_text(feedback_df)
+        codes, uniques = pd.factorize(normalize_feedback_text(texts))
+        # Um texto original representante por texto normalizado
+        first_rows = pd.Series(codes).drop_duplicates().index.to_numpy()
+        unique_df = pd.DataFrame({'feedback_text': texts.to_numpy()[first_rows]})
+
+        if len(codes):
+            logging.info(
+                f"Deduplicação de feedbacks: {len(codes)} textos -> {len(uniques)} únicos "
+                f"({1 - len(uniques) / len(codes):.0%} removidos)"
+            )
+
+        result = self._classify_unique(unique_df)
+        classified = feedback_df.copy()
+        for column in ('ai_category', 'ai_source'):
+            classified[column] = result[column].to_numpy()[codes] if len(codes) else None
+        return classified
+
+    def _classify_unique(self, feedback_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Classifica feedbacks já deduplicados.
+
+        Com IA, os feedbacks são enviados em lotes (LLM_CLASSIFY_BATCH_SIZE
+        por prompt, resposta em array JSON) processados em paralelo
+        (LLM_MAX_CONCURRENCY), respeitando LLM_REQUESTS_PER_MINUTE e
+        LLM_TOKEN_BUDGET. Lotes que falham, ou que não cabem no orçamento,
+        ficam com a classificação por palavras-chave.
+
+        A coluna ai_source registra a origem de cada categoria (llm, offline
+        ou keywords).
+        """
+        if not self.enabled or self.classifier_engine not in ('auto', 'llm'):
+            return self._classify_without_llm(feedback_df)
         
         logging.info("Classificando feedbacks com IA...")
         
         try:
-            import openai
-            openai.api_key = self.api_key
-            
-            classified = feedback_df.copy()
-            
-            for idx, row in classified.iterrows():
-                feedback_text = row.get('feedback_text', '')
-                
-                if pd.isna(feedback_text) or len(feedback_text.strip()) < 10:
-                    continue
-                
-                prompt = f"""
-Classifique o seguinte feedback de hóspede em UMA das categorias:
-- limpeza
-- manutenção
-- check-in
-- localização
-- comunicação
-- equipamentos
-- barulho
-- wifi
-- água quente
-- estacionamento
-- outro
-
-Feedback: "{feedback_text}"
-
-Responda apenas com o nome da categoria, nada mais.
-"""
-                
-                try:
-                    response = openai.ChatCompletion.create(
-                        model=self.model,
-                        messages=[{"role": "user", "content": prompt}],
-                        max_tokens=10,
-                        temperature=0
-                    )
-                    
-                    category = response.choices[0].message.content.strip().lower()
-                    classified.at[idx, 'ai_category'] = category
-                    
-                except Exception as e:
-                    logging.warning(f"Erro ao classificar feedback {idx}: {e}")
-                    continue
-            
-            return classified
-            
+            get_client()
         except ImportError:
             logging.warning("Biblioteca openai não instalada. Usando classificação simples.")
-            return self._classify_by_keywords(feedback_df)
+            return self._classify_without_llm(feedback_df)
+
+        classified = self._classify_by_keywords(feedback_df)
+        texts = feedback_text(classified).str.strip()
+        # Textos muito curtos não têm conteúdo para o LLM: ficam com as palavras-chave
+        pending = texts[texts.str.len() >= 10]
+        if pending.empty:
+            return classified
+
+        settings = llm_settings()
+        batch_size = max(settings["classify_batch_size"], 1)
+        batches = [
+            pending.iloc[start:start + batch_size]
+            for start in range(0, len(pending), batch_size)
+        ]
+        limiter = RateLimiter(settings["requests_per_minute"])
+        budget = TokenBudget(settings["token_budget"])
+
+        start_time = time.perf_counter()
+        failed = 0
+        with ThreadPoolExecutor(max_workers=max(settings["max_concurrency"], 1)) as executor:
+            futures = [
+                executor.submit(self._classify_batch, batch, limiter, budget)
+                for batch in batches
+            ]
+            for batch, future in zip(batches, futures):
+                categories = future.result()
+                if categories is None:
+                    failed += 1
+                    continue
+                classified.loc[batch.index, 'ai_category'] = categories
+                classified.loc[batch.index, 'ai_source'] = 'llm'
+
+        logging.info(
+            f"Classificação com IA: {len(pending)} feedbacks em {len(batches)} lotes "
+            f"({failed} com fallback por palavras-chave) em {time.perf_counter() - start_time:.1f}s"
+        )
+        budget.log_usage("Classificação com IA")
+        return classified
+
+    def _classify_batch(
+        self,
+        batch: pd.Series,
+        limiter: RateLimiter,
+        budget: TokenBudget
+    ) -> Optional[List[str]]:
+        """
+        Classifica um lote de feedbacks numa única chamada. Retorna uma
+        categoria por texto, ou None (o lote fica com as palavras-chave).
+        """
+        items = "\n".join(
+            f"{i}. {json.dumps(text, ensure_ascii=False)}"
+            for i, text in enumerate(batch.tolist(), start=1)
+        )
+        prompt = f"""
+Classifique cada feedback de hóspede abaixo em UMA das categorias:
+{', '.join(CLASSIFY_CATEGORIES)}
+
+Feedbacks:
+{items}
+
+Responda apenas com um array JSON com {len(batch)} categorias, na mesma ordem dos feedbacks.
+Exemplo: ["limpeza", "wifi", "outro"]
+"""
+        max_tokens = 8 * len(batch) + 20
+        estimate = estimate_tokens(prompt) + max_tokens
+        if not budget.reserve(estimate):
+            logging.warning(
+                f"Orçamento de tokens esgotado: lote de {len(batch)} feedbacks "
+                "fica com a classificação por palavras-chave"
+            )
+            return None
+
+        used = None
+        try:
+            response = chat_completion(
+                [{"role": "user", "content": prompt}],
+                model=self.model,
+                max_tokens=max_tokens,
+                temperature=0,
+                limiter=limiter,
+                call_site="classificacao",
+            )
+            if not response["cached"]:
+                used = response["prompt_tokens"] + response["completion_tokens"] or estimate
+            return parse_categories(response["content"], len(batch))
         except Exception as e:
-            logging.error(f"Erro na classificação com IA: {e}")
-            return self._classify_by_keywords(feedback_df)
-    
+            logging.warning(f"Erro ao classificar lote de {len(batch)} feedbacks: {e}")
+            return None
+        finally:
+            budget.settle(estimate, used)
+
+    def _classify_without_llm(self, df: pd.DataFrame) -> pd.DataFrame:
+        if self.classifier_engine in ('auto', 'offline'):
+            model = self._load_offline_model()
+            if model is not None:
+                return self._classify_offline(df, model)
+        logging.info("IA desabilitada - usando classificação por palavras-chave")
+        return self._classify_by_keywords(df)
+
+    def _load_offline_model(self) -> Optional[OfflineFeedbackClassifier]:
+        if self._offline_model is None and os.path.exists(self.offline_model_path):
+            try:
+                self._offline_model = OfflineFeedbackClassifier.load(self.offline_model_path)
+            except (OSError, ValueError, KeyError) as e:
+                logging.warning(f"Classificador offline inválido ({self.offline_model_path}): {e}")
+        return self._offline_model
+
+    def _classify_offline(self, df: pd.DataFrame, model: OfflineFeedbackClassifier) -> pd.DataFrame:
+        """
+        Classificação com o modelo offline; textos sem nenhum termo conhecido
+        ficam com as palavras-chave.
+        """
+        logging.info("Classificando feedbacks com o classificador offline...")
+        classified = self._classify_by_keywords(df)
+        predicted = model.predict(feedback_text(classified))
+        known = pd.notna(predicted)
+        classified.loc[known, 'ai_category'] = predicted[known]
+        classified.loc[known, 'ai_source'] = 'offline'
+        return classified
+
+    def train_offline_classifier(
+        self,
+        labelled: pd.DataFrame,
+        holdout: float = 0.2,
+        min_samples: int = 50
+    ) -> Optional[Dict]:
+        """
+        Treina o classificador offline com feedbacks classificados pelo LLM
+        (feedback_text, ai_category), mede a acurácia contra os rótulos do LLM
+        numa amostra separada e salva o modelo treinado com todos os dados.
+
+        A amostra de validação é sorteada por texto normalizado
+        (normalize_feedback_text): feedbacks repetidos ficam todos do mesmo
+        lado, para que a acurácia não conte textos já vistos no treino.
+        """
+        labelled = labelled.dropna(subset=['feedback_text', 'ai_category'])
+        if len(labelled) < min_samples:
+            logging.info(
+                f"Classificador offline não treinado: {len(labelled)} feedbacks rotulados "
+                f"(mínimo {min_samples})"
+            )
+            return None
+
+        start = time.perf_counter()
+        codes, uniques = pd.factorize(normalize_feedback_text(labelled['feedback_text']))
+        test_mask = (np.random.default_rng(42).random(len(uniques)) < holdout)[codes]
+        train, test = labelled[~test_mask], labelled[test_mask]
+        accuracy = OfflineFeedbackClassifier.fit(
+            train['feedback_text'], train['ai_category']
+        ).accuracy(test['feedback_text'], test['ai_category'])
+
+        model = OfflineFeedbackClassifier.fit(labelled['feedback_text'], labelled['ai_category'])
+        model.save(self.offline_model_path)
+        self._offline_model = model
+        logging.info(
+            f"Classificador offline treinado com {len(labelled)} feedbacks em "
+            f"{time.perf_counter() - start:.2f}s: acurácia {accuracy:.1%} contra o LLM "
+            f"({len(test)} de validação), salvo em {self.offline_model_path}"
+        )
+        return {"samples": len(labelled), "holdout": len(test), "accuracy": accuracy}
+
     def _classify_by_keywords(self, df: pd.DataFrame) -> pd.DataFrame:
         """
-        Classificação simples por palavras-chave.
-        """
-        categories_keywords = {
-            'limpeza': ['sujo', 'limpo', 'limpeza', 'sujeira', 'higiene'],
-            'manutenção': ['quebrado', 'estragado', 'manutenção', 'defeito', 'conserto'],
-            'check-in': ['check-in', 'checkin', 'entrada', 'chave', 'recepção'],
-            'localização': ['localização', 'local', 'distante', 'longe', 'acesso'],
-            'comunicação': ['comunicação', 'resposta', 'contato', 'atendimento'],
-            'equipamentos': ['equipamento', 'aparelho', 'eletrodoméstico', 'tv', 'geladeira'],
-            'barulho': ['barulho', 'ruído', 'barulhento', 'silencioso'],
-            'wifi': ['wifi', 'wi-fi', 'internet', 'conexão'],
-            'água quente': ['água', 'chuveiro', 'banho', 'quente'],
-            'estacionamento': ['estacionamento', 'garagem', 'vaga', 'carro'],
-        }
-        
+        Classificação simples por palavras-chave, vetorizada sobre o texto do
+        feedback. Quando um texto casa com mais de uma categoria, vale a
+        primeira na ordem de KEYWORD_CATEGORIES; sem casamento, 'outro'.
+
+        Textos repetidos são classificados uma única vez (factorize). Cada
+        categoria é um str.contains sobre a coluna de textos únicos, na ordem
+        de precedência e só sobre os que ainda não casaram com nenhuma: o
+        primeiro casamento é a menor posição.
+        """
         classified = df.copy()
-        classified['ai_category'] = 'outro'
-        
-        for category, keywords in categories_keywords.items():
-            for idx, row in classified.iterrows():
-                text = str(row.get('feedback_text', '')).lower()
-                if any(keyword in text for keyword in keywords):
-                    classified.at[idx, 'ai_category'] = category
-                    break
-        
+        codes, uniques = pd.factorize(feedback_text(classified).str.lower())
+        uniques = pd.Series(uniques, dtype=object)
+
+        ranks = np.full(len(uniques), len(KEYWORD_CATEGORIES), dtype=np.int64)
+        pending = np.arange(len(uniques))
+        for rank, pattern in enumerate(KEYWORD_CATEGORY_PATTERNS):
+            if not len(pending):
+                break
+            hit = uniques.iloc[pending].str.contains(pattern, regex=True).to_numpy(dtype=bool)
+            ranks[pending[hit]] = rank
+            pending = pending[~hit]
+
+        categories = np.array(CLASSIFY_CATEGORIES, dtype=object)
+        classified['ai_category'] = categories[ranks][codes]
+        classified['ai_source'] = 'keywords'
         return classified
-    
-    def generate_executive_summary(self, unified_df: pd.DataFrame, month: str) -> str:
+
+    def analyze_sentiment(self, feedback_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Sentimento de cada feedback pelo léxico (lexicon_sentiment), sem LLM.
+
+        Com IA e SENTIMENT_LLM_REFINE, os textos ambíguos (até
+        SENTIMENT_LLM_MAX_TEXTS únicos) são reavaliados pelo LLM em lotes;
+        sentiment_source registra a origem (lexicon ou llm).
+        """
+        start = time.perf_counter()
+        scored = feedback_df.copy()
+        result = lexicon_sentiment(feedback_text(scored))
+        scored['sentiment_score'] = result['sentiment_score'].to_numpy()
+        scored['sentiment_label'] = result['sentiment_label'].to_numpy()
+        scored['sentiment_source'] = 'lexicon'
+        ambiguous = result['sentiment_ambiguous'].to_numpy()
+        logging.info(
+            f"Sentimento por léxico: {len(scored)} feedbacks ({int(ambiguous.sum())} ambíguos) "
+            f"em {time.perf_counter() - start:.2f}s"
+        )
+
+        if self.enabled and self.sentiment_llm_refine and ambiguous.any():
+            self._refine_sentiment(scored, ambiguous)
+        return scored
+
+    def _refine_sentiment(self, scored: pd.DataFrame, ambiguous: np.ndarray) -> None:
+        """
+        Reavalia com o LLM os feedbacks ambíguos (textos únicos, em lotes
+        paralelos, dentro do LLM_TOKEN_BUDGET). Lotes que falham ficam com o
+        score do léxico.
+        """
+        try:
+            get_client()
+        except ImportError:
+            logging.warning("Biblioteca openai não instalada. Sentimento fica só com o léxico.")
+            return
+
+        texts = feedback_text(scored)
+        codes, _ = pd.factorize(normalize_feedback_text(texts))
+        codes = pd.Series(codes, index=scored.index)
+        pending = texts[ambiguous & ~codes.duplicated().to_numpy()]
+        pending = pending.iloc[:max(self.sentiment_llm_max_texts, 0)]
+        if pending.empty:
+            return
+
+        settings = llm_settings()
+        batch_size = max(settings["classify_batch_size"], 1)
+        batches = [
+            pending.iloc[start:start + batch_size]
+            for start in range(0, len(pending), batch_size)
+        ]
+        limiter = RateLimiter(settings["requests_per_minute"])
+        budget = TokenBudget(settings["token_budget"])
+
+        refined = {}
+        with ThreadPoolExecutor(max_workers=max(settings["max_concurrency"], 1)) as executor:
+            futures = [
+                executor.submit(self._sentiment_batch, batch, limiter, budget)
+                for batch in batches
+            ]
+            for batch, future in zip(batches, futures):
+                scores = future.result()
+                if scores is not None:
+                    refined.update(zip(codes[batch.index], scores))
+
+        # Replica o score revisado para todos os feedbacks com o mesmo texto
+        rows = codes.isin(refined.keys()).to_numpy() & ambiguous
+        new_scores = codes[rows].map(refined).to_numpy(dtype=np.float64)
+        scored.loc[rows, 'sentiment_score'] = new_scores.round(3)
+        scored.loc[rows, 'sentiment_label'] = np.select(
+            [new_scores >= SENTIMENT_THRESHOLD, new_scores <= -SENTIMENT_THRESHOLD],
+            ['positivo', 'negativo'],
+            'neutro',
+        )
+        scored.loc[rows, 'sentiment_source'] = 'llm'
+        logging.info(
+            f"Sentimento revisado com IA: {len(refined)} de {len(pending)} textos ambíguos "
+            f"({int(rows.sum())} feedbacks)"
+        )
+        budget.log_usage("Sentimento com IA")
+
+    def _sentiment_batch(
+        self,
+        batch: pd.Series,
+        limiter: RateLimiter,
+        budget: TokenBudget
+    ) -> Optional[List[float]]:
+        """
+        Score de sentimento de um lote numa única chamada, ou None.
+        """
+        items = "\n".join(
+            f"{i}. {json.dumps(text, ensure_ascii=False)}"
+            for i, text in enumerate(batch.tolist(), start=1)
+        )
+        prompt = f"""
+Avalie o sentimento de cada comentário de hóspede abaixo com um número entre
+-1 (muito negativo) e 1 (muito positivo); 0 é neutro.
+
+Comentários:
+{items}
+
+Responda apenas com um array JSON com {len(batch)} números, na mesma ordem dos comentários.
+Exemplo: [0.8, -0.5, 0]
+"""
+        max_tokens = 6 * len(batch) + 20
+        estimate = estimate_tokens(prompt) + max_tokens
+        if not budget.reserve(estimate):
+            logging.warning(
+                f"Orçamento de tokens esgotado: lote de {len(batch)} comentários "
+                "fica com o sentimento do léxico"
+            )
+            return None
+
+        used = None
+        try:
+            response = chat_completion(
+                [{"role": "user", "content": prompt}],
+                model=self.model,
+                max_tokens=max_tokens,
+                temperature=0,
+                limiter=limiter,
+                call_site="sentimento",
+            )
+            if not response["cached"]:
+                used = response["prompt_tokens"] + response["completion_tokens"] or estimate
+            return parse_scores(response["content"], len(batch))
+        except Exception as e:
+            logging.warning(f"Erro ao avaliar sentimento de lote de {len(batch)} comentários: {e}")
+            return None
+        finally:
+            budget.settle(estimate, used)
+
+    def add_property_sentiment(self, unified_df: pd.DataFrame, scored_feedback: pd.DataFrame) -> pd.DataFrame:
+        """
+        Acrescenta ao consolidado a média do sentimento dos feedbacks de cada
+        imóvel (sentiment_mean) e a fração de feedbacks negativos.
+        """
+        property_col = 'property_id' if 'property_id' in scored_feedback.columns else 'id_imovel'
+        if property_col not in scored_feedback.columns or 'sentiment_score' not in scored_feedback.columns:
+            return unified_df
+
+        by_property = (
+            scored_feedback
+            .assign(is_negative=scored_feedback['sentiment_label'] == 'negativo')
+            .groupby(property_col)
+            .agg(
+                sentiment_mean=('sentiment_score', 'mean'),
+                negative_feedback_share=('is_negative', 'mean'),
+            )
+            .round(3)
+            .rename_axis('property_id')
+            .reset_index()
+        )
+        base = unified_df.drop(columns=['sentiment_mean', 'negative_feedback_share'], errors='ignore')
+        return base.merge(by_property, on='property_id', how='left')
+
+    def generate_executive_summary(
+        self,
+        unified_df: pd.DataFrame,
+        month: str,
+        stats: Optional[Dict] = None
+    ) -> str:
         """
         Gera um resumo executivo em linguagem natural do fechamento mensal.
+
+        `stats` são as estatísticas consolidadas do mês (rollup de portfólio,
+        ver DataLoader.get_portfolio_stats). Se omitido, é calculado do dataframe.
         """
         if not self.enabled:
-            return self._generate_simple_summary(unified_df, month)
+            return self._generate_simple_summary(unified_df, month, stats)
         
         logging.info("Gerando resumo executivo com IA...")
         
         try:
-            import openai
-            openai.api_key = self.api_key
-            
             # Prepara dados agregados para contexto
             stats = {
-                "total_properties": len(unified_df),
-                "total_revenue": unified_df["gross_revenue"].sum(),
-                "avg_occupancy": unified_df["occupancy_rate"].mean() * 100,
-                "avg_rating": unified_df["avg_rating"].mean(),
+                **(stats or stats_from_summary(unified_df)),
                 "best_property": unified_df.nlargest(1, 'net_revenue')['property_id'].values[0],
                 "worst_rating": unified_df.nsmallest(1, 'avg_rating')['property_id'].values[0],
             }
@@ -170,25 +864,31 @@ Inclua: principais destaques, alertas importantes e recomendações de ação.
 Use tom profissional mas acessível.
 """
             
-            response = openai.ChatCompletion.create(
+            response = chat_completion(
+                [{"role": "user", "content": prompt}],
                 model=self.model,
-                messages=[{"role": "user", "content": prompt}],
                 max_tokens=400,
-                temperature=0.7
+                temperature=0.7,
+                call_site="resumo_executivo",
             )
             
-            summary = response.choices[0].message.content.strip()
-            return summary
+            return response["content"]
             
         except Exception as e:
             logging.error(f"Erro ao gerar resumo com IA: {e}")
-            return self._generate_simple_summary(unified_df, month)
+            return self._generate_simple_summary(unified_df, month, stats)
     
-    def _generate_simple_summary(self, df: pd.DataFrame, month: str) -> str:
-        total_properties = len(df)
-        total_revenue = df["gross_revenue"].sum()
-        avg_occupancy = df["occupancy_rate"].mean() * 100
-        avg_rating = df["avg_rating"].mean()
+    def _generate_simple_summary(
+        self,
+        df: pd.DataFrame,
+        month: str,
+        stats: Optional[Dict] = None
+    ) -> str:
+        stats = stats or stats_from_summary(df)
+        total_properties = stats["total_properties"]
+        total_revenue = stats["total_revenue"]
+        avg_occupancy = stats["avg_occupancy"]
+        avg_rating = stats["avg_rating"]
         
         summary = f"""
 RESUMO EXECUTIVO - {month}
@@ -197,28 +897,28 @@ Processamos {total_properties} imóveis ativos neste mês.
 
 FINANCEIRO:
 - Faturamento bruto total: R$ {total_revenue:,.2f}
-- Receita líquida total: R$ {df['net_revenue'].sum():,.2f}
+- Receita líquida total: R$ {stats['net_revenue']:,.2f}
 
 OPERACIONAL:
 - Taxa média de ocupação: {avg_occupancy:.1f}%
-- Total de reservas: {df['reservations_count'].sum():.0f}
+- Total de reservas: {stats['total_reservations']:.0f}
 
 QUALIDADE:
 - Nota média dos hóspedes: {avg_rating:.2f}/5.0
-- Imóveis com nota abaixo de 4.0: {len(df[df['avg_rating'] < 4.0])}
+- Imóveis com nota abaixo de 4.0: {stats['low_rating_count']}
 
 DESTAQUES:
 - Top 3 em faturamento: {', '.join(df.nlargest(3, 'net_revenue')['property_id'].tolist())}
-- Alertas de qualidade: {len(df[(df['avg_rating'] < 4.0) & (df['occupancy_rate'] > 0.7)])} imóveis com alta ocupação mas nota baixa
+- Alertas de qualidade: {stats['quality_alert_count']} imóveis com alta ocupação mas nota baixa
 """
         return summary
     
     def detect_recurring_issues(self, feedback_df: pd.DataFrame) -> Dict[str, List[str]]:
         """
-        Detecta problemas recorrentes por imóvel para gerar alertas proativos.
+        Detecta problemas recorrentes por imóvel para gerar alertas proativos
+        (mesma categoria 3+ vezes no mês). Com os feedbacks persistidos, a
+        detecção entre meses fica em DataLoader.get_recurring_issues.
         """
-        issues_by_property = {}
-        
         property_col = None
         if 'property_id' in feedback_df.columns:
             property_col = 'property_id'
@@ -226,35 +926,34 @@ DESTAQUES:
             property_col = 'id_imovel'
         else:
             logging.warning("Coluna de identificação do imóvel não encontrada nos feedbacks")
-            return issues_by_property
-        
-        # Agrupa feedbacks por imóvel
-        grouped = feedback_df.groupby(property_col)
-        
-        for property_id, group in grouped:
-            if 'ai_category' in group.columns:
-                categories = group['ai_category'].value_counts()
-                
-                # Alerta se mesma categoria aparece 3+ vezes
-                recurring = categories[categories >= 3].index.tolist()
-                
-                if recurring:
-                    issues_by_property[property_id] = recurring
-        
-        return issues_by_property
+            return {}
+        if 'ai_category' not in feedback_df.columns:
+            return {}
+
+        counts = feedback_df.groupby([property_col, 'ai_category']).size()
+        recurring = counts[counts >= 3].reset_index()
+        return recurring.groupby(property_col)['ai_category'].agg(list).to_dict()
     
     def generate_property_insight(self, property_data: pd.Series) -> str:
         """
         Gera insight específico para um imóvel.
         """
+        return self._property_insight(property_data)[0]
+
+    def _property_insight(
+        self,
+        property_data: pd.Series,
+        limiter: Optional[RateLimiter] = None,
+        budget: Optional[TokenBudget] = None
+    ) -> Tuple[str, str]:
+        """
+        Insight do imóvel e sua origem ('llm' ou 'regras'). Sem orçamento
+        disponível, ou em caso de erro, usa o insight por regras.
+        """
         if not self.enabled:
-            return self._generate_simple_property_insight(property_data)
+            return self._generate_simple_property_insight(property_data), 'regras'
         
-        try:
-            import openai
-            openai.api_key = self.api_key
-            
-            prompt = f"""
+        prompt = f"""
 Analise rapidamente este imóvel e dê uma recomendação de 1 frase:
 
 Imóvel: {property_data['property_id']}
@@ -263,22 +962,100 @@ Ocupação: {property_data['occupancy_rate'] * 100:.0f}%
 Nota: {property_data['avg_rating']:.1f}/5.0
 Margem: {property_data['margin_percent']:.1f}%
 Reclamações: {property_data.get('complaints_list', 'nenhuma')}
+Sentimento dos comentários (-1 a 1): {property_data.get('sentiment_mean', 'n/d')}
 
 Seja direto e orientado a ação.
 """
-            
-            response = openai.ChatCompletion.create(
+        max_tokens = 80
+        estimate = estimate_tokens(prompt) + max_tokens
+        if budget is not None and not budget.reserve(estimate):
+            return self._generate_simple_property_insight(property_data), 'regras'
+
+        used = None
+        try:
+            response = chat_completion(
+                [{"role": "user", "content": prompt}],
                 model=self.model,
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=80,
-                temperature=0.5
+                max_tokens=max_tokens,
+                temperature=0.5,
+                limiter=limiter,
+                call_site="insight_imovel",
             )
-            
-            return response.choices[0].message.content.strip()
+            if not response["cached"]:
+                used = response["prompt_tokens"] + response["completion_tokens"] or estimate
+            return response["content"], 'llm'
             
         except Exception as e:
             logging.error(f"Erro ao gerar insight: {e}")
-            return self._generate_simple_property_insight(property_data)
+            return self._generate_simple_property_insight(property_data), 'regras'
+        finally:
+            if budget is not None:
+                budget.settle(estimate, used)
+
+    def generate_property_insights(self, unified_df: pd.DataFrame, top_n: int = 5) -> pd.DataFrame:
+        """
+        Insights para todos os imóveis que pedem atenção (margem negativa ou
+        nota abaixo de LOW_RATING_THRESHOLD) e para os `top_n` de melhor
+        receita líquida.
+
+        Os imóveis em atenção vêm primeiro, do pior para o melhor: a prioridade
+        é o menor percentil entre margem e nota. As chamadas rodam em paralelo
+        (LLM_MAX_CONCURRENCY, LLM_REQUESTS_PER_MINUTE) e consomem o orçamento
+        do run (INSIGHT_TOKEN_BUDGET e/ou INSIGHT_COST_BUDGET); esgotado o
+        orçamento, os demais imóveis recebem o insight por regras.
+        """
+        margin = pd.to_numeric(unified_df['margin_percent'], errors='coerce')
+        rating = pd.to_numeric(unified_df['avg_rating'], errors='coerce')
+        needs_attention = (margin < 0) | (rating < LOW_RATING_THRESHOLD)
+        priority = np.minimum(
+            margin.rank(pct=True).fillna(1.0), rating.rank(pct=True).fillna(1.0)
+        )
+        attention = (
+            unified_df[needs_attention]
+            .assign(tipo='Atenção Necessária', priority=priority[needs_attention])
+            .sort_values('priority', kind='stable')
+        )
+        top = (
+            unified_df[~needs_attention]
+            .nlargest(top_n, 'net_revenue')
+            .assign(tipo='Top Performance')
+        )
+        candidates = pd.concat([attention, top])
+        rows = [row for _, row in candidates.iterrows()]
+
+        settings = llm_settings()
+        budget = TokenBudget(budget_limit(
+            settings["insight_token_budget"],
+            settings["insight_cost_budget"],
+            settings["cost_per_1k_tokens"],
+        ))
+        limiter = RateLimiter(settings["requests_per_minute"])
+
+        start = time.perf_counter()
+        # Submetidos em ordem de prioridade: os piores chegam antes ao orçamento
+        with ThreadPoolExecutor(max_workers=max(settings["max_concurrency"], 1)) as executor:
+            results = list(executor.map(
+                lambda row: self._property_insight(row, limiter, budget), rows
+            ))
+
+        insights = pd.DataFrame({
+            'property_id': candidates['property_id'].to_numpy(),
+            'city': candidates['city'].to_numpy(),
+            'tipo': candidates['tipo'].to_numpy(),
+            'margin_percent': candidates['margin_percent'].to_numpy(),
+            'avg_rating': candidates['avg_rating'].to_numpy(),
+            'insight': [text for text, _ in results],
+            'insight_source': [source for _, source in results],
+        })
+        llm_count = int((insights['insight_source'] == 'llm').sum())
+        logging.info(
+            f"Insights por imóvel: {len(insights)} ({len(attention)} em atenção), "
+            f"{llm_count} com IA e {len(insights) - llm_count} por regras "
+            f"em {time.perf_counter() - start:.1f}s"
+        )
+        if self.enabled:
+            budget.log_usage("Insights por imóvel")
+        return insights
     
     def _generate_simple_property_insight(self, data: pd.Series) -> str:
         """
@@ -311,75 +1088,133 @@ class PropertyChatbot:
     """
     
     def __init__(self, db_path: str):
-        import sqlite3
-        self.conn = sqlite3.connect(db_path)
+        self.db_path = db_path
+        self.conn: Optional[sqlite3.Connection] = None
+        self.cities: List[str] = []
         self.api_key = os.getenv("OPENAI_API_KEY", "")
+        self.model = os.getenv("LLM_MODEL", "gpt-4")
         self.enabled = bool(self.api_key)
+        self.query_timeout = float(os.getenv("CHATBOT_QUERY_TIMEOUT", "5"))
+        self.max_rows = int(os.getenv("CHATBOT_MAX_ROWS", "50"))
+        self._connect()
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        """
+        Abre a conexão somente leitura das consultas geradas pelo LLM. None
+        enquanto o banco não existir (nenhum fechamento gravado ainda).
+        """
+        if self.conn is None and os.path.exists(self.db_path):
+            self.conn = connect_read_only(self.db_path)
+            try:
+                self.cities = [
+                    row[0] for row in self.conn.execute("SELECT DISTINCT city FROM properties")
+                ]
+            except sqlite3.Error:
+                self.cities = []
+        return self.conn
     
     def query(self, user_question: str) -> str:
         """
         Responde perguntas em linguagem natural sobre os dados.
+
+        Perguntas que só mudam mês, cidade ou números em relação a uma já
+        respondida reaproveitam o SQL (chatbot_sql.sql_template_cache) e
+        pulam a chamada de geração de SQL.
         """
         if not self.enabled:
             return "Chatbot IA não disponível (configure OPENAI_API_KEY)"
+        if self._connect() is None:
+            return f"Sem dados para consultar: o banco {self.db_path} ainda não existe (rode o fechamento)."
         
         try:
-            import openai
-            openai.api_key = self.api_key
+            template, params = question_template(user_question, self.cities)
+            sql_template = sql_template_cache.get(template)
+            if sql_template is not None:
+                sql_query = fill_sql_template(sql_template, params)
+                logging.info(f"SQL do cache de templates: {sql_query}")
+            else:
+                sql_query = self._generate_sql(user_question)
+                logging.info(f"SQL gerado: {sql_query}")
+                sql_template = sql_to_template(sql_query, params)
+                if sql_template is not None:
+                    sql_template_cache.put(template, sql_template)
             
-            # Primeiro, gera SQL com IA
-            sql_prompt = f"""
-Converta a pergunta do usuário em uma query SQL para o banco SQLite.
-
-Tabelas disponíveis:
-- monthly_summary (property_id, month, reservations_count, gross_revenue, net_revenue, 
-                   occupancy_rate, avg_rating, city, state, region, margin_percent, complaints_list)
-
-Pergunta: "{user_question}"
-
-Retorne APENAS a query SQL, sem explicações.
-"""
-            
-            sql_response = openai.ChatCompletion.create(
-                model="gpt-4",
-                messages=[{"role": "user", "content": sql_prompt}],
-                max_tokens=200,
-                temperature=0
+            # Executa query com limite de tempo e de linhas (perguntas repetidas
+            # são servidas pelo cache de consultas)
+            df, summary = run_bounded_query(
+                self.conn, self.db_path, sql_query, self.max_rows, self.query_timeout
             )
-            
-            sql_query = sql_response.choices[0].message.content.strip()
-            
-            # Remove formatação markdown se houver
-            sql_query = sql_query.replace("```sql", "").replace("```", "").strip()
-            
-            logging.info(f"SQL gerado: {sql_query}")
-            
-            # Executa query
-            df = pd.read_sql_query(sql_query, self.conn)
+            results = df.to_string(index=False)
+            if summary is not None:
+                results = (
+                    f"(mostrando {len(df)} de {summary['total_rows']} linhas)\n{results}\n\n"
+                    f"Resumo de todas as linhas: {summary}"
+                )
             
             # Gera resposta em linguagem natural
             answer_prompt = f"""
 Pergunta do usuário: "{user_question}"
 
 Resultados da consulta:
-{df.to_string()}
+{results}
 
 Responda a pergunta do usuário de forma clara e concisa, usando os dados acima.
 Se houver muitos resultados, resuma os principais.
 """
             
-            answer_response = openai.ChatCompletion.create(
-                model="gpt-4",
-                messages=[{"role": "user", "content": answer_prompt}],
+            answer_response = chat_completion(
+                [{"role": "user", "content": answer_prompt}],
+                model=self.model,
                 max_tokens=300,
-                temperature=0.7
+                temperature=0.7,
+                call_site="chatbot_resposta",
             )
             
-            return answer_response.choices[0].message.content.strip()
+            return answer_response["content"]
             
+        except QueryTimeoutError as e:
+            logging.warning(f"Consulta do chatbot interrompida: {e}")
+            return f"A consulta demorou demais ({e}). Tente uma pergunta mais específica."
         except Exception as e:
             logging.error(f"Erro no chatbot: {e}")
             return f"Erro ao processar pergunta: {str(e)}"
+
+    def _generate_sql(self, user_question: str) -> str:
+        sql_prompt = f"""
+Converta a pergunta do usuário em uma query SQL para o banco SQLite.
+
+Tabelas disponíveis:
+- monthly_summary (property_id, month, reservations_count, gross_revenue, net_revenue, 
+                   occupancy_rate, avg_rating, city, state, region, margin_percent, complaints_list)
+- city_monthly_rollup (month, city, ...métricas agregadas)
+- region_monthly_rollup (month, region, ...métricas agregadas)
+- portfolio_monthly_rollup (month, ...métricas agregadas)
+
+Métricas agregadas dos rollups: property_count, reservations_count_sum, occupied_days_sum,
+gross_revenue_sum, platform_fee_amount_sum, extra_cost_total_sum, net_revenue_sum,
+occupancy_rate_mean, avg_rating_mean, margin_percent_mean, low_rating_count,
+quality_alert_count, negative_margin_count.
+Para totais e médias por cidade, região ou do portfólio, prefira os rollups.
+
+Pergunta: "{user_question}"
+
+Retorne APENAS a query SQL, sem explicações.
+"""
+        
+        sql_response = chat_completion(
+            [{"role": "user", "content": sql_prompt}],
+            model=self.model,
+            max_tokens=200,
+            temperature=0,
+            call_site="chatbot_sql",
+        )
+        
+        sql_query = sql_response["content"]
+        
+        # Remove formatação markdown se houver
+        return sql_query.replace("```sql", "").replace("```", "").strip()
     
     def close(self):
-        self.conn.close()
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
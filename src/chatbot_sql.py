@@ -0,0 +1,238 @@
+# src/chatbot_sql.py
+
+"""
+Suporte ao SQL do PropertyChatbot: cache de templates pergunta -> SQL e
+execução protegida das consultas geradas pelo LLM.
+
+Template: a pergunta normalizada (casefold, sem acentos, pontuação colapsada)
+com os valores trocados por slots (<month>, <city>, <num>). Quando o LLM gera
+o SQL de uma pergunta, os mesmos valores são trocados por {p0}, {p1}... no
+SQL; perguntas que diferem só nesses valores reaproveitam o SQL sem chamar o
+LLM. O template só é guardado se cada valor aparece exatamente uma vez na
+pergunta e no SQL.
+
+Execução: conexão somente leitura (mode=ro + query_only), uma única instrução
+SELECT/WITH (comentários removidos), tempo limite via progress handler e resultado limitado a
+max_rows linhas; quando há mais linhas, vão junto contagem total e
+min/média/máx das colunas numéricas, calculados no próprio SQLite.
+"""
+
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from query_cache import cached_read_sql
+
+_MONTH_PATTERN = r"\b\d{4}-\d{2}\b"
+_NUMBER_PATTERN = r"(?<![\w.,])\d+(?:[.,]\d+)?(?![\w]|[.,]\d)"
+
+
+class QueryTimeoutError(Exception):
+    pass
+
+
+def fold(text: str) -> str:
+    """
+    Casefold e remoção de acentos ("São Paulo" -> "sao paulo").
+    """
+    text = unicodedata.normalize("NFKD", str(text).casefold())
+    return text.encode("ascii", "ignore").decode("ascii")
+
+
+def question_template(question: str, cities: List[str]) -> Tuple[str, List[Tuple[str, str]]]:
+    """
+    Template normalizado da pergunta e os valores extraídos, em ordem:
+    [(tipo, valor)], tipo em month/city/num. Cidades voltam com o nome do banco.
+    """
+    by_folded = {fold(city): city for city in cities if city}
+    city_alternatives = "|".join(
+        re.escape(c) for c in sorted(by_folded, key=len, reverse=True)
+    )
+    parts = [f"(?P<month>{_MONTH_PATTERN})"]
+    if city_alternatives:
+        parts.append(rf"(?P<city>\b(?:{city_alternatives})\b)")
+    parts.append(f"(?P<num>{_NUMBER_PATTERN})")
+    pattern = re.compile("|".join(parts))
+
+    params: List[Tuple[str, str]] = []
+
+    def slot(match: re.Match) -> str:
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "city":
+            value = by_folded[value]
+        elif kind == "num":
+            value = value.replace(",", ".")
+        params.append((kind, value))
+        return f" <{kind}> "
+
+    template = pattern.sub(slot, fold(question))
+    template = re.sub(r"[^\w<>]+", " ", template).strip()
+    return template, params
+
+
+def _literal_pattern(kind: str, value: str) -> str:
+    if kind == "num":
+        return rf"(?<![\w.']){re.escape(value)}(?![\w.'])"
+    return rf"'{re.escape(value)}'|\"{re.escape(value)}\""
+
+
+def sql_to_template(sql: str, params: List[Tuple[str, str]]) -> Optional[str]:
+    """
+    Troca os valores da pergunta no SQL por {p0}, {p1}... Retorna None se
+    algum valor não aparece exatamente uma vez (template não seria confiável).
+    """
+    values = [value for _, value in params]
+    if len(set(values)) != len(values):
+        return None
+    template = sql
+    for i, (kind, value) in enumerate(params):
+        template, count = re.subn(_literal_pattern(kind, value), f"{{p{i}}}", template)
+        if count != 1:
+            return None
+    return template
+
+
+def fill_sql_template(template: str, params: List[Tuple[str, str]]) -> str:
+    sql = template
+    for i, (kind, value) in enumerate(params):
+        literal = value if kind == "num" else "'" + value.replace("'", "''") + "'"
+        sql = sql.replace(f"{{p{i}}}", literal)
+    return sql
+
+
+class SQLTemplateCache:
+    """
+    Cache LRU em memória: template da pergunta -> template do SQL.
+    """
+
+    def __init__(self, max_entries: int = 256) -> None:
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, template: str) -> Optional[str]:
+        with self._lock:
+            sql_template = self._entries.get(template)
+            if sql_template is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(template)
+            self.hits += 1
+            return sql_template
+
+    def put(self, template: str, sql_template: str) -> None:
+        with self._lock:
+            self._entries[template] = sql_template
+            self._entries.move_to_end(template)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+sql_template_cache = SQLTemplateCache(int(os.getenv("CHATBOT_TEMPLATE_CACHE_SIZE", "256")))
+
+
+def connect_read_only(db_path: str) -> sqlite3.Connection:
+    """
+    Conexão SQLite somente leitura (falha se o banco não existir).
+    """
+    uri = "file:" + os.path.abspath(db_path).replace("?", "%3f").replace("#", "%23") + "?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    conn.execute("PRAGMA query_only = ON")
+    return conn
+
+
+# Literais de string/identificadores entre aspas e comentários SQL
+_SQL_QUOTED_OR_COMMENT = re.compile(
+    r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|--[^\n]*|/\*.*?(?:\*/|$)", re.DOTALL
+)
+
+
+def strip_sql_comments(sql: str) -> str:
+    """
+    Remove comentários -- e /* */ fora de literais entre aspas.
+    """
+    return _SQL_QUOTED_OR_COMMENT.sub(
+        lambda m: m.group(0) if m.group(0)[0] in "'\"" else " ", sql
+    )
+
+
+def validate_select(sql: str) -> str:
+    """
+    Aceita uma única instrução SELECT/WITH; remove comentários e ';' final
+    (um comentário -- no fim quebraria o SELECT que envolve a consulta).
+    """
+    sql = strip_sql_comments(sql).strip().rstrip(";").strip()
+    if ";" in sql:
+        raise ValueError("apenas uma instrução SQL é permitida")
+    if not re.match(r"(?is)^(select|with)\b", sql):
+        raise ValueError("apenas consultas SELECT são permitidas")
+    return sql
+
+
+def with_time_limit(conn: sqlite3.Connection, seconds: float, func: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+    """
+    Executa `func` interrompendo a consulta no SQLite após `seconds` segundos.
+    """
+    if seconds <= 0:
+        return func()
+    deadline = time.monotonic() + seconds
+    conn.set_progress_handler(lambda: 1 if time.monotonic() > deadline else 0, 10000)
+    try:
+        return func()
+    except (sqlite3.OperationalError, pd.errors.DatabaseError) as e:
+        if "interrupted" in str(e):
+            raise QueryTimeoutError(f"consulta excedeu {seconds:g}s") from e
+        raise
+    finally:
+        conn.set_progress_handler(None, 0)
+
+
+def run_bounded_query(
+    conn: sqlite3.Connection,
+    db_path: str,
+    sql: str,
+    max_rows: int = 50,
+    timeout: float = 5.0
+) -> Tuple[pd.DataFrame, Optional[Dict]]:
+    """
+    Executa o SQL gerado com limite de linhas e de tempo. Retorna as primeiras
+    `max_rows` linhas e, se o resultado era maior, um resumo com o total de
+    linhas e min/média/máx das colunas numéricas (senão None).
+    """
+    sql = validate_select(sql)
+    df = with_time_limit(conn, timeout, lambda: cached_read_sql(
+        conn, db_path, f"SELECT * FROM ({sql}) LIMIT ?", (max_rows + 1,)
+    ))
+    if len(df) <= max_rows:
+        return df, None
+
+    df = df.head(max_rows)
+    numeric = [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c])][:10]
+    aggregates = ["COUNT(*) AS total_rows"]
+    for column in numeric:
+        name = str(column).replace('"', '""')
+        aggregates += [
+            f'{func}("{name}") AS "{name}_{func.lower()}"' for func in ("MIN", "AVG", "MAX")
+        ]
+    summary = with_time_limit(conn, timeout, lambda: cached_read_sql(
+        conn, db_path, f"SELECT {', '.join(aggregates)} FROM ({sql})"
+    ))
+    summary = summary.iloc[0].to_dict()
+    summary["total_rows"] = int(summary["total_rows"])
+    logging.info(f"Resultado do chatbot limitado a {max_rows} linhas (total: {summary['total_rows']})")
+    return df, summary
@@ -23,7 +23,34 @@ if not API_TOKEN:
 
 SQLITE_DB_PATH = os.getenv("SQLITE_DB_PATH", "data/database.sqlite")
 
+# Backend de armazenamento: "sqlite" (padrão) ou "postgres"
+DB_BACKEND = os.getenv("DB_BACKEND", "sqlite")
+DATABASE_URL = os.getenv("DATABASE_URL", "")
+PG_POOL_MIN = int(os.getenv("PG_POOL_MIN", "1"))
+PG_POOL_MAX = int(os.getenv("PG_POOL_MAX", "5"))
+
+# Quantos runs por mês manter no histórico de monthly_summary (0 = todos)
+HISTORY_RETENTION_RUNS = int(os.getenv("HISTORY_RETENTION_RUNS", "12"))
+
+# Problemas recorrentes: categoria com RECURRING_ISSUE_MIN_COUNT+ reclamações
+# em RECURRING_ISSUE_MIN_MONTHS+ meses dentro da janela de RECURRING_ISSUE_WINDOW_MONTHS meses
+RECURRING_ISSUE_WINDOW_MONTHS = int(os.getenv("RECURRING_ISSUE_WINDOW_MONTHS", "3"))
+RECURRING_ISSUE_MIN_COUNT = int(os.getenv("RECURRING_ISSUE_MIN_COUNT", "3"))
+RECURRING_ISSUE_MIN_MONTHS = int(os.getenv("RECURRING_ISSUE_MIN_MONTHS", "1"))
+
+# Cache de consultas de leitura no SQLite (ver query_cache.py)
+QUERY_CACHE_ENABLED = os.getenv("QUERY_CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "256"))
+QUERY_CACHE_VERSION_TTL = float(os.getenv("QUERY_CACHE_VERSION_TTL", "5"))
+
 OUTPUT_DIR = os.getenv("OUTPUT_DIR", "output")
 
+# Formato dos relatórios: csv, csv.gz, csv.zst, parquet ou xlsx.
+# Um para todos ("csv.gz") ou por relatório ("financial=xlsx,quality=csv,occupancy=csv.gz")
+REPORT_FORMATS = os.getenv("REPORT_FORMATS", "csv")
+
+# PDF executivo com gráficos (requer matplotlib e reportlab)
+EXECUTIVE_PDF_ENABLED = os.getenv("EXECUTIVE_PDF_ENABLED", "true").lower() in ("1", "true", "yes")
+
 DEFAULT_MONTH = os.getenv("DEFAULT_MONTH", "")
 
@@ -2,12 +2,354 @@
 
 import logging
 import sqlite3
-from typing import Optional
+from contextlib import closing
+from datetime import datetime
+from typing import Dict, List, Optional
 
+import numpy as np
 import pandas as pd
 
-from config import SQLITE_DB_PATH
-from utils import ensure_dir
+from config import (
+    DB_BACKEND,
+    HISTORY_RETENTION_RUNS,
+    RECURRING_ISSUE_MIN_COUNT,
+    RECURRING_ISSUE_MIN_MONTHS,
+    RECURRING_ISSUE_WINDOW_MONTHS,
+    SQLITE_DB_PATH,
+)
+from query_cache import bump_data_versions, cache_enabled, fetch_data_versions, query_cache
+from utils import ensure_dir, shift_month
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS properties (
+    property_id TEXT PRIMARY KEY,
+    condominium TEXT,
+    city TEXT,
+    state TEXT,
+    region TEXT,
+    status TEXT
+);
+
+CREATE TABLE IF NOT EXISTS monthly_summary (
+    property_id TEXT,
+    month TEXT,
+    reservations_count INTEGER,
+    gross_revenue REAL,
+    occupied_days INTEGER,
+    occupancy_rate REAL,
+    condominium TEXT,
+    city TEXT,
+    state TEXT,
+    region TEXT,
+    status TEXT,
+    fee_percentage REAL,
+    platform_fee_amount REAL,
+    extra_cost_total REAL,
+    net_revenue REAL,
+    margin_value REAL,
+    margin_percent REAL,
+    avg_rating REAL,
+    complaints_list TEXT,
+    owner_name TEXT,
+    PRIMARY KEY (property_id, month)
+);
+
+CREATE INDEX IF NOT EXISTS idx_monthly_summary_month_net
+    ON monthly_summary (month, net_revenue);
+"""
+
+# Métricas materializadas nos rollups: (coluna, tipo, expressão SQL sobre monthly_summary).
+# Somas e contagens permitem re-agregar níveis sem voltar às linhas por imóvel.
+ROLLUP_METRICS = [
+    ("property_count", "INTEGER", "COUNT(*)"),
+    ("reservations_count_sum", "INTEGER", "SUM(reservations_count)"),
+    ("occupied_days_sum", "INTEGER", "SUM(occupied_days)"),
+    ("gross_revenue_sum", "REAL", "SUM(gross_revenue)"),
+    ("platform_fee_amount_sum", "REAL", "SUM(platform_fee_amount)"),
+    ("extra_cost_total_sum", "REAL", "SUM(extra_cost_total)"),
+    ("net_revenue_sum", "REAL", "SUM(net_revenue)"),
+    ("occupancy_rate_sum", "REAL", "SUM(occupancy_rate)"),
+    ("occupancy_rate_mean", "REAL", "AVG(occupancy_rate)"),
+    ("avg_rating_sum", "REAL", "SUM(avg_rating)"),
+    ("avg_rating_count", "INTEGER", "COUNT(avg_rating)"),
+    ("avg_rating_mean", "REAL", "AVG(avg_rating)"),
+    ("margin_percent_mean", "REAL", "AVG(margin_percent)"),
+    ("low_rating_count", "INTEGER",
+     "SUM(CASE WHEN avg_rating < 4.0 THEN 1 ELSE 0 END)"),
+    ("quality_alert_count", "INTEGER",
+     "SUM(CASE WHEN avg_rating < 4.0 AND occupancy_rate > 0.7 THEN 1 ELSE 0 END)"),
+    ("negative_margin_count", "INTEGER",
+     "SUM(CASE WHEN net_revenue < 0 THEN 1 ELSE 0 END)"),
+]
+
+# Nível do rollup -> (tabela, colunas de agrupamento além do mês)
+ROLLUP_LEVELS = {
+    "city": ("city_monthly_rollup", ["city"]),
+    "region": ("region_monthly_rollup", ["region"]),
+    "portfolio": ("portfolio_monthly_rollup", []),
+}
+
+# Histórico append-only: cada fechamento de um mês grava um novo run_id (1, 2, ...)
+HISTORY_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS summary_runs (
+    month TEXT,
+    run_id INTEGER,
+    created_at TEXT,
+    row_count INTEGER,
+    PRIMARY KEY (month, run_id)
+);
+
+CREATE TABLE IF NOT EXISTS monthly_summary_history (
+    property_id TEXT,
+    month TEXT,
+    run_id INTEGER,
+    reservations_count INTEGER,
+    gross_revenue REAL,
+    occupied_days INTEGER,
+    occupancy_rate REAL,
+    condominium TEXT,
+    city TEXT,
+    state TEXT,
+    region TEXT,
+    status TEXT,
+    fee_percentage REAL,
+    platform_fee_amount REAL,
+    extra_cost_total REAL,
+    net_revenue REAL,
+    margin_value REAL,
+    margin_percent REAL,
+    avg_rating REAL,
+    complaints_list TEXT,
+    owner_name TEXT,
+    PRIMARY KEY (property_id, month, run_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_summary_history_month_run
+    ON monthly_summary_history (month, run_id);
+
+CREATE VIEW IF NOT EXISTS monthly_summary_current AS
+SELECT h.*
+FROM monthly_summary_history h
+JOIN (
+    SELECT month, MAX(run_id) AS run_id FROM summary_runs GROUP BY month
+) latest ON h.month = latest.month AND h.run_id = latest.run_id;
+"""
+
+# Feedbacks dos hóspedes com índice full-text (FTS5, external content).
+# remove_diacritics faz "agua" encontrar "água".
+FEEDBACK_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS guest_feedback (
+    feedback_id INTEGER PRIMARY KEY,
+    property_id TEXT,
+    month TEXT,
+    rating REAL,
+    complaints TEXT,
+    comment TEXT,
+    ai_category TEXT,
+    ai_source TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_guest_feedback_month_property
+    ON guest_feedback (month, property_id);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS guest_feedback_fts USING fts5(
+    complaints,
+    comment,
+    content='guest_feedback',
+    content_rowid='feedback_id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+
+CREATE TRIGGER IF NOT EXISTS guest_feedback_ai AFTER INSERT ON guest_feedback BEGIN
+    INSERT INTO guest_feedback_fts (rowid, complaints, comment)
+    VALUES (new.feedback_id, new.complaints, new.comment);
+END;
+
+CREATE TRIGGER IF NOT EXISTS guest_feedback_ad AFTER DELETE ON guest_feedback BEGIN
+    INSERT INTO guest_feedback_fts (guest_feedback_fts, rowid, complaints, comment)
+    VALUES ('delete', old.feedback_id, old.complaints, old.comment);
+END;
+"""
+
+# Índice de problemas: reclamações por (imóvel, categoria, mês), atualizado
+# a cada save_feedback só para o mês gravado
+ISSUE_INDEX_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS issue_counts (
+    month TEXT NOT NULL,
+    property_id TEXT NOT NULL,
+    category TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (month, property_id, category)
+);
+"""
+
+ISSUE_COUNTS_REFRESH_SQL = """
+INSERT INTO issue_counts (month, property_id, category, count)
+SELECT month, property_id, ai_category, COUNT(*)
+FROM guest_feedback
+WHERE month = ? AND property_id IS NOT NULL AND ai_category IS NOT NULL
+GROUP BY month, property_id, ai_category
+"""
+
+# Coluna do feedback persistido -> nomes aceitos no dataframe (CSV bruto ou já renomeado)
+FEEDBACK_COLUMNS = {
+    "property_id": ["property_id", "id_imovel"],
+    "rating": ["nota_media", "rating"],
+    "complaints": ["principais_reclamacoes", "complaint_category"],
+    "comment": ["comentarios_qualitativos", "feedback_text"],
+    "ai_category": ["ai_category"],
+    "ai_source": ["ai_source"],
+}
+
+
+def _fts_query(text: str) -> str:
+    """
+    Converte texto livre numa consulta FTS5 segura: cada termo vira uma frase
+    entre aspas (hífens como em "check-in" não são operadores); "chuv*" mantém o prefixo.
+    """
+    terms = []
+    for token in text.split():
+        prefix = token.endswith("*")
+        token = token.rstrip("*").replace('"', '""')
+        if token:
+            terms.append(f'"{token}"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+
+# Colunas devolvidas pelas buscas full-text (também quando não há termos)
+FEEDBACK_SEARCH_COLUMNS = [
+    "feedback_id", "property_id", "month", "rating", "complaints",
+    "comment", "ai_category", "snippet", "rank",
+]
+COMPLAINT_PROPERTY_COLUMNS = ["property_id", "mentions", "months", "last_month"]
+
+
+SUMMARY_COLUMNS = [
+    "property_id", "month", "reservations_count", "gross_revenue", "occupied_days",
+    "occupancy_rate", "condominium", "city", "state", "region", "status",
+    "fee_percentage", "platform_fee_amount", "extra_cost_total", "net_revenue",
+    "margin_value", "margin_percent", "avg_rating", "complaints_list", "owner_name",
+]
+
+# KPIs comparados entre dois runs do mesmo mês
+DIFF_METRICS = [
+    "reservations_count", "gross_revenue", "occupied_days", "occupancy_rate",
+    "platform_fee_amount", "extra_cost_total", "net_revenue", "margin_percent",
+    "avg_rating",
+]
+
+
+def diff_summary_runs(
+    before: pd.DataFrame,
+    after: pd.DataFrame,
+    only_changed: bool = True
+) -> pd.DataFrame:
+    """
+    Compara dois snapshots de monthly_summary por imóvel (sem loops por linha).
+
+    Retorna uma linha por imóvel com os valores antes/depois, o delta de cada
+    KPI e `change` em {'added', 'removed', 'changed', 'unchanged'}.
+    """
+    cols = ["property_id"] + DIFF_METRICS
+    merged = before[cols].merge(
+        after[cols], on="property_id", how="outer",
+        suffixes=("_before", "_after"), indicator=True
+    )
+
+    changed = np.zeros(len(merged), dtype=bool)
+    for metric in DIFF_METRICS:
+        old = pd.to_numeric(merged[f"{metric}_before"], errors="coerce")
+        new = pd.to_numeric(merged[f"{metric}_after"], errors="coerce")
+        merged[f"{metric}_delta"] = new - old
+        same = np.isclose(old, new, equal_nan=True)
+        changed |= ~same
+
+    merged["change"] = np.select(
+        [merged["_merge"] == "left_only", merged["_merge"] == "right_only", changed],
+        ["removed", "added", "changed"],
+        default="unchanged",
+    )
+    merged = merged.drop(columns="_merge")
+    if only_changed:
+        merged = merged[merged["change"] != "unchanged"]
+    return merged.sort_values("property_id").reset_index(drop=True)
+
+
+def _months_between(start_month: str, end_month: str) -> List[str]:
+    """
+    Meses YYYY-MM de start_month a end_month (inclusive), para o escopo do cache.
+    """
+    months = [start_month]
+    while months[-1] < end_month:
+        months.append(shift_month(months[-1], 1))
+    return months
+
+
+def _rollup_schema_sql() -> str:
+    statements = []
+    metric_cols = ",\n    ".join(f"{name} {sql_type}" for name, sql_type, _ in ROLLUP_METRICS)
+    for table, keys in ROLLUP_LEVELS.values():
+        key_cols = "".join(f"{key} TEXT,\n    " for key in keys)
+        statements.append(
+            f"CREATE TABLE IF NOT EXISTS {table} (\n"
+            f"    month TEXT,\n    {key_cols}{metric_cols},\n"
+            f"    PRIMARY KEY (month{''.join(', ' + key for key in keys)})\n);"
+        )
+    return "\n\n".join(statements)
+
+
+def drop_duplicate_summary_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Mantém só a última linha de cada (property_id, month): a chave de
+    monthly_summary, igual nos dois backends.
+    """
+    if not {"property_id", "month"} <= set(df.columns):
+        return df
+    duplicated = df.duplicated(["property_id", "month"], keep="last")
+    if not duplicated.any():
+        return df
+    logging.warning(
+        f"{int(duplicated.sum())} linhas repetidas de (property_id, month) "
+        "descartadas; mantida a última de cada imóvel"
+    )
+    return df[~duplicated]
+
+
+def stats_from_summary(df: pd.DataFrame) -> Dict:
+    """
+    Estatísticas consolidadas do mês calculadas do dataframe unificado, para
+    quando o rollup de portfólio não está disponível (mesmas regras de
+    ROLLUP_METRICS).
+    """
+    return {
+        "total_properties": len(df),
+        "total_revenue": df["gross_revenue"].sum(),
+        "net_revenue": df["net_revenue"].sum(),
+        "avg_occupancy": df["occupancy_rate"].mean() * 100,
+        "avg_rating": df["avg_rating"].mean(),
+        "total_reservations": df["reservations_count"].sum(),
+        "low_rating_count": int((df["avg_rating"] < 4.0).sum()),
+        "quality_alert_count": int(
+            ((df["avg_rating"] < 4.0) & (df["occupancy_rate"] > 0.7)).sum()
+        ),
+    }
+
+
+def stats_from_portfolio_rollup(row) -> Dict:
+    """
+    Converte uma linha do rollup de portfólio no formato de stats_from_summary.
+    """
+    return {
+        "total_properties": int(row["property_count"]),
+        "total_revenue": row["gross_revenue_sum"],
+        "net_revenue": row["net_revenue_sum"],
+        "avg_occupancy": row["occupancy_rate_mean"] * 100,
+        "avg_rating": row["avg_rating_mean"],
+        "total_reservations": row["reservations_count_sum"],
+        "low_rating_count": int(row["low_rating_count"] or 0),
+        "quality_alert_count": int(row["quality_alert_count"] or 0),
+    }
+
 
 class DataLoader:
     def __init__(self, db_path: Optional[str] = None) -> None:
@@ -26,6 +368,44 @@ class DataLoader:
         conn.execute("PRAGMA synchronous=NORMAL")
         return conn
 
+    def _read_sql(
+        self,
+        sql: str,
+        params: tuple = (),
+        ensure_feedback_schema: bool = False
+    ) -> pd.DataFrame:
+        with closing(self._get_connection()) as conn:
+            if ensure_feedback_schema:
+                self._create_feedback_schema(conn.cursor())
+            return pd.read_sql_query(sql, conn, params=params)
+
+    def _fetch_data_versions(self) -> Dict[str, int]:
+        with closing(self._get_connection()) as conn:
+            return fetch_data_versions(conn)
+
+    def _cached_read_sql(
+        self,
+        sql: str,
+        params: tuple = (),
+        months: Optional[List[str]] = None,
+        ensure_feedback_schema: bool = False
+    ) -> pd.DataFrame:
+        """
+        Leitura via cache de consultas, invalidado pela versão dos meses em `months`
+        (ou pela versão global, se None). Ver query_cache.py.
+        """
+        def execute():
+            return self._read_sql(sql, params, ensure_feedback_schema)
+
+        if not cache_enabled():
+            return execute()
+        return query_cache.get_or_execute(
+            self.db_path, sql, tuple(params), months, execute, self._fetch_data_versions
+        )
+
+    def _create_schema(self, cur) -> None:
+        cur.executescript(SCHEMA_SQL + HISTORY_SCHEMA_SQL + "\n" + _rollup_schema_sql())
+
     def init_schema(self) -> None:
         """
         Cria o schema básico, se ainda não existir.
@@ -33,45 +413,7 @@ class DataLoader:
         logging.info("Inicializando schema do banco de dados (se necessário)...")
         with self._get_connection() as conn:
             cur = conn.cursor()
-
-            # Tabelas simples (ajuste conforme necessidade)
-            cur.executescript(
-                """
-                CREATE TABLE IF NOT EXISTS properties (
-                    property_id TEXT PRIMARY KEY,
-                    condominium TEXT,
-                    city TEXT,
-                    state TEXT,
-                    region TEXT,
-                    status TEXT
-                );
-
-                CREATE TABLE IF NOT EXISTS monthly_summary (
-                    property_id TEXT,
-                    month TEXT,
-                    reservations_count INTEGER,
-                    gross_revenue REAL,
-                    occupied_days INTEGER,
-                    occupancy_rate REAL,
-                    condominium TEXT,
-                    city TEXT,
-                    state TEXT,
-                    region TEXT,
-                    status TEXT,
-                    fee_percentage REAL,
-                    platform_fee_amount REAL,
-                    extra_cost_total REAL,
-                    net_revenue REAL,
-                    margin_value REAL,
-                    margin_percent REAL,
-                    avg_rating REAL,
-                    complaints_list TEXT,
-                    owner_name TEXT,
-                    PRIMARY KEY (property_id, month)
-                );
-                """
-            )
-
+            self._create_schema(cur)
             conn.commit()
         logging.info("Schema pronto.")
 
@@ -93,82 +435,471 @@ class DataLoader:
             df.to_sql("monthly_summary", conn, if_exists="append", index=False)
         logging.info("Tabela 'monthly_summary' atualizada.")
 
-    def save_all(self, unified_df: pd.DataFrame) -> None:
+    def _refresh_rollups(self, cur, months: List[str]) -> None:
+        """
+        Recalcula os rollups (cidade, região, portfólio) apenas dos meses informados.
+        """
+        if not months:
+            return
+        placeholders = ", ".join("?" for _ in months)
+        metric_names = ", ".join(name for name, _, _ in ROLLUP_METRICS)
+        metric_exprs = ", ".join(expr for _, _, expr in ROLLUP_METRICS)
+
+        for table, keys in ROLLUP_LEVELS.values():
+            group_cols = ", ".join(["month"] + keys)
+            cur.execute(f"DELETE FROM {table} WHERE month IN ({placeholders})", months)
+            cur.execute(
+                f"""
+                INSERT INTO {table} ({group_cols}, {metric_names})
+                SELECT {group_cols}, {metric_exprs}
+                FROM monthly_summary
+                WHERE month IN ({placeholders})
+                GROUP BY {group_cols}
+                """,
+                months,
+            )
+        logging.info(f"Rollups atualizados para os meses: {', '.join(months)}")
+
+    def _record_run(self, cur, month: str) -> int:
+        """
+        Copia o snapshot atual do mês para o histórico append-only com um novo run_id.
+        """
+        cur.execute(
+            "SELECT COALESCE(MAX(run_id), 0) + 1 FROM summary_runs WHERE month = ?",
+            (month,),
+        )
+        run_id = cur.fetchone()[0]
+        cols = ", ".join(SUMMARY_COLUMNS)
+        cur.execute(
+            f"""
+            INSERT INTO monthly_summary_history (run_id, {cols})
+            SELECT ?, {cols} FROM monthly_summary WHERE month = ?
+            """,
+            (run_id, month),
+        )
+        cur.execute(
+            "INSERT INTO summary_runs (month, run_id, created_at, row_count) VALUES (?, ?, ?, ?)",
+            (month, run_id, datetime.now().isoformat(timespec="seconds"), cur.rowcount),
+        )
+        return run_id
+
+    def _apply_retention(self, cur, month: str, keep_runs: int) -> int:
+        """
+        Remove do histórico os runs do mês além dos `keep_runs` mais recentes.
+        """
+        if keep_runs <= 0:
+            return 0
+        cur.execute(
+            "SELECT run_id FROM summary_runs WHERE month = ? "
+            "ORDER BY run_id DESC LIMIT -1 OFFSET ?",
+            (month, keep_runs),
+        )
+        expired = [r[0] for r in cur.fetchall()]
+        if not expired:
+            return 0
+        cutoff = max(expired)
+        cur.execute(
+            "DELETE FROM monthly_summary_history WHERE month = ? AND run_id <= ?",
+            (month, cutoff),
+        )
+        cur.execute("DELETE FROM summary_runs WHERE month = ? AND run_id <= ?", (month, cutoff))
+        logging.info(f"Retenção: {len(expired)} run(s) antigo(s) de {month} removido(s).")
+        return len(expired)
+
+    def save_all(self, unified_df: pd.DataFrame) -> Dict[str, int]:
         """
         Inicializa schema (se necessário) e grava dados usando uma única conexão.
+        Cada mês gravado gera um novo run no histórico; retorna {mês: run_id}.
         """
         logging.info("Salvando dados no banco de dados...")
-        
+        unified_df = drop_duplicate_summary_rows(unified_df)
+
         # Usar uma única conexão para todas as operações
         with self._get_connection() as conn:
             # 1. Criar schema
             logging.info("Inicializando schema do banco de dados (se necessário)...")
             cur = conn.cursor()
-            cur.executescript(
-                """
-                CREATE TABLE IF NOT EXISTS properties (
-                    property_id TEXT PRIMARY KEY,
-                    condominium TEXT,
-                    city TEXT,
-                    state TEXT,
-                    region TEXT,
-                    status TEXT
-                );
-
-                CREATE TABLE IF NOT EXISTS monthly_summary (
-                    property_id TEXT,
-                    month TEXT,
-                    reservations_count INTEGER,
-                    gross_revenue REAL,
-                    occupied_days INTEGER,
-                    occupancy_rate REAL,
-                    condominium TEXT,
-                    city TEXT,
-                    state TEXT,
-                    region TEXT,
-                    status TEXT,
-                    fee_percentage REAL,
-                    platform_fee_amount REAL,
-                    extra_cost_total REAL,
-                    net_revenue REAL,
-                    margin_value REAL,
-                    margin_percent REAL,
-                    avg_rating REAL,
-                    complaints_list TEXT,
-                    owner_name TEXT,
-                    PRIMARY KEY (property_id, month)
-                );
-                """
-            )
+            self._create_schema(cur)
             conn.commit()
             logging.info("Schema pronto.")
-            
+
             # 2. Salvar properties (INSERT OR REPLACE para evitar duplicatas)
             logging.info("Salvando tabela 'properties'...")
             cols = ["property_id", "condominium", "city", "state", "region", "status"]
             props = unified_df[cols].drop_duplicates("property_id")
-            
-            # Inserir ou atualizar cada propriedade
-            for _, row in props.iterrows():
-                cur.execute("""
-                    INSERT OR REPLACE INTO properties 
-                    (property_id, condominium, city, state, region, status)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, tuple(row))
-            
+
+            # Inserir ou atualizar as propriedades em lote
+            cur.executemany("""
+                INSERT OR REPLACE INTO properties
+                (property_id, condominium, city, state, region, status)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, props.itertuples(index=False, name=None))
+
             conn.commit()
             logging.info("Tabela 'properties' atualizada.")
-            
+
             # 3. Salvar monthly_summary (INSERT OR REPLACE para evitar duplicatas)
             logging.info("Salvando tabela 'monthly_summary'...")
-            
-            # Deletar dados existentes para o mesmo mês antes de inserir
-            month_ref = unified_df['month'].iloc[0] if 'month' in unified_df.columns and len(unified_df) > 0 else None
-            if month_ref:
+
+            # Deletar dados existentes dos meses gravados antes de inserir
+            months = []
+            if 'month' in unified_df.columns:
+                months = sorted(str(m) for m in unified_df['month'].dropna().unique())
+            for month_ref in months:
                 cur.execute("DELETE FROM monthly_summary WHERE month = ?", (month_ref,))
                 logging.info(f"Dados existentes do mês {month_ref} removidos.")
-            
+
             unified_df.to_sql("monthly_summary", conn, if_exists="append", index=False)
             logging.info("Tabela 'monthly_summary' atualizada.")
-        
+
+            # 4. Rollups materializados dos meses gravados
+            self._refresh_rollups(cur, months)
+
+            # 5. Histórico append-only (um run por mês gravado) e retenção
+            run_ids = {}
+            for month_ref in months:
+                run_ids[month_ref] = self._record_run(cur, month_ref)
+                self._apply_retention(cur, month_ref, HISTORY_RETENTION_RUNS)
+                logging.info(f"Histórico: {month_ref} gravado como run {run_ids[month_ref]}.")
+            bump_data_versions(cur, months)
+            conn.commit()
+
+        query_cache.invalidate(self.db_path, months)
         logging.info("Dados salvos com sucesso!")
+        return run_ids
+
+    def get_rollup(self, level: str, month: Optional[str] = None) -> pd.DataFrame:
+        """
+        Lê o rollup materializado de um nível ('city', 'region' ou 'portfolio').
+        """
+        if level not in ROLLUP_LEVELS:
+            raise ValueError(f"Nível de rollup inválido: {level}. Use {list(ROLLUP_LEVELS)}")
+        table, keys = ROLLUP_LEVELS[level]
+        order = ", ".join(["month"] + keys)
+        sql = f"SELECT * FROM {table}"
+        params: tuple = ()
+        if month:
+            sql += " WHERE month = ?"
+            params = (month,)
+        return self._cached_read_sql(
+            f"{sql} ORDER BY {order}", params, [month] if month else None
+        )
+
+    def get_rollup_window(self, level: str, start_month: str, end_month: str) -> pd.DataFrame:
+        """
+        Rollup de um nível para o intervalo de meses [start_month, end_month] (inclusive).
+        """
+        if level not in ROLLUP_LEVELS:
+            raise ValueError(f"Nível de rollup inválido: {level}. Use {list(ROLLUP_LEVELS)}")
+        table, keys = ROLLUP_LEVELS[level]
+        order = ", ".join(["month"] + keys)
+        return self._cached_read_sql(
+            f"SELECT * FROM {table} WHERE month BETWEEN ? AND ? ORDER BY {order}",
+            (start_month, end_month),
+            _months_between(start_month, end_month),
+        )
+
+    def get_summary_window(
+        self,
+        start_month: str,
+        end_month: str,
+        columns: Optional[List[str]] = None
+    ) -> pd.DataFrame:
+        """
+        Linhas de monthly_summary do intervalo [start_month, end_month] numa única
+        leitura (range scan no índice month/net_revenue).
+        """
+        select = ", ".join(["property_id", "month"] + (columns or [])) if columns else "*"
+        return self._cached_read_sql(
+            f"SELECT {select} FROM monthly_summary WHERE month BETWEEN ? AND ? "
+            "ORDER BY month, property_id",
+            (start_month, end_month),
+            _months_between(start_month, end_month),
+        )
+
+    def get_portfolio_stats(self, month: str) -> Optional[Dict]:
+        """
+        Estatísticas consolidadas do mês a partir do rollup de portfólio,
+        no mesmo formato de stats_from_summary. Retorna None se o mês não existir.
+        """
+        try:
+            rollup = self.get_rollup("portfolio", month)
+        except (sqlite3.Error, pd.errors.DatabaseError) as e:
+            logging.warning(f"Rollup de portfólio indisponível: {e}")
+            return None
+        if rollup.empty:
+            return None
+
+        return stats_from_portfolio_rollup(rollup.iloc[0])
+
+    def get_top_properties(self, month: str, n: int = 3) -> List[str]:
+        """
+        Top N imóveis por receita líquida no mês (usa o índice month/net_revenue).
+        """
+        top = self._cached_read_sql(
+            "SELECT property_id FROM monthly_summary WHERE month = ? "
+            "ORDER BY net_revenue DESC LIMIT ?",
+            (month, n),
+            [month],
+        )
+        return top["property_id"].tolist()
+
+    def list_runs(self, month: Optional[str] = None) -> pd.DataFrame:
+        """
+        Lista os runs gravados no histórico (todos os meses ou um mês).
+        """
+        sql = "SELECT month, run_id, created_at, row_count FROM summary_runs"
+        params: tuple = ()
+        if month:
+            sql += " WHERE month = ?"
+            params = (month,)
+        return self._cached_read_sql(
+            sql + " ORDER BY month, run_id", params, [month] if month else None
+        )
+
+    def get_run(self, month: str, run_id: Optional[int] = None) -> pd.DataFrame:
+        """
+        Snapshot de um run do mês; sem run_id, usa a view monthly_summary_current.
+        """
+        if run_id is None:
+            return self._cached_read_sql(
+                "SELECT * FROM monthly_summary_current WHERE month = ?", (month,), [month]
+            )
+        return self._cached_read_sql(
+            "SELECT * FROM monthly_summary_history WHERE month = ? AND run_id = ?",
+            (month, run_id),
+            [month],
+        )
+
+    def diff_runs(
+        self,
+        month: str,
+        run_a: int,
+        run_b: Optional[int] = None,
+        only_changed: bool = True
+    ) -> pd.DataFrame:
+        """
+        O que mudou no mês entre o run `run_a` e o `run_b` (padrão: run atual).
+        """
+        return diff_summary_runs(
+            self.get_run(month, run_a), self.get_run(month, run_b), only_changed
+        )
+
+    def compact_history(self, keep_runs: Optional[int] = None, vacuum: bool = True) -> int:
+        """
+        Aplica a política de retenção em todos os meses e compacta o arquivo.
+        Retorna a quantidade de runs removidos.
+        """
+        keep_runs = HISTORY_RETENTION_RUNS if keep_runs is None else keep_runs
+        removed = 0
+        compacted = []
+        with self._get_connection() as conn:
+            cur = conn.cursor()
+            self._create_schema(cur)
+            months = [r[0] for r in cur.execute("SELECT DISTINCT month FROM summary_runs")]
+            for month in months:
+                expired = self._apply_retention(cur, month, keep_runs)
+                if expired:
+                    removed += expired
+                    compacted.append(month)
+            if compacted:
+                bump_data_versions(cur, compacted)
+            conn.commit()
+            if vacuum and compacted:
+                conn.execute("VACUUM")
+        if compacted:
+            query_cache.invalidate(self.db_path, compacted)
+        logging.info(f"Compactação do histórico concluída: {removed} run(s) removido(s).")
+        return removed
+
+    def _create_feedback_schema(self, cur) -> None:
+        index_exists = cur.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'issue_counts'"
+        ).fetchone()
+        cur.executescript(FEEDBACK_SCHEMA_SQL + ISSUE_INDEX_SCHEMA_SQL)
+        # Bancos criados antes da coluna ai_source (origem da categoria: llm, offline, keywords)
+        columns = {row[1] for row in cur.execute("PRAGMA table_info(guest_feedback)")}
+        if "ai_source" not in columns:
+            cur.execute("ALTER TABLE guest_feedback ADD COLUMN ai_source TEXT")
+        if not index_exists:
+            # Índice novo: preenche com os meses de feedback já gravados
+            months = [row[0] for row in cur.execute("SELECT DISTINCT month FROM guest_feedback")]
+            for month in months:
+                cur.execute(ISSUE_COUNTS_REFRESH_SQL, (month,))
+            cur.connection.commit()
+
+    def save_feedback(self, feedback_df: pd.DataFrame, month: str) -> int:
+        """
+        Persiste os feedbacks do mês (substituindo os anteriores) e atualiza
+        o índice full-text. Aceita o CSV bruto ou o dataframe já classificado.
+        """
+        logging.info("Salvando feedbacks no índice full-text...")
+        rows = pd.DataFrame(index=feedback_df.index)
+        for target, candidates in FEEDBACK_COLUMNS.items():
+            source = next((c for c in candidates if c in feedback_df.columns), None)
+            rows[target] = feedback_df[source] if source else None
+        rows["rating"] = pd.to_numeric(rows["rating"], errors="coerce")
+        rows = rows.astype(object).where(rows.notna(), None)
+        rows.insert(1, "month", month)
+
+        with self._get_connection() as conn:
+            cur = conn.cursor()
+            self._create_feedback_schema(cur)
+            cur.execute("DELETE FROM guest_feedback WHERE month = ?", (month,))
+            cur.executemany(
+                """
+                INSERT INTO guest_feedback
+                (property_id, month, rating, complaints, comment, ai_category, ai_source)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                rows.itertuples(index=False, name=None),
+            )
+            cur.execute("DELETE FROM issue_counts WHERE month = ?", (month,))
+            cur.execute(ISSUE_COUNTS_REFRESH_SQL, (month,))
+            bump_data_versions(cur, [month])
+            conn.commit()
+
+        query_cache.invalidate(self.db_path, [month])
+        logging.info(f"Feedbacks de {month} indexados: {len(rows)} registros.")
+        return len(rows)
+
+    def get_labelled_feedback(self, source: str = "llm") -> pd.DataFrame:
+        """
+        Feedbacks com texto classificados por uma origem (padrão: LLM), base
+        de treino do classificador offline.
+        """
+        return self._cached_read_sql(
+            "SELECT comment AS feedback_text, ai_category FROM guest_feedback "
+            "WHERE ai_source = ? AND comment IS NOT NULL AND ai_category IS NOT NULL",
+            (source,),
+            ensure_feedback_schema=True,
+        )
+
+    def get_recurring_issues(
+        self,
+        month: str,
+        window_months: int = RECURRING_ISSUE_WINDOW_MONTHS,
+        min_count: int = RECURRING_ISSUE_MIN_COUNT,
+        min_months: int = RECURRING_ISSUE_MIN_MONTHS
+    ) -> pd.DataFrame:
+        """
+        Problemas recorrentes de todo o portfólio numa única consulta sobre
+        issue_counts: (imóvel, categoria) com `min_count`+ reclamações em
+        `min_months`+ meses da janela de `window_months` meses terminada em `month`.
+        A categoria 'outro' não gera alerta.
+        """
+        start_month = shift_month(month, -(window_months - 1))
+        return self._cached_read_sql(
+            """
+            SELECT
+                property_id,
+                category,
+                SUM(count) AS total_count,
+                COUNT(*) AS months_with_issue,
+                SUM(CASE WHEN month = ? THEN count ELSE 0 END) AS current_count
+            FROM issue_counts
+            WHERE month BETWEEN ? AND ? AND category <> 'outro'
+            GROUP BY property_id, category
+            HAVING SUM(count) >= ? AND COUNT(*) >= ?
+            ORDER BY total_count DESC, property_id, category
+            """,
+            (month, start_month, month, min_count, min_months),
+            _months_between(start_month, month),
+            ensure_feedback_schema=True,
+        )
+
+    def search_feedback(
+        self,
+        query: str,
+        since_month: Optional[str] = None,
+        until_month: Optional[str] = None,
+        property_id: Optional[str] = None,
+        limit: Optional[int] = 100
+    ) -> pd.DataFrame:
+        """
+        Busca full-text nos comentários e reclamações (ex: "chuveiro", "wifi").
+        Retorna os feedbacks ordenados por relevância (bm25), com um trecho destacado.
+        """
+        match = _fts_query(query)
+        if not match:
+            # MATCH '' é erro de sintaxe no FTS5: consulta sem termos não encontra nada
+            return pd.DataFrame(columns=FEEDBACK_SEARCH_COLUMNS)
+
+        sql = """
+            SELECT f.feedback_id, f.property_id, f.month, f.rating, f.complaints,
+                   f.comment, f.ai_category,
+                   snippet(guest_feedback_fts, 1, '[', ']', '...', 12) AS snippet,
+                   bm25(guest_feedback_fts) AS rank
+            FROM guest_feedback_fts
+            JOIN guest_feedback f ON f.feedback_id = guest_feedback_fts.rowid
+            WHERE guest_feedback_fts MATCH ?
+        """
+        params: list = [match]
+        if since_month:
+            sql += " AND f.month >= ?"
+            params.append(since_month)
+        if until_month:
+            sql += " AND f.month <= ?"
+            params.append(until_month)
+        if property_id:
+            sql += " AND f.property_id = ?"
+            params.append(property_id)
+        sql += " ORDER BY rank"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        return self._cached_read_sql(sql, tuple(params), ensure_feedback_schema=True)
+
+    def properties_with_complaint(
+        self,
+        query: str,
+        last_months: int = 6,
+        reference_month: Optional[str] = None
+    ) -> pd.DataFrame:
+        """
+        Imóveis com feedbacks que citam `query` nos últimos `last_months` meses
+        (até `reference_month`, padrão: último mês indexado), com contagem e
+        meses de ocorrência.
+        """
+        match = _fts_query(query)
+        if not match:
+            return pd.DataFrame(columns=COMPLAINT_PROPERTY_COLUMNS)
+
+        if reference_month is None:
+            latest = self._cached_read_sql(
+                "SELECT MAX(month) AS month FROM guest_feedback", ensure_feedback_schema=True
+            )
+            reference_month = latest["month"].iloc[0]
+        if reference_month is None:
+            return pd.DataFrame(columns=COMPLAINT_PROPERTY_COLUMNS)
+
+        since_month = shift_month(reference_month, -(last_months - 1))
+        return self._cached_read_sql(
+            """
+            SELECT f.property_id,
+                   COUNT(*) AS mentions,
+                   COUNT(DISTINCT f.month) AS months,
+                   MAX(f.month) AS last_month
+            FROM guest_feedback_fts
+            JOIN guest_feedback f ON f.feedback_id = guest_feedback_fts.rowid
+            WHERE guest_feedback_fts MATCH ? AND f.month BETWEEN ? AND ?
+            GROUP BY f.property_id
+            ORDER BY mentions DESC, f.property_id
+            """,
+            (match, since_month, reference_month),
+            ensure_feedback_schema=True,
+        )
+
+
+def create_data_loader(backend: Optional[str] = None):
+    """
+    Retorna o loader do backend configurado (DB_BACKEND): 'sqlite' (padrão) ou 'postgres'.
+    """
+    backend = (backend or DB_BACKEND or "sqlite").lower()
+    if backend == "sqlite":
+        return DataLoader()
+    if backend in ("postgres", "postgresql"):
+        from postgres_loader import PostgresDataLoader
+        return PostgresDataLoader()
+    raise ValueError(f"DB_BACKEND inválido: {backend}. Use 'sqlite' ou 'postgres'.")
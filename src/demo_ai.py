@@ -18,6 +18,7 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from ai_insights import AIInsightsGenerator, PropertyChatbot
+from query_cache import cached_read_sql
 import pandas as pd
 import sqlite3
 
@@ -82,9 +83,10 @@ def demo_resumo_executivo():
         return
     
     conn = sqlite3.connect(db_path)
-    df = pd.read_sql_query(
-        "SELECT * FROM monthly_summary ORDER BY month DESC LIMIT 50", 
-        conn
+    df = cached_read_sql(
+        conn,
+        db_path,
+        "SELECT * FROM monthly_summary ORDER BY month DESC LIMIT 50"
     )
     conn.close()
     
@@ -182,13 +184,14 @@ def demo_insights_propriedade():
         return
     
     conn = sqlite3.connect(db_path)
-    df = pd.read_sql_query(
+    df = cached_read_sql(
+        conn,
+        db_path,
         """
         SELECT * FROM monthly_summary 
         ORDER BY month DESC 
         LIMIT 5
-        """, 
-        conn
+        """
     )
     conn.close()
     
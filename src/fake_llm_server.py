@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+"""
+Servidor local compatível com a API de chat completions da OpenAI, para
+testar e medir as etapas de IA sem custo e sem rede:
+
+    python fake_llm_server.py --port 8765 --latency 0.2 --rate-limit 60 --window 60
+    OPENAI_API_KEY=fake OPENAI_BASE_URL=http://127.0.0.1:8765/v1 python main.py
+
+Respostas determinísticas (dependem só do prompt):
+- lote de classificação: categorias do classificador por palavras-chave
+- lote de sentimento: scores do léxico
+- SQL do chatbot: consulta em monthly_summary (filtrada pelo mês da pergunta, se houver)
+- demais prompts: texto derivado do hash do prompt
+
+Latência configurável (fixa + por token de resposta) e limite de requisições
+por janela: acima dele, responde 429 no formato de erro da OpenAI, com
+Retry-After.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+# Adiciona o diretório src ao path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pandas as pd
+
+_ITEM_PATTERN = re.compile(r'^\d+\. (.*)$', re.M)
+_QUESTION_PATTERN = re.compile(r'Pergunta: "(.*)"')
+_MONTH_PATTERN = re.compile(r'\b\d{4}-\d{2}\b')
+
+
+def _batch_items(prompt: str) -> List[str]:
+    items = []
+    for raw in _ITEM_PATTERN.findall(prompt):
+        try:
+            items.append(str(json.loads(raw)))
+        except ValueError:
+            items.append(raw)
+    return items
+
+
+def fake_completion(prompt: str, max_tokens: int) -> str:
+    """
+    Resposta determinística para o prompt, no formato que cada etapa espera.
+    """
+    from ai_insights import (
+        CLASSIFY_CATEGORIES,
+        KEYWORD_PATTERN,
+        KEYWORD_RANK,
+        lexicon_sentiment,
+    )
+
+    if "Classifique cada feedback" in prompt:
+        default_rank = len(CLASSIFY_CATEGORIES) - 1
+        ranks = [
+            min((KEYWORD_RANK[m] for m in KEYWORD_PATTERN.findall(text.lower())), default=default_rank)
+            for text in _batch_items(prompt)
+        ]
+        return json.dumps([CLASSIFY_CATEGORIES[rank] for rank in ranks], ensure_ascii=False)
+
+    if "Avalie o sentimento" in prompt:
+        scores = lexicon_sentiment(pd.Series(_batch_items(prompt), dtype=object))["sentiment_score"]
+        return json.dumps(scores.round(2).tolist())
+
+    if "Converta a pergunta" in prompt:
+        question = _QUESTION_PATTERN.search(prompt)
+        month = _MONTH_PATTERN.search(question.group(1)) if question else None
+        where = f"WHERE month = '{month.group(0)}' " if month else ""
+        return (
+            "```sql\nSELECT property_id, city, net_revenue, occupancy_rate, avg_rating "
+            f"FROM monthly_summary {where}ORDER BY net_revenue DESC LIMIT 10;\n```"
+        )
+
+    digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    words = min(max(max_tokens // 2, 1), 60)
+    return f"Resposta simulada {digest[:8]}: " + " ".join(
+        digest[i % 56:i % 56 + 8] for i in range(words)
+    )
+
+
+class FakeLLMServer:
+    """
+    Servidor HTTP em thread (ThreadingHTTPServer). `rate_limit` requisições
+    por `window` segundos (0 = sem limite); `latency` segundos por resposta
+    mais `token_latency` por token gerado.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8765,
+        latency: float = 0.2,
+        token_latency: float = 0.0,
+        rate_limit: int = 0,
+        window: float = 60.0
+    ) -> None:
+        self.latency = latency
+        self.token_latency = token_latency
+        self.rate_limit = rate_limit
+        self.window = window
+        self.requests = 0
+        self.rate_limited = 0
+        self._recent: deque = deque()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.requests = 0
+            self.rate_limited = 0
+            self._recent.clear()
+
+    def _admit(self) -> Optional[float]:
+        """
+        Registra a requisição; devolve os segundos de espera se passou do limite.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self.requests += 1
+            if not self.rate_limit:
+                return None
+            while self._recent and self._recent[0] <= now - self.window:
+                self._recent.popleft()
+            if len(self._recent) >= self.rate_limit:
+                self.rate_limited += 1
+                return self._recent[0] + self.window - now
+            self._recent.append(now)
+            return None
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args) -> None:
+                pass
+
+            def _send_json(self, status: int, payload: Dict, headers: Optional[Dict] = None) -> None:
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self) -> None:
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+                    return
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+
+                retry_after = server._admit()
+                if retry_after is not None:
+                    self._send_json(
+                        429,
+                        {"error": {
+                            "message": "Rate limit reached (servidor falso)",
+                            "type": "requests",
+                            "code": "rate_limit_exceeded",
+                        }},
+                        {"Retry-After": f"{max(retry_after, 0.0):.3f}"},
+                    )
+                    return
+
+                prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+                max_tokens = int(body.get("max_tokens") or 256)
+                content = fake_completion(prompt, max_tokens)
+                completion_tokens = len(content) // 4 + 1
+                time.sleep(server.latency + server.token_latency * completion_tokens)
+                self._send_json(200, {
+                    "id": "chatcmpl-fake-" + hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12],
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", "fake"),
+                    "choices": [{
+                        "index": 0,
+                        "finish_reason": "stop",
+                        "message": {"role": "assistant", "content": content},
+                    }],
+                    "usage": {
+                        "prompt_tokens": len(prompt) // 4 + 1,
+                        "completion_tokens": completion_tokens,
+                        "total_tokens": len(prompt) // 4 + 1 + completion_tokens,
+                    },
+                })
+
+        return Handler
+
+    def start(self) -> str:
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local compatível com a API da OpenAI.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2, help="Segundos por resposta")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Segundos por token gerado")
+    parser.add_argument("--rate-limit", type=int, default=0, help="Requisições por janela (0 = sem limite)")
+    parser.add_argument("--window", type=float, default=60.0, help="Janela do limite, em segundos")
+    args = parser.parse_args()
+
+    server = FakeLLMServer(
+        args.host, args.port, args.latency, args.token_latency, args.rate_limit, args.window
+    )
+    print(f"Servidor falso de LLM em {server.base_url} (Ctrl+C para parar)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
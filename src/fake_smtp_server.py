@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+"""
+Servidor SMTP local para testes e benchmarks de envio de email: aceita
+EHLO/HELO, AUTH (PLAIN e LOGIN, qualquer credencial), MAIL, RCPT, DATA,
+RSET, NOOP e QUIT, e descarta as mensagens (guarda só contadores).
+
+`latency` simula o tempo de ida e volta de cada resposta do servidor, que é
+o que pesa ao abrir uma conexão nova (saudação, EHLO, AUTH) para cada email:
+
+    python fake_smtp_server.py --port 8025 --latency 0.02
+    SMTP_HOST=127.0.0.1 SMTP_PORT=8025 SMTP_STARTTLS=false SMTP_USER=x SMTP_PASSWORD=x python main.py
+
+Não implementa STARTTLS: use SMTP_STARTTLS=false.
+"""
+
+import argparse
+import socketserver
+import threading
+import time
+from typing import Optional
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class FakeSMTPServer:
+    """
+    Servidor SMTP em thread (ThreadingTCPServer), uma thread por conexão.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8025, latency: float = 0.0) -> None:
+        self.latency = latency
+        self.connections = 0
+        self.messages = 0
+        self.bytes_received = 0
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.tcp = _TCPServer((host, port), self._handler())
+
+    @property
+    def address(self):
+        return self.tcp.server_address[:2]
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.connections = 0
+            self.messages = 0
+            self.bytes_received = 0
+
+    def _handler(self):
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line: str) -> None:
+                if server.latency:
+                    time.sleep(server.latency)
+                self.wfile.write(line.encode("ascii") + b"\r\n")
+
+            def handle(self) -> None:
+                with server._lock:
+                    server.connections += 1
+                self.reply("220 fake-smtp pronto")
+                while True:
+                    raw = self.rfile.readline()
+                    if not raw:
+                        return
+                    command = raw.decode("utf-8", "replace").strip()
+                    verb = command.split(" ", 1)[0].upper()
+                    if verb == "EHLO":
+                        self.wfile.write(b"250-fake-smtp\r\n250-AUTH PLAIN LOGIN\r\n")
+                        self.reply("250 8BITMIME")
+                    elif verb == "HELO":
+                        self.reply("250 fake-smtp")
+                    elif verb == "AUTH":
+                        parts = command.split()
+                        if len(parts) == 2 and parts[1].upper() == "LOGIN":
+                            self.reply("334 VXNlcm5hbWU6")
+                            self.rfile.readline()
+                            self.reply("334 UGFzc3dvcmQ6")
+                            self.rfile.readline()
+                        elif len(parts) == 2:
+                            self.reply("334 ")
+                            self.rfile.readline()
+                        self.reply("235 2.7.0 autenticado")
+                    elif verb in ("MAIL", "RCPT", "RSET", "NOOP"):
+                        self.reply("250 OK")
+                    elif verb == "DATA":
+                        self.reply("354 fim com <CRLF>.<CRLF>")
+                        size = 0
+                        while True:
+                            line = self.rfile.readline()
+                            if not line or line in (b".\r\n", b".\n"):
+                                break
+                            size += len(line)
+                        with server._lock:
+                            server.messages += 1
+                            server.bytes_received += size
+                        self.reply("250 OK mensagem aceita")
+                    elif verb == "QUIT":
+                        self.reply("221 tchau")
+                        return
+                    else:
+                        self.reply("502 comando nao implementado")
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.tcp.serve_forever, daemon=True)
+        self._thread.start()
+        return self.address
+
+    def stop(self) -> None:
+        self.tcp.shutdown()
+        self.tcp.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor SMTP local que descarta as mensagens.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--latency", type=float, default=0.0, help="Segundos por resposta do servidor")
+    args = parser.parse_args()
+
+    server = FakeSMTPServer(args.host, args.port, args.latency)
+    print(f"Servidor SMTP falso em {args.host}:{args.port} (Ctrl+C para parar)")
+    try:
+        server.tcp.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.tcp.server_close()
+        print(f"{server.connections} conexões, {server.messages} mensagens")
+
+
+if __name__ == "__main__":
+    main()
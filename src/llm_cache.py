@@ -0,0 +1,194 @@
+# src/llm_cache.py
+
+"""
+Cache persistente (SQLite) das respostas de LLM.
+
+Chave: (modelo, hash do prompt, temperatura). O hash cobre as mensagens e o
+max_tokens. Entradas expiram após LLM_CACHE_TTL_HOURS e, acima de
+LLM_CACHE_MAX_ENTRIES, as menos usadas recentemente são removidas (LRU por
+last_used_at). Por padrão só chamadas determinísticas (temperatura 0) entram
+no cache; LLM_CACHE_ALL_TEMPERATURES=true inclui as demais.
+
+As estatísticas do run (hits, latência e tokens economizados) ficam em memória
+e são registradas no log ao final do fechamento.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from utils import ensure_dir
+
+LLM_CACHE_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS llm_cache (
+    model TEXT NOT NULL,
+    prompt_hash TEXT NOT NULL,
+    temperature REAL NOT NULL,
+    response TEXT NOT NULL,
+    prompt_tokens INTEGER,
+    completion_tokens INTEGER,
+    latency REAL,
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL,
+    PRIMARY KEY (model, prompt_hash, temperature)
+);
+
+CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache (last_used_at);
+"""
+
+
+def prompt_hash(messages: List[Dict[str, str]], max_tokens: int) -> str:
+    payload = json.dumps(
+        {"messages": messages, "max_tokens": max_tokens}, sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Cache de respostas em SQLite, compartilhado entre threads do processo.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttl_hours: float = 720,
+        max_entries: int = 10000,
+        all_temperatures: bool = False,
+        enabled: bool = True
+    ) -> None:
+        self.path = path
+        self.ttl_seconds = ttl_hours * 3600
+        self.max_entries = max_entries
+        self.all_temperatures = all_temperatures
+        self.enabled = enabled
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self.saved_tokens = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            ensure_dir(os.path.dirname(self.path) or ".")
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.executescript(LLM_CACHE_SCHEMA_SQL)
+        return self._conn
+
+    def should_cache(self, temperature: float) -> bool:
+        return self.enabled and (temperature == 0 or self.all_temperatures)
+
+    def get(self, model: str, key: str, temperature: float) -> Optional[Dict]:
+        """
+        Resposta em cache ainda válida (dentro do TTL), ou None.
+        """
+        now = time.time()
+        with self._lock:
+            try:
+                conn = self._connection()
+                row = conn.execute(
+                    """
+                    SELECT response, prompt_tokens, completion_tokens, latency
+                    FROM llm_cache
+                    WHERE model = ? AND prompt_hash = ? AND temperature = ? AND created_at >= ?
+                    """,
+                    (model, key, temperature, now - self.ttl_seconds),
+                ).fetchone()
+                if row is None:
+                    self.misses += 1
+                    return None
+                conn.execute(
+                    "UPDATE llm_cache SET last_used_at = ? "
+                    "WHERE model = ? AND prompt_hash = ? AND temperature = ?",
+                    (now, model, key, temperature),
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                logging.warning(f"Cache de LLM indisponível: {e}")
+                return None
+
+            content, prompt_tokens, completion_tokens, latency = row
+            self.hits += 1
+            self.saved_seconds += latency or 0.0
+            self.saved_tokens += (prompt_tokens or 0) + (completion_tokens or 0)
+        return {
+            "content": content,
+            "prompt_tokens": prompt_tokens or 0,
+            "completion_tokens": completion_tokens or 0,
+        }
+
+    def put(self, model: str, key: str, temperature: float, response: Dict, latency: float) -> None:
+        """
+        Grava a resposta e aplica TTL e limite de entradas (LRU).
+        """
+        now = time.time()
+        with self._lock:
+            try:
+                conn = self._connection()
+                conn.execute(
+                    """
+                    INSERT OR REPLACE INTO llm_cache (
+                        model, prompt_hash, temperature, response, prompt_tokens,
+                        completion_tokens, latency, created_at, last_used_at
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (
+                        model, key, temperature, response["content"],
+                        response["prompt_tokens"], response["completion_tokens"],
+                        latency, now, now,
+                    ),
+                )
+                conn.execute(
+                    "DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_seconds,)
+                )
+                if self.max_entries > 0:
+                    conn.execute(
+                        """
+                        DELETE FROM llm_cache WHERE rowid IN (
+                            SELECT rowid FROM llm_cache ORDER BY last_used_at DESC
+                            LIMIT -1 OFFSET ?
+                        )
+                        """,
+                        (self.max_entries,),
+                    )
+                conn.commit()
+            except sqlite3.Error as e:
+                logging.warning(f"Não foi possível gravar no cache de LLM: {e}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connection().execute("DELETE FROM llm_cache")
+            self._connection().commit()
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "saved_seconds": self.saved_seconds,
+            "saved_tokens": self.saved_tokens,
+        }
+
+    def log_stats(self) -> None:
+        stats = self.stats()
+        logging.info(
+            f"Cache de LLM: {stats['hits']} hits, {stats['misses']} misses "
+            f"({stats['hit_rate']:.0%}), {stats['saved_seconds']:.1f}s e "
+            f"{stats['saved_tokens']:,} tokens economizados"
+        )
+
+
+llm_cache = LLMResponseCache(
+    path=os.getenv("LLM_CACHE_PATH", "data/llm_cache.sqlite"),
+    ttl_hours=float(os.getenv("LLM_CACHE_TTL_HOURS", "720")),
+    max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000")),
+    all_temperatures=os.getenv("LLM_CACHE_ALL_TEMPERATURES", "false").lower() in ("1", "true", "yes"),
+    enabled=os.getenv("LLM_CACHE_ENABLED", "true").lower() not in ("0", "false", "no"),
+)
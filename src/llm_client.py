@@ -0,0 +1,314 @@
+# src/llm_client.py
+
+"""
+Cliente compartilhado de LLM (API compatível com OpenAI).
+
+OPENAI_BASE_URL permite apontar para um endpoint local compatível (Ollama,
+vLLM ou um servidor falso de testes). RateLimiter e TokenBudget limitam as
+chamadas concorrentes de um run: requisições por minuto e tokens totais.
+Todas as chamadas passam pelo cache persistente de respostas (llm_cache) e
+são registradas em llm_metrics (latência, tokens, custo e resultado por
+ponto de chamada).
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from llm_cache import llm_cache, prompt_hash
+from utils import ensure_dir
+
+_CLIENT = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def llm_settings() -> Dict:
+    """
+    Configuração das chamadas de LLM lida do ambiente.
+    """
+    return {
+        "api_key": os.getenv("OPENAI_API_KEY", ""),
+        "base_url": os.getenv("OPENAI_BASE_URL", "") or None,
+        "timeout": float(os.getenv("LLM_TIMEOUT", "60")),
+        "max_concurrency": int(os.getenv("LLM_MAX_CONCURRENCY", "4")),
+        "requests_per_minute": int(os.getenv("LLM_REQUESTS_PER_MINUTE", "60")),
+        # Tokens (prompt + resposta) por run; 0 = sem limite
+        "token_budget": int(os.getenv("LLM_TOKEN_BUDGET", "0")),
+        "classify_batch_size": int(os.getenv("LLM_CLASSIFY_BATCH_SIZE", "50")),
+        # Preço por 1k tokens, para converter orçamentos em dinheiro para tokens
+        "cost_per_1k_tokens": float(os.getenv("LLM_COST_PER_1K_TOKENS", "0")),
+        # Orçamento dos insights por imóvel (tokens e/ou custo); 0 = sem limite
+        "insight_token_budget": int(os.getenv("INSIGHT_TOKEN_BUDGET", "0")),
+        "insight_cost_budget": float(os.getenv("INSIGHT_COST_BUDGET", "0")),
+    }
+
+
+def budget_limit(token_budget: int, cost_budget: float, cost_per_1k_tokens: float) -> int:
+    """
+    Limite em tokens que respeita os dois orçamentos (o menor deles); 0 = sem limite.
+    O orçamento de custo só vale se o preço por 1k tokens estiver configurado.
+    """
+    limits = [token_budget] if token_budget > 0 else []
+    if cost_budget > 0 and cost_per_1k_tokens > 0:
+        limits.append(int(cost_budget / cost_per_1k_tokens * 1000))
+    return min(limits) if limits else 0
+
+
+def get_client():
+    """
+    Cliente OpenAI do processo (criado uma vez). Levanta ImportError se a
+    biblioteca openai não estiver instalada.
+    """
+    global _CLIENT
+    with _CLIENT_LOCK:
+        if _CLIENT is None:
+            from openai import OpenAI
+
+            settings = llm_settings()
+            _CLIENT = OpenAI(
+                api_key=settings["api_key"],
+                base_url=settings["base_url"],
+                timeout=settings["timeout"],
+                max_retries=0,
+            )
+        return _CLIENT
+
+
+def reset_client() -> None:
+    """
+    Descarta o cliente do processo; o próximo get_client relê a configuração.
+    """
+    global _CLIENT
+    with _CLIENT_LOCK:
+        _CLIENT = None
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimativa grosseira de tokens (~4 caracteres por token) para o orçamento.
+    """
+    return len(text) // 4 + 1
+
+
+def chat_completion(
+    messages: List[Dict[str, str]],
+    model: str,
+    max_tokens: int,
+    temperature: float = 0.0,
+    cache: Optional[bool] = None,
+    limiter: Optional["RateLimiter"] = None,
+    call_site: str = "outro"
+) -> Dict:
+    """
+    Uma chamada de chat completion. Retorna o texto da resposta, o uso de
+    tokens e se veio do cache persistente (llm_cache). `cache=None` segue a
+    política padrão (só temperatura 0); True/False força a decisão.
+    O `limiter` só é consultado quando a chamada vai de fato à API.
+
+    Toda chamada é registrada em llm_metrics sob `call_site`.
+    """
+    if cache is None:
+        use_cache = llm_cache.should_cache(temperature)
+    else:
+        use_cache = cache and llm_cache.enabled
+    key = prompt_hash(messages, max_tokens) if use_cache else None
+    if use_cache:
+        start = time.perf_counter()
+        cached = llm_cache.get(model, key, temperature)
+        if cached is not None:
+            llm_metrics.record(
+                call_site, model, cached["prompt_tokens"], cached["completion_tokens"],
+                time.perf_counter() - start, "cached",
+            )
+            return {**cached, "cached": True}
+
+    if limiter is not None:
+        limiter.acquire()
+    start = time.perf_counter()
+    try:
+        response = get_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+        )
+    except Exception as e:
+        llm_metrics.record(call_site, model, 0, 0, time.perf_counter() - start, "error", type(e).__name__)
+        raise
+    latency = time.perf_counter() - start
+
+    usage = getattr(response, "usage", None)
+    result = {
+        "content": (response.choices[0].message.content or "").strip(),
+        "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+    }
+    llm_metrics.record(
+        call_site, model, result["prompt_tokens"], result["completion_tokens"], latency, "ok"
+    )
+    if use_cache:
+        llm_cache.put(model, key, temperature, result, latency)
+    return {**result, "cached": False}
+
+
+class LLMMetrics:
+    """
+    Registro das chamadas de LLM do run: ponto de chamada, modelo, tokens,
+    latência e resultado (ok, cached ou error). O resumo agrega por ponto de
+    chamada, com p50/p95/p99 de latência das chamadas que foram à API e o
+    custo estimado (LLM_COST_PER_1K_TOKENS; respostas do cache não custam).
+    """
+
+    def __init__(self) -> None:
+        self.records: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        call_site: str,
+        model: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        latency: float,
+        outcome: str,
+        error: Optional[str] = None
+    ) -> None:
+        with self._lock:
+            self.records.append({
+                "call_site": call_site,
+                "model": model,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "latency": latency,
+                "outcome": outcome,
+                "error": error,
+            })
+
+    def reset(self) -> None:
+        with self._lock:
+            self.records = []
+
+    def summary(self) -> Dict[str, Dict]:
+        with self._lock:
+            records = list(self.records)
+        cost_per_1k = llm_settings()["cost_per_1k_tokens"]
+
+        by_site: Dict[str, List[Dict]] = {}
+        for record in records:
+            by_site.setdefault(record["call_site"], []).append(record)
+
+        summary = {}
+        for call_site, site_records in sorted(by_site.items()):
+            outcomes = [r["outcome"] for r in site_records]
+            api_calls = [r for r in site_records if r["outcome"] != "cached"]
+            latencies = np.array([r["latency"] for r in api_calls], dtype=np.float64)
+            prompt_tokens = sum(r["prompt_tokens"] for r in api_calls)
+            completion_tokens = sum(r["completion_tokens"] for r in api_calls)
+            p50, p95, p99 = (
+                np.percentile(latencies, [50, 95, 99]) if len(latencies) else (0.0, 0.0, 0.0)
+            )
+            summary[call_site] = {
+                "models": sorted({r["model"] for r in site_records}),
+                "calls": len(site_records),
+                "ok": outcomes.count("ok"),
+                "cached": outcomes.count("cached"),
+                "errors": outcomes.count("error"),
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "estimated_cost": round((prompt_tokens + completion_tokens) / 1000 * cost_per_1k, 4),
+                "latency_total": round(float(latencies.sum()), 3),
+                "latency_p50": round(float(p50), 3),
+                "latency_p95": round(float(p95), 3),
+                "latency_p99": round(float(p99), 3),
+            }
+        return summary
+
+    def log_summary(self) -> None:
+        for call_site, stats in self.summary().items():
+            logging.info(
+                f"LLM [{call_site}]: {stats['calls']} chamadas ({stats['cached']} do cache, "
+                f"{stats['errors']} erros), {stats['prompt_tokens'] + stats['completion_tokens']:,} "
+                f"tokens, custo estimado {stats['estimated_cost']:.4f}, latência "
+                f"p50 {stats['latency_p50']:.2f}s / p95 {stats['latency_p95']:.2f}s / "
+                f"p99 {stats['latency_p99']:.2f}s"
+            )
+
+    def write(self, path: str) -> str:
+        """
+        Grava o resumo por ponto de chamada em JSON.
+        """
+        ensure_dir(os.path.dirname(path) or ".")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        return path
+
+
+llm_metrics = LLMMetrics()
+
+
+class RateLimiter:
+    """
+    Limita as chamadas a `per_minute` requisições por minuto, espaçadas
+    uniformemente entre as threads que compartilham o limitador.
+    """
+
+    def __init__(self, per_minute: int) -> None:
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next_slot = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next_slot, now)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class TokenBudget:
+    """
+    Orçamento de tokens de um run, compartilhado entre threads.
+    `limit` 0 significa sem limite.
+    """
+
+    def __init__(self, limit: int = 0) -> None:
+        self.limit = limit
+        self.reserved = 0
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: int) -> bool:
+        """
+        Reserva `tokens` antes de uma chamada. False se o orçamento não comporta.
+        """
+        with self._lock:
+            if self.limit and self.used + self.reserved + tokens > self.limit:
+                return False
+            self.reserved += tokens
+            return True
+
+    def settle(self, reserved: int, used: Optional[int] = None) -> None:
+        """
+        Troca a reserva pelo uso real informado pela API (ou libera se a chamada falhou).
+        """
+        with self._lock:
+            self.reserved -= reserved
+            self.used += used or 0
+
+    @property
+    def exhausted(self) -> bool:
+        return bool(self.limit) and self.used + self.reserved >= self.limit
+
+    def log_usage(self, label: str) -> None:
+        limit = f"{self.limit:,}" if self.limit else "sem limite"
+        logging.info(f"{label}: {self.used:,} tokens usados (orçamento: {limit})")
@@ -3,19 +3,23 @@
 import argparse
 import logging
 import os
+import sqlite3
 import sys
 
 # Garante que imports funcionem tanto rodando de src/ quanto da raiz
 if __name__ == "__main__":
     sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from config import DEFAULT_MONTH, OUTPUT_DIR
+from config import DEFAULT_MONTH, EXECUTIVE_PDF_ENABLED, OUTPUT_DIR
 from data_collector import DataCollector
 from data_transformer import DataTransformer
-from data_loader import DataLoader
+from data_loader import DataLoader, create_data_loader, stats_from_summary
 from report_generator import ReportGenerator
-from notification_service import NotificationService
+from notification_service import NotificationService, new_run_id
 from ai_insights import AIInsightsGenerator
+from llm_cache import llm_cache
+from llm_client import llm_metrics
+from query_cache import query_cache
 from utils import get_previous_month_str, ensure_dir
 
 def configure_logging():
@@ -40,23 +44,19 @@ def parse_args():
         help="Mês de referência no formato YYYY-MM. Se omitido, usa o mês anterior.",
         default=DEFAULT_MONTH or None
     )
+    parser.add_argument(
+        "--force-reports",
+        action="store_true",
+        help="Regenera todos os relatórios, ignorando o cache por hash de conteúdo."
+    )
     return parser.parse_args()
 
-def calculate_stats(df) -> dict:
-    """Calcula estatísticas consolidadas para o resumo executivo."""
-    return {
-        "total_properties": len(df),
-        "total_revenue": df["gross_revenue"].sum(),
-        "net_revenue": df["net_revenue"].sum(),
-        "avg_occupancy": df["occupancy_rate"].mean() * 100,
-        "avg_rating": df["avg_rating"].mean(),
-        "total_reservations": df["reservations_count"].sum(),
-    }
-
 def main():
     configure_logging()
     args = parse_args()
     notifier = NotificationService()
+    # Identifica esta execução nas chaves de idempotência das notificações
+    run_id = new_run_id()
 
     month = args.month or get_previous_month_str()
     logging.info(f"Iniciando processo de fechamento para o mês {month}")
@@ -71,9 +71,12 @@ def main():
         unified_df = transformer.process(raw_data)
 
         # 3. Persistência no banco de dados
-        loader = DataLoader()
+        loader = create_data_loader()
         loader.save_all(unified_df)
 
+        # Estatísticas consolidadas vêm do rollup materializado do mês
+        stats = loader.get_portfolio_stats(month) or stats_from_summary(unified_df)
+
         # 4. Análises com IA
         logging.info("Iniciando análises com IA...")
         ai = AIInsightsGenerator()
@@ -82,73 +85,76 @@ def main():
         if 'feedback' in raw_data and not raw_data['feedback'].empty:
             feedback_classified = ai.classify_complaints(raw_data['feedback'])
             logging.info(f"Feedbacks classificados: {len(feedback_classified)} registros")
+
+            # Sentimento por feedback (léxico, IA só nos ambíguos) e média por imóvel
+            feedback_classified = ai.analyze_sentiment(feedback_classified)
+            unified_df = ai.add_property_sentiment(unified_df, feedback_classified)
             
             feedback_path = os.path.join(OUTPUT_DIR, "feedbacks_classificados.csv")
             feedback_classified.to_csv(feedback_path, index=False)
             logging.info(f"Feedbacks classificados salvos em {feedback_path}")
-        
-        # 4.2. Detectar problemas recorrentes
-        if 'feedback' in raw_data and not raw_data['feedback'].empty:
-            recurring_issues = ai.detect_recurring_issues(feedback_classified)
+
+            # Índice full-text de feedbacks (FTS5 do SQLite, qualquer que seja o DB_BACKEND)
+            recurring = None
+            try:
+                feedback_store = DataLoader()
+                feedback_store.save_feedback(feedback_classified, month)
+                # Rótulos do LLM alimentam o classificador offline (usado sem OPENAI_API_KEY)
+                if (feedback_classified['ai_source'] == 'llm').any():
+                    ai.train_offline_classifier(feedback_store.get_labelled_feedback("llm"))
+
+                # 4.2. Problemas recorrentes entre meses (índice persistido, todo o portfólio)
+                recurring = feedback_store.get_recurring_issues(month)
+                recurring_path = os.path.join(OUTPUT_DIR, "problemas_recorrentes.csv")
+                recurring.to_csv(recurring_path, index=False)
+                recurring_issues = recurring.groupby('property_id')['category'].agg(list).to_dict()
+            except sqlite3.OperationalError as e:
+                logging.warning(f"Não foi possível indexar os feedbacks: {e}")
+
+            if recurring is None:
+                recurring_issues = ai.detect_recurring_issues(feedback_classified)
             if recurring_issues:
                 logging.warning(f"AVISO: Problemas recorrentes detectados em {len(recurring_issues)} imóveis:")
-                for prop, issues in recurring_issues.items():
+                for property_id, issues in recurring_issues.items():
                     logging.warning(f"   - {property_id}: {', '.join(issues)}")
         
         # 4.3. Gerar resumo executivo
-        executive_summary = ai.generate_executive_summary(unified_df, month)
+        executive_summary = ai.generate_executive_summary(unified_df, month, stats)
         summary_path = os.path.join(OUTPUT_DIR, "resumo_executivo.txt")
         with open(summary_path, 'w', encoding='utf-8') as f:
             f.write(executive_summary)
         logging.info(f"Resumo executivo salvo em {summary_path}")
         
-        # 4.4. Gerar insights por imóvel 
+        # 4.4. Gerar insights por imóvel (margem negativa ou nota baixa, piores primeiro)
         logging.info("Gerando insights individuais por imóvel...")
-        insights = []
-        
-        # Top 5 melhores
-        top5 = unified_df.nlargest(5, 'net_revenue')
-        for idx, row in top5.iterrows():
-            insight = ai.generate_property_insight(row)
-            insights.append({
-                'property_id': row['property_id'],
-                'city': row['city'],
-                'tipo': 'Top Performance',
-                'insight': insight
-            })
-        
-        # 5 piores
-        bottom5 = unified_df.nsmallest(5, 'net_revenue')
-        for idx, row in bottom5.iterrows():
-            insight = ai.generate_property_insight(row)
-            insights.append({
-                'property_id': row['property_id'],
-                'city': row['city'],
-                'tipo': 'Atenção Necessária',
-                'insight': insight
-            })
-        
-        # Salvar insights
-        import pandas as pd
-        insights_df = pd.DataFrame(insights)
+        insights_df = ai.generate_property_insights(unified_df)
         insights_path = os.path.join(OUTPUT_DIR, "insights_ia.csv")
         insights_df.to_csv(insights_path, index=False)
         logging.info(f"Insights de IA salvos em {insights_path}")
         
         # 5. Geração de relatórios
-        reports = ReportGenerator()
+        reports = ReportGenerator(force=args.force_reports)
         paths = reports.generate(unified_df)
-
-        # 6. Cálculo de estatísticas consolidadas
-        stats = calculate_stats(unified_df)
+        paths["owner_statements"] = reports.generate_owner_statements(unified_df)
+        paths.update(reports.generate_trend_report(loader, month))
+        if EXECUTIVE_PDF_ENABLED:
+            pdf_path = reports.generate_executive_pdf(unified_df, month, stats)
+            if pdf_path:
+                paths["executive_pdf"] = pdf_path
 
         logging.info("Processo concluído com sucesso.")
         logging.info(f"Relatórios gerados: {paths}")
         logging.info(f"Estatísticas: {stats}")
-
-        # Notificação de sucesso
-        notifier.send_success_notification(month, paths)
-        notifier.send_daily_summary(month, stats)
+        query_cache.log_stats()
+        llm_cache.log_stats()
+        # Latência, tokens e custo das chamadas de LLM por ponto de chamada
+        llm_metrics.log_summary()
+        llm_metrics.write(os.path.join(OUTPUT_DIR, "metricas_llm.json"))
+
+        # Notificação de sucesso (gravada na caixa de saída; os envios seguem em
+        # segundo plano e o que falhar fica para o worker notification_outbox.py)
+        notifier.send_success_notification(month, paths, run_id)
+        notifier.send_daily_summary(month, stats, run_id)
 
     except Exception as e:
         logging.exception(f"Erro durante o processo: {e}")
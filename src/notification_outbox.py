@@ -0,0 +1,265 @@
+# src/notification_outbox.py
+
+"""
+Caixa de saída persistente (SQLite) das notificações.
+
+O fechamento grava cada notificação já renderizada (canal + payload JSON) e
+segue em frente; a entrega acontece depois, em segundo plano no próprio
+processo (NOTIFY_OUTBOX_INLINE) e/ou pelo worker separado:
+
+    python notification_outbox.py            # entrega o que está pendente e sai
+    python notification_outbox.py --loop 60  # fica entregando a cada 60s
+
+Cada notificação tem uma chave de idempotência, com o identificador da
+execução do fechamento (ex.: "fechamento:2025-10:20251101T080000:sucesso:email"):
+gravar a mesma chave de novo não cria outra entrega, e um novo fechamento do
+mesmo mês gera chaves novas. Envios que falham voltam
+para a fila com espera exponencial (NOTIFY_RETRY_BASE * 2^tentativas, até
+NOTIFY_RETRY_MAX) e, após NOTIFY_MAX_ATTEMPTS tentativas, ficam como 'failed'.
+Uma notificação em envio fica reservada por `lease_seconds`; se o processo
+morrer no meio, outro worker a retoma depois desse prazo. A entrega é "pelo
+menos uma vez": o Message-ID dos emails deriva da chave, para que reenvios
+raros possam ser reconhecidos como duplicados.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+# Garante que imports funcionem tanto rodando de src/ quanto da raiz
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils import ensure_dir
+
+NOTIFICATION_OUTBOX_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS notification_outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    channel TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    sent_at REAL
+);
+
+CREATE INDEX IF NOT EXISTS idx_notification_outbox_due
+    ON notification_outbox (status, next_attempt_at);
+"""
+
+
+class NotificationOutbox:
+    """
+    Fila durável de notificações em SQLite, compartilhada entre threads e
+    processos (WAL; a reserva de envios é feita numa transação IMMEDIATE).
+    Status: pending -> sending -> sent, ou de volta a pending (nova tentativa)
+    e, esgotadas as tentativas, failed.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_attempts: int = 8,
+        retry_base: float = 60.0,
+        retry_max: float = 3600.0,
+        lease_seconds: float = 300.0
+    ) -> None:
+        self.path = path
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.lease_seconds = lease_seconds
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            ensure_dir(os.path.dirname(self.path) or ".")
+            conn = sqlite3.connect(
+                self.path, timeout=30, isolation_level=None, check_same_thread=False
+            )
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.executescript(NOTIFICATION_OUTBOX_SCHEMA_SQL)
+            self._conn = conn
+        return self._conn
+
+    def enqueue(self, key: str, channel: str, payload: Dict) -> bool:
+        """
+        Grava a notificação para entrega. False se a chave já existia
+        (notificação já enfileirada ou entregue antes).
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._connection().execute(
+                """
+                INSERT OR IGNORE INTO notification_outbox (
+                    idempotency_key, channel, payload, next_attempt_at, created_at, updated_at
+                ) VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (key, channel, json.dumps(payload, ensure_ascii=False), now, now, now),
+            )
+        return cursor.rowcount == 1
+
+    def claim(self, limit: int = 100) -> List[Dict]:
+        """
+        Reserva até `limit` notificações vencidas (pendentes, ou em envio com
+        a reserva expirada) e as devolve com o payload decodificado.
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = conn.execute(
+                    """
+                    SELECT id, idempotency_key, channel, payload, attempts
+                    FROM notification_outbox
+                    WHERE status IN ('pending', 'sending') AND next_attempt_at <= ?
+                    ORDER BY next_attempt_at, id
+                    LIMIT ?
+                    """,
+                    (now, limit),
+                ).fetchall()
+                conn.executemany(
+                    "UPDATE notification_outbox SET status = 'sending', next_attempt_at = ?, "
+                    "updated_at = ? WHERE id = ?",
+                    [(now + self.lease_seconds, now, row[0]) for row in rows],
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return [
+            {
+                "id": row_id,
+                "key": key,
+                "channel": channel,
+                "payload": json.loads(payload),
+                "attempts": attempts,
+            }
+            for row_id, key, channel, payload, attempts in rows
+        ]
+
+    def complete(self, row_id: int, error: Optional[str] = None) -> None:
+        """
+        Registra o resultado de uma entrega: sent, ou nova tentativa com espera
+        exponencial (failed após max_attempts).
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            if error is None:
+                conn.execute(
+                    "UPDATE notification_outbox SET status = 'sent', attempts = attempts + 1, "
+                    "last_error = NULL, sent_at = ?, updated_at = ? WHERE id = ?",
+                    (now, now, row_id),
+                )
+                return
+            (attempts,) = conn.execute(
+                "SELECT attempts + 1 FROM notification_outbox WHERE id = ?", (row_id,)
+            ).fetchone()
+            status = "failed" if attempts >= self.max_attempts else "pending"
+            delay = min(self.retry_base * 2 ** (attempts - 1), self.retry_max)
+            conn.execute(
+                "UPDATE notification_outbox SET status = ?, attempts = ?, next_attempt_at = ?, "
+                "last_error = ?, updated_at = ? WHERE id = ?",
+                (status, attempts, now + delay, error, now, row_id),
+            )
+        if status == "failed":
+            logging.error(f"Notificação {row_id} descartada após {attempts} tentativas: {error}")
+
+    def retry_failed(self) -> int:
+        """
+        Devolve as notificações 'failed' para a fila, com as tentativas zeradas.
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._connection().execute(
+                "UPDATE notification_outbox SET status = 'pending', attempts = 0, "
+                "next_attempt_at = ?, updated_at = ? WHERE status = 'failed'",
+                (now, now),
+            )
+        return cursor.rowcount
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT status, COUNT(*) FROM notification_outbox GROUP BY status"
+            ).fetchall()
+        return dict(rows)
+
+    def log_stats(self) -> None:
+        stats = self.stats()
+        logging.info(
+            f"Caixa de saída de notificações: {stats.get('pending', 0)} pendentes, "
+            f"{stats.get('sending', 0)} em envio, {stats.get('sent', 0)} enviadas, "
+            f"{stats.get('failed', 0)} com falha"
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def outbox_from_env() -> NotificationOutbox:
+    return NotificationOutbox(
+        path=os.getenv("NOTIFY_OUTBOX_PATH", "data/notification_outbox.sqlite"),
+        max_attempts=int(os.getenv("NOTIFY_MAX_ATTEMPTS", "8")),
+        retry_base=float(os.getenv("NOTIFY_RETRY_BASE", "60")),
+        retry_max=float(os.getenv("NOTIFY_RETRY_MAX", "3600")),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Entrega as notificações pendentes da caixa de saída.")
+    parser.add_argument(
+        "--loop", type=float, default=0, metavar="SEGUNDOS",
+        help="Repete a entrega a cada SEGUNDOS (0 = uma vez e sai)"
+    )
+    parser.add_argument(
+        "--retry-failed", action="store_true",
+        help="Devolve para a fila as notificações que esgotaram as tentativas"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    from notification_service import NotificationService
+
+    # Entrega síncrona, direto pela caixa de saída
+    os.environ["NOTIFY_WORKERS"] = "0"
+    os.environ["NOTIFY_OUTBOX_INLINE"] = "false"
+    notifier = NotificationService()
+    if notifier.outbox is None:
+        logging.error("Caixa de saída desabilitada (NOTIFY_OUTBOX_ENABLED=false)")
+        sys.exit(1)
+
+    if args.retry_failed:
+        logging.info(f"{notifier.outbox.retry_failed()} notificações devolvidas para a fila")
+    try:
+        while True:
+            notifier.deliver_outbox()
+            notifier.outbox.log_stats()
+            if not args.loop:
+                break
+            time.sleep(args.loop)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        notifier.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,381 @@
 # src/notification_service.py
 
+import atexit
+import hashlib
+import io
+import json
 import logging
+import queue
 import smtplib
 import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import zipfile
+from collections import OrderedDict
+from contextlib import contextmanager
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
 from email import encoders
-from typing import List, Optional
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 from datetime import datetime
 
+from notification_outbox import outbox_from_env
+
+
+def new_run_id() -> str:
+    """
+    Identificador de uma execução do fechamento (data/hora), usado nas chaves
+    de idempotência das notificações.
+    """
+    return f"{datetime.now():%Y%m%dT%H%M%S}"
+
+
+def file_digests(paths: List[Optional[str]]) -> Dict[str, str]:
+    """
+    SHA-256 do conteúdo de cada arquivo existente em `paths`. Gravado com a
+    notificação: os relatórios têm o mesmo nome todo mês, e uma nova tentativa
+    não pode anexar os dados de outro fechamento.
+    """
+    digests = {}
+    for path in dict.fromkeys(paths):
+        if not path or not os.path.exists(path):
+            continue
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                sha.update(chunk)
+        digests[path] = sha.hexdigest()
+    return digests
+
+
+class NotificationDispatcher:
+    """
+    Fila de notificações enviadas por threads em segundo plano, para que o
+    fechamento não espere SMTP ou Slack.
+
+    As threads são daemon: na saída do processo, drain() (chamado por
+    NotificationService.close, registrado no atexit) espera a fila esvaziar
+    por no máximo `drain_timeout` segundos e registra o que ficou sem envio.
+    `workers=0` envia de forma síncrona.
+    A latência de cada envio é registrada por canal.
+    """
+
+    def __init__(self, workers: int = 2, drain_timeout: float = 30.0) -> None:
+        self.workers = workers
+        self.drain_timeout = drain_timeout
+        self.latencies: Dict[str, List[float]] = {}
+        self.failures: Dict[str, int] = {}
+        self._queue: "queue.Queue" = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+
+    def submit(self, channel: str, send: Callable[..., bool], *args, **kwargs) -> None:
+        """
+        Enfileira um envio; `send` retorna True se a notificação foi entregue.
+        """
+        if self.workers <= 0:
+            self._run(channel, send, args, kwargs, time.perf_counter())
+            return
+        self._start()
+        self._queue.put((channel, send, args, kwargs, time.perf_counter()))
+
+    def _start(self) -> None:
+        with self._lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(
+                    target=self._worker, name=f"notificacoes-{len(self._threads)}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def _worker(self) -> None:
+        while True:
+            channel, send, args, kwargs, queued_at = self._queue.get()
+            try:
+                self._run(channel, send, args, kwargs, queued_at)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, channel: str, send: Callable[..., bool], args, kwargs, queued_at: float) -> None:
+        start = time.perf_counter()
+        try:
+            ok = send(*args, **kwargs)
+        except Exception as e:
+            logging.error(f"Erro ao enviar notificação [{channel}]: {e}")
+            ok = False
+        elapsed = time.perf_counter() - start
+        self.record(channel, elapsed, 0 if ok else 1)
+        logging.info(
+            f"Notificação [{channel}] {'enviada' if ok else 'não enviada'} em {elapsed:.2f}s "
+            f"({start - queued_at:.2f}s na fila)"
+        )
+
+    def record(self, channel: str, elapsed: float, failures: int = 0) -> None:
+        """
+        Registra a latência de um envio (ou lote) do canal e quantas
+        notificações dele falharam.
+        """
+        with self._lock:
+            self.latencies.setdefault(channel, []).append(elapsed)
+            if failures:
+                self.failures[channel] = self.failures.get(channel, 0) + failures
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """
+        Espera os envios pendentes por no máximo `timeout` segundos (padrão:
+        drain_timeout). Retorna False se algum ficou pendente.
+        """
+        timeout = self.drain_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._queue.all_tasks_done.wait(remaining)
+            pending = self._queue.unfinished_tasks
+
+        if pending:
+            logging.warning(f"{pending} notificações não enviadas após {timeout:g}s de espera")
+        self.log_stats()
+        return not pending
+
+    def log_stats(self) -> None:
+        with self._lock:
+            stats = {channel: list(values) for channel, values in self.latencies.items()}
+            failures = dict(self.failures)
+        for channel, values in sorted(stats.items()):
+            logging.info(
+                f"Notificações [{channel}]: {len(values)} envios "
+                f"({failures.get(channel, 0)} falhas), latência média "
+                f"{sum(values) / len(values):.2f}s, máxima {max(values):.2f}s"
+            )
+
+
+class SMTPSessionPool:
+    """
+    Conexões SMTP autenticadas reaproveitadas entre emails: cada sessão faz
+    STARTTLS e login uma vez e envia várias mensagens. Até `size` sessões
+    simultâneas (uma por thread de envio); as ociosas ficam abertas para os
+    próximos envios até close().
+
+    Se a conexão cai (desconexão, timeout, 421), a sessão é descartada e a
+    mensagem é reenviada uma vez numa conexão nova. Depois de `max_messages`
+    mensagens a sessão é renovada, como exigem vários provedores.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        user: str = "",
+        password: str = "",
+        timeout: float = 30.0,
+        starttls: bool = True,
+        size: int = 2,
+        max_messages: int = 100
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.timeout = timeout
+        self.starttls = starttls
+        self.max_messages = max_messages
+        self.connections = 0
+        self.reconnects = 0
+        self._idle: List[List] = []
+        self._slots = threading.BoundedSemaphore(max(size, 1))
+        self._lock = threading.Lock()
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                server.starttls()
+            if self.user:
+                server.login(self.user, self.password)
+        except Exception:
+            server.close()
+            raise
+        with self._lock:
+            self.connections += 1
+        return server
+
+    @staticmethod
+    def _discard(server: Optional[smtplib.SMTP]) -> None:
+        if server is None:
+            return
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    @staticmethod
+    def _connection_lost(error: Exception) -> bool:
+        """
+        True se a sessão caiu (vale reconectar e reenviar). Toda SMTPException
+        é OSError, então recusas definitivas da mensagem (destinatário
+        inválido, dados rejeitados) precisam ser separadas das falhas de socket.
+        """
+        if isinstance(error, smtplib.SMTPServerDisconnected):
+            return True
+        if isinstance(error, smtplib.SMTPResponseException):
+            return error.smtp_code == 421
+        return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+    @contextmanager
+    def _session(self) -> Iterator[List]:
+        """
+        Sessão ociosa (ou vazia, conectada sob demanda): [conexão, mensagens enviadas].
+        """
+        self._slots.acquire()
+        with self._lock:
+            session = self._idle.pop() if self._idle else [None, 0]
+        try:
+            yield session
+        finally:
+            with self._lock:
+                if session[0] is not None:
+                    self._idle.append(session)
+            self._slots.release()
+
+    def send_many(self, messages: List[MIMEMultipart]) -> List[Optional[Exception]]:
+        """
+        Envia as mensagens em sequência pela mesma sessão. Retorna, por
+        mensagem, None se enviada ou o erro do envio.
+        """
+        errors: List[Optional[Exception]] = []
+        with self._session() as session:
+            for i, msg in enumerate(messages):
+                error = None
+                for attempt in range(2):
+                    try:
+                        if session[0] is None or session[1] >= self.max_messages:
+                            self._discard(session[0])
+                            session[:] = [None, 0]
+                            session[0] = self._connect()
+                        session[0].send_message(msg)
+                        session[1] += 1
+                        error = None
+                        break
+                    except Exception as e:
+                        error = e
+                        if attempt == 0 and self._connection_lost(e):
+                            self._discard(session[0])
+                            session[:] = [None, 0]
+                            with self._lock:
+                                self.reconnects += 1
+                            continue
+                        break
+                errors.append(error)
+                if error is not None and session[0] is None:
+                    # Servidor inacessível: não insiste nas mensagens seguintes
+                    errors.extend([error] * (len(messages) - i - 1))
+                    break
+        return errors
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for server, _ in idle:
+            self._discard(server)
+
+
+class ReportAttachments:
+    """
+    Anexos dos relatórios: os arquivos vão compactados num único zip,
+    codificado em base64 uma vez e reaproveitado (mesma parte MIME) em todos
+    os emails com os mesmos arquivos, enquanto eles não mudarem (tamanho e
+    data de modificação).
+
+    Se o zip passa de `max_bytes`, ele é gravado ao lado dos relatórios e o
+    email leva o caminho (ou o link, com `base_url`) em vez do anexo. O nome
+    do zip depende só dos nomes dos relatórios: cada fechamento sobrescreve o
+    anterior em vez de acumular arquivos.
+    """
+
+    def __init__(self, max_bytes: int = 10 * 1024 * 1024, base_url: str = "", max_entries: int = 8) -> None:
+        self.max_bytes = max_bytes
+        self.base_url = base_url.rstrip("/")
+        self.max_entries = max_entries
+        self.encoded = 0
+        self.reused = 0
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def prepare(self, paths: List[str]) -> Tuple[List[MIMEBase], Optional[str]]:
+        """
+        Partes MIME a anexar e, se o zip ficou grande demais, o HTML com o
+        caminho/link do arquivo (sem partes).
+        """
+        files = [path for path in dict.fromkeys(paths) if path and os.path.exists(path)]
+        if not files:
+            return [], None
+        stats = [os.stat(path) for path in files]
+        key = tuple((path, st.st_size, st.st_mtime_ns) for path, st in zip(files, stats))
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+                self.reused += 1
+                return cached
+            result = self._build(files, key)
+            self._entries[key] = result
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self.encoded += 1
+        return result
+
+    def _build(self, files: List[str], key: tuple) -> Tuple[List[MIMEBase], Optional[str]]:
+        if sum(size for _, size, _ in key) <= self.max_bytes:
+            # Sem compressão já cabe no limite: zip em memória
+            buffer = io.BytesIO()
+            self._write_zip(buffer, files)
+            if buffer.tell() <= self.max_bytes:
+                return [self._part(buffer.getvalue())], None
+
+        with tempfile.TemporaryFile() as tmp:
+            self._write_zip(tmp, files)
+            size = tmp.tell()
+            tmp.seek(0)
+            if size <= self.max_bytes:
+                return [self._part(tmp.read())], None
+
+            names = "\n".join(os.path.basename(path) for path in files)
+            digest = hashlib.sha256(names.encode("utf-8")).hexdigest()[:8]
+            zip_path = os.path.join(os.path.dirname(os.path.abspath(files[0])), f"relatorios_{digest}.zip")
+            partial = zip_path + ".tmp"
+            with open(partial, "wb") as f:
+                shutil.copyfileobj(tmp, f)
+            os.replace(partial, zip_path)
+
+        location = f"{self.base_url}/{os.path.basename(zip_path)}" if self.base_url else zip_path
+        logging.info(f"Relatórios compactados com {size / 1024 / 1024:.1f} MB; enviando {location} em vez do anexo")
+        return [], (
+            f'<p><strong>Relatórios:</strong> o arquivo compactado ({size / 1024 / 1024:.1f} MB) '
+            f'passa do limite de anexo e está disponível em <a href="{location}">{location}</a></p>'
+        )
+
+    @staticmethod
+    def _write_zip(target, files: List[str]) -> None:
+        with zipfile.ZipFile(target, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            for path in files:
+                zf.write(path, arcname=os.path.basename(path))
+
+    @staticmethod
+    def _part(data: bytes) -> MIMEBase:
+        part = MIMEBase('application', 'zip')
+        part.set_payload(data)
+        encoders.encode_base64(part)
+        part.add_header('Content-Disposition', 'attachment; filename=relatorios.zip')
+        return part
+
+
 class NotificationService:
     """
     Serviço centralizado para envio de notificações sobre o fechamento mensal.
@@ -29,12 +395,73 @@ class NotificationService:
         self.it_team = os.getenv("IT_EMAILS", "ti@company.com").split(",")
         
         self.slack_webhook = os.getenv("SLACK_WEBHOOK_URL", "")
+
+        # Tempo limite (s) de cada canal
+        self.smtp_timeout = float(os.getenv("SMTP_TIMEOUT", "30"))
+        self.slack_timeout = float(os.getenv("SLACK_TIMEOUT", "10"))
+
+        # Envios em segundo plano; o fechamento não espera os canais
+        workers = int(os.getenv("NOTIFY_WORKERS", "2"))
+        self.dispatcher = NotificationDispatcher(
+            workers=workers,
+            drain_timeout=float(os.getenv("NOTIFY_DRAIN_TIMEOUT", "30")),
+        )
+
+        # Sessões SMTP reaproveitadas entre emails (uma por thread de envio)
+        self.smtp_pool = SMTPSessionPool(
+            self.smtp_host,
+            self.smtp_port,
+            self.smtp_user,
+            self.smtp_password,
+            timeout=self.smtp_timeout,
+            starttls=os.getenv("SMTP_STARTTLS", "true").lower() in ("1", "true", "yes"),
+            size=workers,
+            max_messages=int(os.getenv("SMTP_MAX_MESSAGES_PER_SESSION", "100")),
+        )
+
+        # Caixa de saída durável: o fechamento só grava as notificações; a entrega
+        # (com novas tentativas) segue em segundo plano e/ou no worker separado
+        self.outbox = None
+        if os.getenv("NOTIFY_OUTBOX_ENABLED", "true").lower() not in ("0", "false", "no"):
+            self.outbox = outbox_from_env()
+        self.outbox_inline = os.getenv("NOTIFY_OUTBOX_INLINE", "true").lower() not in ("0", "false", "no")
+
+        # Relatórios compactados e codificados uma vez para todos os emails
+        self.attachments = ReportAttachments(
+            max_bytes=int(float(os.getenv("NOTIFY_ATTACHMENT_MAX_MB", "10")) * 1024 * 1024),
+            base_url=os.getenv("NOTIFY_ATTACHMENT_BASE_URL", ""),
+        )
+        self._outbox_enqueued = 0
+        self._delivery_pending = False
+        self._delivery_lock = threading.Lock()
+        atexit.register(self.close)
+
+    def close(self) -> None:
+        """
+        Espera os envios pendentes (limitado por NOTIFY_DRAIN_TIMEOUT) e
+        encerra as sessões SMTP. Chamado automaticamente na saída do processo.
+        O que não foi entregue continua na caixa de saída para o worker.
+        """
+        atexit.unregister(self.close)
+        self.dispatcher.drain()
+        self.smtp_pool.close()
+        if self.outbox is not None:
+            if self._outbox_enqueued:
+                self.outbox.log_stats()
+            self.outbox.close()
         
-    def send_success_notification(self, month: str, report_paths: dict) -> None:
+    def send_success_notification(
+        self, month: str, report_paths: dict, run_id: Optional[str] = None
+    ) -> None:
         """
-        Envia notificação de sucesso após fechamento mensal.
+        Envia notificação de sucesso após fechamento mensal (caixa de saída e
+        entrega em segundo plano, ver _notify). `run_id` identifica a execução
+        nas chaves de idempotência: novas tentativas da mesma execução não
+        duplicam o envio, um novo fechamento do mês é notificado de novo
+        (padrão: data/hora da chamada).
         """
         logging.info("Enviando notificações de sucesso...")
+        run_id = run_id or new_run_id()
         
         subject = f"OK Fechamento Mensal {month} - Concluído com Sucesso"
         
@@ -89,19 +516,25 @@ class NotificationService:
             self.operations_team + 
             self.support_team
         ))
+        attachments = [
+            report_paths.get('financial'),
+            report_paths.get('quality'),
+            report_paths.get('occupancy')
+        ]
         
-        self._send_email(
+        self._notify(
+            "email",
+            f"fechamento:{month}:{run_id}:sucesso:email",
             to_emails=all_recipients,
             subject=subject,
             html_body=html_body,
-            attachments=[
-                report_paths.get('financial'),
-                report_paths.get('quality'),
-                report_paths.get('occupancy')
-            ]
+            attachments=attachments,
+            attachment_digests=file_digests(attachments)
         )
         
-        self._send_slack_notification(
+        self._notify(
+            "slack",
+            f"fechamento:{month}:{run_id}:sucesso:slack",
             message=f"OK Fechamento mensal {month} concluído com sucesso!",
             color="good"
         )
@@ -153,23 +586,33 @@ class NotificationService:
         </body>
         </html>
         """
-        
-        self._send_email(
+
+        # O mesmo erro no mesmo dia notifica uma vez só
+        error_id = hashlib.sha256(
+            f"{datetime.now():%Y-%m-%d}:{type(error).__name__}:{error}".encode("utf-8")
+        ).hexdigest()[:12]
+        self._notify(
+            "email",
+            f"fechamento:{month}:erro:{error_id}:email",
             to_emails=self.it_team,
             subject=subject,
             html_body=html_body
         )
         
         # Alerta crítico no Slack
-        self._send_slack_notification(
+        self._notify(
+            "slack",
+            f"fechamento:{month}:erro:{error_id}:slack",
             message=f" ERRO no fechamento mensal {month}: {str(error)}",
             color="danger"
         )
         
-    def send_daily_summary(self, month: str, stats: dict) -> None:
+    def send_daily_summary(self, month: str, stats: dict, run_id: Optional[str] = None) -> None:
         """
-        Envia resumo executivo do fechamento para liderança.
+        Envia resumo executivo do fechamento para liderança (`run_id` como em
+        send_success_notification).
         """
+        run_id = run_id or new_run_id()
         subject = f" Resumo Executivo - Fechamento {month}"
         
         html_body = f"""
@@ -215,60 +658,226 @@ class NotificationService:
         
         # Envia apenas para liderança
         leadership_emails = os.getenv("LEADERSHIP_EMAILS", "diretoria@company.com").split(",")
-        self._send_email(
+        self._notify(
+            "email",
+            f"fechamento:{month}:{run_id}:resumo:email",
             to_emails=leadership_emails,
             subject=subject,
             html_body=html_body
         )
     
+    def send_emails(self, messages: List[Dict], keys: Optional[List[str]] = None) -> None:
+        """
+        Envia vários emails numa única sessão SMTP, em segundo plano. Cada
+        item tem as chaves de _send_email: to_emails, subject, html_body e,
+        opcionalmente, attachments (ex.: um email por proprietário ou equipe).
+        `keys` são as chaves de idempotência na caixa de saída (padrão: hash
+        do conteúdo de cada email).
+        """
+        if self.outbox is None:
+            self.dispatcher.submit("email", self._send_emails, messages)
+            return
+        for i, message in enumerate(messages):
+            self._notify("email", keys[i] if keys else None, **message)
+
+    def _notify(self, channel: str, key: Optional[str] = None, **payload) -> None:
+        """
+        Grava a notificação na caixa de saída e agenda a entrega em segundo
+        plano (NOTIFY_OUTBOX_INLINE); o que falhar fica para novas tentativas.
+        Sem caixa de saída (ou se ela estiver indisponível), envia direto pelo
+        dispatcher, sem novas tentativas. `key` é a chave de idempotência
+        (padrão: hash do canal e do conteúdo).
+        """
+        send = self._send_email if channel == "email" else self._send_slack_notification
+        if self.outbox is None:
+            self.dispatcher.submit(channel, send, **payload)
+            return
+
+        # Canal não configurado: nada a entregar, nem depois
+        if channel == "email" and not (self.smtp_user and self.smtp_password):
+            logging.warning("Credenciais SMTP não configuradas. Email não enviado.")
+            return
+        if channel == "slack" and not self.slack_webhook:
+            logging.warning("Webhook do Slack não configurado.")
+            return
+
+        if key is None:
+            content = json.dumps([channel, payload], sort_keys=True, ensure_ascii=False)
+            key = f"{channel}:" + hashlib.sha256(content.encode("utf-8")).hexdigest()
+        try:
+            created = self.outbox.enqueue(key, channel, payload)
+        except sqlite3.Error as e:
+            logging.warning(f"Caixa de saída indisponível ({e}); envio sem novas tentativas")
+            self.dispatcher.submit(channel, send, **payload)
+            return
+        if not created:
+            logging.info(f"Notificação {key} já enfileirada anteriormente; ignorada")
+            return
+        self._outbox_enqueued += 1
+        if self.outbox_inline:
+            self._schedule_delivery()
+
+    def _schedule_delivery(self) -> None:
+        """
+        Agenda uma entrega da caixa de saída no dispatcher (uma por vez na fila).
+        """
+        with self._delivery_lock:
+            if self._delivery_pending:
+                return
+            self._delivery_pending = True
+        self.dispatcher.submit("outbox", self._deliver_scheduled)
+
+    def _deliver_scheduled(self) -> bool:
+        with self._delivery_lock:
+            self._delivery_pending = False
+        _, failed = self.deliver_outbox()
+        return failed == 0
+
+    def deliver_outbox(self, batch_size: int = 100) -> Tuple[int, int]:
+        """
+        Entrega as notificações vencidas da caixa de saída (emails do mesmo
+        lote numa única sessão SMTP) e registra o resultado de cada uma.
+        Latência e falhas entram nas estatísticas do dispatcher por canal:
+        uma medida por lote de emails e uma por mensagem do Slack.
+        Retorna (enviadas, com falha).
+        """
+        sent = failed = 0
+        while True:
+            rows = self.outbox.claim(batch_size)
+            if not rows:
+                return sent, failed
+
+            errors: Dict[int, Optional[str]] = {}
+            emails = [row for row in rows if row["channel"] == "email"]
+            if emails:
+                start = time.perf_counter()
+                results = self._deliver_emails([
+                    {**row["payload"], "message_id": self._message_id(row["key"])} for row in emails
+                ])
+                elapsed = time.perf_counter() - start
+                email_failures = sum(error is not None for error in results)
+                self.dispatcher.record("email", elapsed, email_failures)
+                logging.info(
+                    f"Notificação [email] lote de {len(emails)} em {elapsed:.2f}s "
+                    f"({email_failures} falhas)"
+                )
+                errors.update((row["id"], error) for row, error in zip(emails, results))
+            for row in rows:
+                if row["channel"] == "slack":
+                    start = time.perf_counter()
+                    ok = self._send_slack_notification(**row["payload"])
+                    elapsed = time.perf_counter() - start
+                    self.dispatcher.record("slack", elapsed, 0 if ok else 1)
+                    logging.info(
+                        f"Notificação [slack] {'enviada' if ok else 'não enviada'} em {elapsed:.2f}s"
+                    )
+                    errors[row["id"]] = None if ok else "falha no envio ao Slack"
+                elif row["channel"] != "email":
+                    errors[row["id"]] = f"canal desconhecido: {row['channel']}"
+
+            for row in rows:
+                self.outbox.complete(row["id"], errors[row["id"]])
+                if errors[row["id"]] is None:
+                    sent += 1
+                else:
+                    failed += 1
+
+    def _message_id(self, key: str) -> str:
+        """
+        Message-ID estável por chave de idempotência: reenvios do mesmo email
+        podem ser reconhecidos como duplicados pelo destinatário.
+        """
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+        return f"<{digest}@{self.from_email.rsplit('@', 1)[-1]}>"
+
+    def _build_email(
+        self,
+        to_emails: List[str],
+        subject: str,
+        html_body: str,
+        attachments: Optional[List[str]] = None,
+        message_id: Optional[str] = None,
+        attachment_digests: Optional[Dict[str, str]] = None
+    ) -> MIMEMultipart:
+        # Relatório regravado desde o enfileiramento (ex: fechamento do mês
+        # seguinte): não anexa dados de outro mês com este assunto
+        if attachment_digests:
+            current = file_digests(list(attachment_digests))
+            changed = [path for path, digest in attachment_digests.items() if current.get(path) != digest]
+            if changed:
+                raise ValueError(f"anexos alterados desde o enfileiramento: {', '.join(changed)}")
+
+        msg = MIMEMultipart()
+        msg['From'] = self.from_email
+        msg['To'] = ', '.join(to_emails)
+        msg['Subject'] = subject
+        if message_id:
+            msg['Message-ID'] = message_id
+
+        # Anexos: zip único reaproveitado entre emails, ou link se for grande demais
+        parts, note = self.attachments.prepare(attachments or [])
+        if note:
+            if "</body>" in html_body:
+                html_body = html_body.replace("</body>", note + "</body>", 1)
+            else:
+                html_body += note
+
+        msg.attach(MIMEText(html_body, 'html'))
+        for part in parts:
+            msg.attach(part)
+        return msg
+
     def _send_email(
         self, 
         to_emails: List[str], 
         subject: str, 
         html_body: str,
-        attachments: Optional[List[str]] = None
+        attachments: Optional[List[str]] = None,
+        attachment_digests: Optional[Dict[str, str]] = None
     ) -> bool:
         """
-        Envia email via SMTP.
+        Envia email via SMTP (sessão reaproveitada do smtp_pool).
+        """
+        return self._send_emails([{
+            "to_emails": to_emails,
+            "subject": subject,
+            "html_body": html_body,
+            "attachments": attachments,
+            "attachment_digests": attachment_digests,
+        }])
+
+    def _send_emails(self, messages: List[Dict]) -> bool:
+        """
+        Monta e envia os emails pela mesma sessão SMTP. True se todos foram enviados.
+        """
+        return all(error is None for error in self._deliver_emails(messages))
+
+    def _deliver_emails(self, messages: List[Dict]) -> List[Optional[str]]:
+        """
+        Monta e envia os emails pela mesma sessão SMTP. Retorna, por email,
+        None se foi enviado ou a descrição do erro.
         """
         if not self.smtp_user or not self.smtp_password:
             logging.warning("Credenciais SMTP não configuradas. Email não enviado.")
-            return False
-            
-        try:
-            msg = MIMEMultipart()
-            msg['From'] = self.from_email
-            msg['To'] = ', '.join(to_emails)
-            msg['Subject'] = subject
-            
-            msg.attach(MIMEText(html_body, 'html'))
-            
-            # Anexar arquivos
-            if attachments:
-                for file_path in attachments:
-                    if file_path and os.path.exists(file_path):
-                        with open(file_path, 'rb') as f:
-                            part = MIMEBase('application', 'octet-stream')
-                            part.set_payload(f.read())
-                            encoders.encode_base64(part)
-                            part.add_header(
-                                'Content-Disposition',
-                                f'attachment; filename={os.path.basename(file_path)}'
-                            )
-                            msg.attach(part)
-            
-            # Conecta e envia
-            with smtplib.SMTP(self.smtp_host, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.smtp_user, self.smtp_password)
-                server.send_message(msg)
-            
-            logging.info(f"Email enviado com sucesso para: {', '.join(to_emails)}")
-            return True
-            
-        except Exception as e:
-            logging.error(f"Erro ao enviar email: {e}")
-            return False
+            return ["credenciais SMTP não configuradas"] * len(messages)
+
+        results: List[Optional[str]] = [None] * len(messages)
+        built = []
+        for i, message in enumerate(messages):
+            try:
+                built.append((i, message, self._build_email(**message)))
+            except Exception as e:
+                logging.error(f"Erro ao montar email '{message.get('subject')}': {e}")
+                results[i] = f"erro ao montar email: {e}"
+        
+        errors = self.smtp_pool.send_many([msg for _, _, msg in built])
+        for (i, message, _), error in zip(built, errors):
+            if error is None:
+                logging.info(f"Email enviado com sucesso para: {', '.join(message['to_emails'])}")
+            else:
+                logging.error(f"Erro ao enviar email: {error}")
+                results[i] = f"{type(error).__name__}: {error}"
+        return results
     
     def _send_slack_notification(self, message: str, color: str = "good") -> bool:
         """
@@ -290,7 +899,7 @@ class NotificationService:
                 }]
             }
             
-            response = requests.post(self.slack_webhook, json=payload)
+            response = requests.post(self.slack_webhook, json=payload, timeout=self.slack_timeout)
             response.raise_for_status()
             
             logging.info("Notificação Slack enviada com sucesso")
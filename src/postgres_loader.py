@@ -0,0 +1,420 @@
+# src/postgres_loader.py
+
+"""
+Backend PostgreSQL para persistência do fechamento mensal.
+
+Carga em massa via COPY FROM STDIN (buffer em memória) para tabelas temporárias,
+seguida de upsert nas tabelas definitivas. Conexões vêm de um pool compartilhado.
+Requer psycopg2 (psycopg2-binary) e DATABASE_URL configurada.
+"""
+
+import io
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from config import DATABASE_URL, HISTORY_RETENTION_RUNS, PG_POOL_MAX, PG_POOL_MIN
+from data_loader import (
+    ROLLUP_LEVELS,
+    ROLLUP_METRICS,
+    diff_summary_runs,
+    drop_duplicate_summary_rows,
+    stats_from_portfolio_rollup,
+)
+
+PROPERTIES_COLUMNS = {
+    "property_id": "TEXT PRIMARY KEY",
+    "condominium": "TEXT",
+    "city": "TEXT",
+    "state": "TEXT",
+    "region": "TEXT",
+    "status": "TEXT",
+}
+
+MONTHLY_SUMMARY_COLUMNS = {
+    "property_id": "TEXT",
+    "month": "TEXT",
+    "reservations_count": "INTEGER",
+    "gross_revenue": "DOUBLE PRECISION",
+    "occupied_days": "INTEGER",
+    "occupancy_rate": "DOUBLE PRECISION",
+    "condominium": "TEXT",
+    "city": "TEXT",
+    "state": "TEXT",
+    "region": "TEXT",
+    "status": "TEXT",
+    "fee_percentage": "DOUBLE PRECISION",
+    "platform_fee_amount": "DOUBLE PRECISION",
+    "extra_cost_total": "DOUBLE PRECISION",
+    "net_revenue": "DOUBLE PRECISION",
+    "margin_value": "DOUBLE PRECISION",
+    "margin_percent": "DOUBLE PRECISION",
+    "avg_rating": "DOUBLE PRECISION",
+    "complaints_list": "TEXT",
+    "owner_name": "TEXT",
+}
+
+_PG_TYPES = {"INTEGER": "BIGINT", "REAL": "DOUBLE PRECISION"}
+
+_pools: Dict[str, object] = {}
+_pools_lock = threading.Lock()
+
+
+def _get_pool(dsn: str):
+    """
+    Pool de conexões compartilhado por DSN (um por processo).
+    """
+    from psycopg2.pool import ThreadedConnectionPool
+
+    with _pools_lock:
+        if dsn not in _pools:
+            _pools[dsn] = ThreadedConnectionPool(PG_POOL_MIN, PG_POOL_MAX, dsn)
+        return _pools[dsn]
+
+
+def _schema_sql() -> str:
+    statements = []
+    props_cols = ",\n    ".join(f"{c} {t}" for c, t in PROPERTIES_COLUMNS.items())
+    statements.append(f"CREATE TABLE IF NOT EXISTS properties (\n    {props_cols}\n);")
+
+    summary_cols = ",\n    ".join(f"{c} {t}" for c, t in MONTHLY_SUMMARY_COLUMNS.items())
+    statements.append(
+        f"CREATE TABLE IF NOT EXISTS monthly_summary (\n    {summary_cols},\n"
+        f"    PRIMARY KEY (property_id, month)\n);"
+    )
+    statements.append(
+        "CREATE INDEX IF NOT EXISTS idx_monthly_summary_month_net "
+        "ON monthly_summary (month, net_revenue);"
+    )
+
+    # Histórico append-only por run (mesma estrutura do backend SQLite)
+    statements.append(
+        "CREATE TABLE IF NOT EXISTS summary_runs (\n"
+        "    month TEXT,\n    run_id INTEGER,\n    created_at TEXT,\n"
+        "    row_count INTEGER,\n    PRIMARY KEY (month, run_id)\n);"
+    )
+    history_cols = ",\n    ".join(
+        f"{c} {t}" for c, t in MONTHLY_SUMMARY_COLUMNS.items() if c not in ("property_id", "month")
+    )
+    statements.append(
+        "CREATE TABLE IF NOT EXISTS monthly_summary_history (\n"
+        f"    property_id TEXT,\n    month TEXT,\n    run_id INTEGER,\n    {history_cols},\n"
+        "    PRIMARY KEY (property_id, month, run_id)\n);"
+    )
+    statements.append(
+        "CREATE INDEX IF NOT EXISTS idx_summary_history_month_run "
+        "ON monthly_summary_history (month, run_id);"
+    )
+    statements.append(
+        "CREATE OR REPLACE VIEW monthly_summary_current AS\n"
+        "SELECT h.* FROM monthly_summary_history h\n"
+        "JOIN (SELECT month, MAX(run_id) AS run_id FROM summary_runs GROUP BY month) latest\n"
+        "  ON h.month = latest.month AND h.run_id = latest.run_id;"
+    )
+
+    metric_cols = ",\n    ".join(
+        f"{name} {_PG_TYPES[sql_type]}" for name, sql_type, _ in ROLLUP_METRICS
+    )
+    for table, keys in ROLLUP_LEVELS.values():
+        key_cols = "".join(f"{key} TEXT,\n    " for key in keys)
+        statements.append(
+            f"CREATE TABLE IF NOT EXISTS {table} (\n"
+            f"    month TEXT,\n    {key_cols}{metric_cols},\n"
+            f"    PRIMARY KEY (month{''.join(', ' + key for key in keys)})\n);"
+        )
+    return "\n\n".join(statements)
+
+
+def _to_copy_buffer(df: pd.DataFrame, columns: Dict[str, str]) -> io.StringIO:
+    """
+    Serializa o dataframe em CSV (sem header) num buffer em memória para o COPY.
+    Valores ausentes e strings vazias viram campos vazios sem aspas, que o COPY
+    lê como NULL.
+    """
+    frame = df[list(columns)].copy()
+    for col, sql_type in columns.items():
+        if sql_type.startswith("INTEGER"):
+            frame[col] = pd.to_numeric(frame[col], errors="coerce").round().astype("Int64")
+
+    buffer = io.StringIO()
+    frame.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    return buffer
+
+
+class PostgresDataLoader:
+    """
+    Mesma interface de DataLoader (save_all, get_rollup, get_portfolio_stats,
+    get_top_properties), gravando no PostgreSQL.
+    """
+
+    def __init__(self, dsn: Optional[str] = None) -> None:
+        self.dsn = dsn or DATABASE_URL
+        if not self.dsn:
+            raise ValueError("DATABASE_URL não configurada para o backend PostgreSQL")
+        self.pool = _get_pool(self.dsn)
+
+    @contextmanager
+    def _get_connection(self):
+        """
+        Empresta uma conexão do pool; commit ao final ou rollback em caso de erro.
+        """
+        conn = self.pool.getconn()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.pool.putconn(conn)
+
+    def init_schema(self) -> None:
+        logging.info("Inicializando schema do PostgreSQL (se necessário)...")
+        with self._get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(_schema_sql())
+        logging.info("Schema pronto.")
+
+    def _copy_into_staging(self, cur, df: pd.DataFrame, table: str, columns: Dict[str, str]) -> str:
+        """
+        Cria uma tabela temporária espelhando `table` e carrega o dataframe via COPY.
+        """
+        staging = f"staging_{table}"
+        cur.execute(
+            f"CREATE TEMP TABLE {staging} "
+            f"(LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP"
+        )
+        cur.copy_expert(
+            f"COPY {staging} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+            _to_copy_buffer(df, columns),
+        )
+        return staging
+
+    def _refresh_rollups(self, cur, months: List[str]) -> None:
+        if not months:
+            return
+        metric_names = ", ".join(name for name, _, _ in ROLLUP_METRICS)
+        metric_exprs = ", ".join(expr for _, _, expr in ROLLUP_METRICS)
+
+        for table, keys in ROLLUP_LEVELS.values():
+            group_cols = ", ".join(["month"] + keys)
+            cur.execute(f"DELETE FROM {table} WHERE month = ANY(%s)", (months,))
+            cur.execute(
+                f"""
+                INSERT INTO {table} ({group_cols}, {metric_names})
+                SELECT {group_cols}, {metric_exprs}
+                FROM monthly_summary
+                WHERE month = ANY(%s)
+                GROUP BY {group_cols}
+                """,
+                (months,),
+            )
+        logging.info(f"Rollups atualizados para os meses: {', '.join(months)}")
+
+    def _record_run(self, cur, month: str) -> int:
+        cur.execute(
+            "SELECT COALESCE(MAX(run_id), 0) + 1 FROM summary_runs WHERE month = %s",
+            (month,),
+        )
+        run_id = cur.fetchone()[0]
+        cols = ", ".join(MONTHLY_SUMMARY_COLUMNS)
+        cur.execute(
+            f"INSERT INTO monthly_summary_history (run_id, {cols}) "
+            f"SELECT %s, {cols} FROM monthly_summary WHERE month = %s",
+            (run_id, month),
+        )
+        cur.execute(
+            "INSERT INTO summary_runs (month, run_id, created_at, row_count) "
+            "VALUES (%s, %s, %s, %s)",
+            (month, run_id, datetime.now().isoformat(timespec="seconds"), cur.rowcount),
+        )
+        return run_id
+
+    def _apply_retention(self, cur, month: str, keep_runs: int) -> int:
+        if keep_runs <= 0:
+            return 0
+        cur.execute(
+            "SELECT run_id FROM summary_runs WHERE month = %s ORDER BY run_id DESC OFFSET %s",
+            (month, keep_runs),
+        )
+        expired = [r[0] for r in cur.fetchall()]
+        if not expired:
+            return 0
+        cutoff = max(expired)
+        cur.execute(
+            "DELETE FROM monthly_summary_history WHERE month = %s AND run_id <= %s",
+            (month, cutoff),
+        )
+        cur.execute("DELETE FROM summary_runs WHERE month = %s AND run_id <= %s", (month, cutoff))
+        logging.info(f"Retenção: {len(expired)} run(s) antigo(s) de {month} removido(s).")
+        return len(expired)
+
+    def save_all(self, unified_df: pd.DataFrame) -> Dict[str, int]:
+        """
+        Grava properties e monthly_summary numa única transação usando COPY + upsert.
+        Cada mês gravado gera um novo run no histórico; retorna {mês: run_id}.
+        """
+        logging.info("Salvando dados no PostgreSQL...")
+        # O upsert não aceita a mesma chave duas vezes no mesmo comando
+        unified_df = drop_duplicate_summary_rows(unified_df)
+        months = []
+        if "month" in unified_df.columns:
+            months = sorted(str(m) for m in unified_df["month"].dropna().unique())
+
+        with self._get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(_schema_sql())
+
+                # 1. properties: COPY para staging e upsert
+                props = unified_df[list(PROPERTIES_COLUMNS)].drop_duplicates("property_id")
+                staging = self._copy_into_staging(cur, props, "properties", PROPERTIES_COLUMNS)
+                cols = ", ".join(PROPERTIES_COLUMNS)
+                updates = ", ".join(
+                    f"{c} = EXCLUDED.{c}" for c in PROPERTIES_COLUMNS if c != "property_id"
+                )
+                cur.execute(
+                    f"INSERT INTO properties ({cols}) SELECT {cols} FROM {staging} "
+                    f"ON CONFLICT (property_id) DO UPDATE SET {updates}"
+                )
+                logging.info(f"Tabela 'properties' atualizada ({len(props)} linhas).")
+
+                # 2. monthly_summary: os meses gravados são substituídos por inteiro
+                summary = unified_df.reindex(columns=list(MONTHLY_SUMMARY_COLUMNS))
+                staging = self._copy_into_staging(
+                    cur, summary, "monthly_summary", MONTHLY_SUMMARY_COLUMNS
+                )
+                cur.execute("DELETE FROM monthly_summary WHERE month = ANY(%s)", (months,))
+                cols = ", ".join(MONTHLY_SUMMARY_COLUMNS)
+                updates = ", ".join(
+                    f"{c} = EXCLUDED.{c}" for c in MONTHLY_SUMMARY_COLUMNS
+                    if c not in ("property_id", "month")
+                )
+                cur.execute(
+                    f"INSERT INTO monthly_summary ({cols}) SELECT {cols} FROM {staging} "
+                    f"ON CONFLICT (property_id, month) DO UPDATE SET {updates}"
+                )
+                logging.info(f"Tabela 'monthly_summary' atualizada ({len(summary)} linhas).")
+
+                # 3. Rollups materializados dos meses gravados
+                self._refresh_rollups(cur, months)
+
+                # 4. Histórico append-only (um run por mês gravado) e retenção
+                run_ids = {}
+                for month_ref in months:
+                    run_ids[month_ref] = self._record_run(cur, month_ref)
+                    self._apply_retention(cur, month_ref, HISTORY_RETENTION_RUNS)
+
+        logging.info("Dados salvos com sucesso!")
+        return run_ids
+
+    def _read_sql(self, sql: str, params: tuple = ()) -> pd.DataFrame:
+        with self._get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(sql, params)
+                columns = [d[0] for d in cur.description]
+                return pd.DataFrame(cur.fetchall(), columns=columns)
+
+    def get_rollup(self, level: str, month: Optional[str] = None) -> pd.DataFrame:
+        if level not in ROLLUP_LEVELS:
+            raise ValueError(f"Nível de rollup inválido: {level}. Use {list(ROLLUP_LEVELS)}")
+        table, keys = ROLLUP_LEVELS[level]
+        order = ", ".join(["month"] + keys)
+        sql = f"SELECT * FROM {table}"
+        params: tuple = ()
+        if month:
+            sql += " WHERE month = %s"
+            params = (month,)
+        return self._read_sql(f"{sql} ORDER BY {order}", params)
+
+    def get_rollup_window(self, level: str, start_month: str, end_month: str) -> pd.DataFrame:
+        if level not in ROLLUP_LEVELS:
+            raise ValueError(f"Nível de rollup inválido: {level}. Use {list(ROLLUP_LEVELS)}")
+        table, keys = ROLLUP_LEVELS[level]
+        order = ", ".join(["month"] + keys)
+        return self._read_sql(
+            f"SELECT * FROM {table} WHERE month BETWEEN %s AND %s ORDER BY {order}",
+            (start_month, end_month),
+        )
+
+    def get_summary_window(
+        self,
+        start_month: str,
+        end_month: str,
+        columns: Optional[List[str]] = None
+    ) -> pd.DataFrame:
+        select = ", ".join(["property_id", "month"] + (columns or [])) if columns else "*"
+        return self._read_sql(
+            f"SELECT {select} FROM monthly_summary WHERE month BETWEEN %s AND %s "
+            "ORDER BY month, property_id",
+            (start_month, end_month),
+        )
+
+    def get_portfolio_stats(self, month: str) -> Optional[Dict]:
+        try:
+            rollup = self.get_rollup("portfolio", month)
+        except Exception as e:
+            logging.warning(f"Rollup de portfólio indisponível: {e}")
+            return None
+        if rollup.empty:
+            return None
+        return stats_from_portfolio_rollup(rollup.iloc[0])
+
+    def get_top_properties(self, month: str, n: int = 3) -> List[str]:
+        with self._get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT property_id FROM monthly_summary WHERE month = %s "
+                    "ORDER BY net_revenue DESC LIMIT %s",
+                    (month, n),
+                )
+                return [r[0] for r in cur.fetchall()]
+
+    def list_runs(self, month: Optional[str] = None) -> pd.DataFrame:
+        sql = "SELECT month, run_id, created_at, row_count FROM summary_runs"
+        params: tuple = ()
+        if month:
+            sql += " WHERE month = %s"
+            params = (month,)
+        return self._read_sql(sql + " ORDER BY month, run_id", params)
+
+    def get_run(self, month: str, run_id: Optional[int] = None) -> pd.DataFrame:
+        if run_id is None:
+            return self._read_sql(
+                "SELECT * FROM monthly_summary_current WHERE month = %s", (month,)
+            )
+        return self._read_sql(
+            "SELECT * FROM monthly_summary_history WHERE month = %s AND run_id = %s",
+            (month, run_id),
+        )
+
+    def diff_runs(
+        self,
+        month: str,
+        run_a: int,
+        run_b: Optional[int] = None,
+        only_changed: bool = True
+    ) -> pd.DataFrame:
+        return diff_summary_runs(
+            self.get_run(month, run_a), self.get_run(month, run_b), only_changed
+        )
+
+    def compact_history(self, keep_runs: Optional[int] = None, vacuum: bool = True) -> int:
+        """
+        Aplica a retenção em todos os meses. O espaço é recuperado pelo autovacuum
+        do PostgreSQL, por isso `vacuum` é ignorado aqui.
+        """
+        keep_runs = HISTORY_RETENTION_RUNS if keep_runs is None else keep_runs
+        removed = 0
+        with self._get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(_schema_sql())
+                cur.execute("SELECT DISTINCT month FROM summary_runs")
+                for (month,) in cur.fetchall():
+                    removed += self._apply_retention(cur, month, keep_runs)
+        logging.info(f"Compactação do histórico concluída: {removed} run(s) removido(s).")
+        return removed
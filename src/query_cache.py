@@ -0,0 +1,197 @@
+# src/query_cache.py
+
+"""
+Cache de resultados para as leituras no SQLite (rollups, histórico, chatbot, demo).
+
+Chave: caminho absoluto do banco + SQL normalizado + parâmetros. Cada entrada guarda a
+versão dos dados (por mês) vista no momento da leitura; DataLoader.save_all
+incrementa a versão dos meses gravados (tabela data_versions), o que invalida
+só as consultas daqueles meses. Consultas sem mês definido dependem da versão
+global ('*'), incrementada a cada gravação.
+
+As versões ficam em memória e são relidas do banco no máximo a cada
+QUERY_CACHE_VERSION_TTL segundos (para enxergar gravações de outros processos).
+Dentro desse intervalo, uma leitura repetida de um mês fechado não toca o banco.
+"""
+
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+import pandas as pd
+
+from config import QUERY_CACHE_ENABLED, QUERY_CACHE_SIZE, QUERY_CACHE_VERSION_TTL
+
+GLOBAL_VERSION_KEY = "*"
+
+DATA_VERSIONS_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS data_versions (
+    month TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+"""
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Normaliza o SQL para a chave do cache: espaços colapsados, sem ';' final.
+    """
+    return _WHITESPACE.sub(" ", sql).strip().rstrip(";").strip()
+
+
+def fetch_data_versions(conn) -> Dict[str, int]:
+    """
+    Lê as versões por mês da tabela data_versions ({} se ainda não existir).
+    """
+    try:
+        return dict(conn.execute("SELECT month, version FROM data_versions").fetchall())
+    except sqlite3.OperationalError:
+        return {}
+
+
+def bump_data_versions(cur, months: Iterable[str]) -> None:
+    """
+    Incrementa a versão dos meses informados e a versão global, na transação do chamador.
+    """
+    cur.execute(DATA_VERSIONS_SCHEMA_SQL)
+    for month in list(months) + [GLOBAL_VERSION_KEY]:
+        cur.execute(
+            """
+            INSERT INTO data_versions (month, version) VALUES (?, 1)
+            ON CONFLICT(month) DO UPDATE SET version = version + 1
+            """,
+            (month,),
+        )
+
+
+class QueryCache:
+    """
+    Cache LRU de DataFrames com invalidação por versão de dados.
+    """
+
+    def __init__(self, max_entries: int = 256, version_ttl: float = 5.0) -> None:
+        self.max_entries = max_entries
+        self.version_ttl = version_ttl
+        self._entries: "OrderedDict[tuple, Tuple[tuple, pd.DataFrame]]" = OrderedDict()
+        self._versions: Dict[str, Dict[str, int]] = {}
+        self._versions_loaded_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _current_versions(self, db_path: str, fetch_versions: Callable[[], Dict[str, int]]) -> Dict[str, int]:
+        loaded_at = self._versions_loaded_at.get(db_path)
+        if loaded_at is None or time.monotonic() - loaded_at > self.version_ttl:
+            self._versions[db_path] = fetch_versions()
+            self._versions_loaded_at[db_path] = time.monotonic()
+        return self._versions[db_path]
+
+    def invalidate(self, db_path: str, months: Iterable[str]) -> None:
+        """
+        Reflete em memória um bump de versão feito por este processo.
+        """
+        db_path = os.path.abspath(db_path)
+        with self._lock:
+            versions = self._versions.setdefault(db_path, {})
+            for month in list(months) + [GLOBAL_VERSION_KEY]:
+                versions[month] = versions.get(month, 0) + 1
+
+    def get_or_execute(
+        self,
+        db_path: str,
+        sql: str,
+        params: tuple,
+        months: Optional[Iterable[str]],
+        execute: Callable[[], pd.DataFrame],
+        fetch_versions: Callable[[], Dict[str, int]],
+    ) -> pd.DataFrame:
+        """
+        Retorna o resultado em cache se a versão dos meses da consulta não mudou;
+        caso contrário executa `execute()` e guarda o resultado.
+        `months=None` faz a consulta depender da versão global.
+        """
+        # Caminho relativo (SQLITE_DB_PATH) e absoluto apontam para o mesmo banco
+        db_path = os.path.abspath(db_path)
+        scope = tuple(sorted(months)) if months is not None else (GLOBAL_VERSION_KEY,)
+        key = (db_path, normalize_sql(sql), tuple(params or ()), scope)
+
+        with self._lock:
+            versions = self._current_versions(db_path, fetch_versions)
+            token = tuple(versions.get(m, 0) for m in scope)
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == token:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1].copy()
+            self.misses += 1
+
+        result = execute()
+
+        with self._lock:
+            self._entries[key] = (token, result.copy())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return result
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+            self._versions_loaded_at.clear()
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._entries),
+            "evictions": self.evictions,
+        }
+
+    def log_stats(self) -> None:
+        stats = self.stats()
+        logging.info(
+            f"Cache de consultas: {stats['hits']} hits, {stats['misses']} misses "
+            f"({stats['hit_rate']:.0%}), {stats['entries']} entradas, "
+            f"{stats['evictions']} evicções"
+        )
+
+
+query_cache = QueryCache(max_entries=QUERY_CACHE_SIZE, version_ttl=QUERY_CACHE_VERSION_TTL)
+
+
+def cache_enabled() -> bool:
+    return QUERY_CACHE_ENABLED
+
+
+def cached_read_sql(
+    conn,
+    db_path: str,
+    sql: str,
+    params: tuple = (),
+    months: Optional[Iterable[str]] = None,
+) -> pd.DataFrame:
+    """
+    pd.read_sql_query com o cache compartilhado do processo.
+    """
+    if not cache_enabled():
+        return pd.read_sql_query(sql, conn, params=params)
+    return query_cache.get_or_execute(
+        db_path,
+        sql,
+        params,
+        months,
+        execute=lambda: pd.read_sql_query(sql, conn, params=params),
+        fetch_versions=lambda: fetch_data_versions(conn),
+    )
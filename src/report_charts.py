@@ -0,0 +1,130 @@
+# src/report_charts.py
+
+"""
+Gráficos do relatório executivo (financeiro, ocupação e qualidade).
+
+Renderização com matplotlib no backend não interativo Agg. As funções de
+desenho são de nível de módulo para rodarem num ProcessPoolExecutor; cada
+processo mantém um template de figura por tipo de gráfico e o reutiliza
+entre renderizações. Os dados de entrada são pequenos agregados (por cidade
+ou por faixa), calculados no processo principal, e o hash deles nomeia o
+arquivo para que gráficos sem mudança não sejam renderizados de novo.
+"""
+
+import hashlib
+import json
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+CHART_KINDS = ["financial", "occupancy", "quality"]
+
+_FIGURES: Dict[str, object] = {}
+
+
+def chart_data(df: pd.DataFrame) -> Dict[str, Dict]:
+    """
+    Agregados que alimentam os gráficos, calculados de forma vetorizada.
+    """
+    by_city = (
+        df.groupby("city")
+        .agg(
+            gross=("gross_revenue", "sum"),
+            net=("net_revenue", "sum"),
+            occupancy=("occupancy_rate", "mean"),
+        )
+        .sort_values("gross", ascending=False)
+    )
+    edges = np.arange(1.0, 5.25, 0.25)
+    counts, _ = np.histogram(df["avg_rating"].dropna().clip(1.0, 5.0), bins=edges)
+
+    return {
+        "financial": {
+            "labels": by_city.index.astype(str).tolist(),
+            "gross": by_city["gross"].round(2).tolist(),
+            "net": by_city["net"].round(2).tolist(),
+        },
+        "occupancy": {
+            "labels": by_city.index.astype(str).tolist(),
+            "values": (by_city["occupancy"] * 100).round(2).tolist(),
+        },
+        "quality": {
+            "edges": edges.tolist(),
+            "counts": counts.tolist(),
+        },
+    }
+
+
+def chart_hash(kind: str, data: Dict) -> str:
+    payload = json.dumps({"kind": kind, "data": data}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _template(kind: str):
+    """
+    Figura reutilizável por tipo de gráfico (uma por processo).
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig = _FIGURES.get(kind)
+    if fig is None:
+        fig, _ = plt.subplots(figsize=(8, 3.6), dpi=110)
+        _FIGURES[kind] = fig
+    ax = fig.axes[0]
+    ax.clear()
+    ax.grid(axis="y", alpha=0.3)
+    ax.spines["top"].set_visible(False)
+    ax.spines["right"].set_visible(False)
+    return fig, ax
+
+
+def _draw_financial(ax, data: Dict) -> None:
+    x = np.arange(len(data["labels"]))
+    ax.bar(x - 0.2, data["gross"], width=0.4, label="Faturamento bruto", color="#4CAF50")
+    ax.bar(x + 0.2, data["net"], width=0.4, label="Receita líquida", color="#2196F3")
+    ax.set_xticks(x)
+    ax.set_xticklabels(data["labels"], rotation=30, ha="right", fontsize=8)
+    ax.set_ylabel("R$")
+    ax.set_title("Faturamento por cidade")
+    ax.legend(fontsize=8)
+
+
+def _draw_occupancy(ax, data: Dict) -> None:
+    x = np.arange(len(data["labels"]))
+    ax.bar(x, data["values"], color="#FF9800")
+    ax.set_xticks(x)
+    ax.set_xticklabels(data["labels"], rotation=30, ha="right", fontsize=8)
+    ax.set_ylim(0, 100)
+    ax.set_ylabel("%")
+    ax.set_title("Ocupação média por cidade")
+
+
+def _draw_quality(ax, data: Dict) -> None:
+    edges = data["edges"]
+    ax.bar(edges[:-1], data["counts"], width=np.diff(edges), align="edge",
+           color="#9C27B0", edgecolor="white")
+    ax.axvline(4.0, color="#f44336", linestyle="--", linewidth=1)
+    ax.set_xlabel("Nota média")
+    ax.set_ylabel("Imóveis")
+    ax.set_title("Distribuição das notas dos hóspedes")
+
+
+_RENDERERS = {
+    "financial": _draw_financial,
+    "occupancy": _draw_occupancy,
+    "quality": _draw_quality,
+}
+
+
+def render_chart(kind: str, data: Dict, path: str) -> str:
+    """
+    Renderiza um gráfico em PNG (executado nos processos do pool).
+    """
+    fig, ax = _template(kind)
+    _RENDERERS[kind](ax, data)
+    fig.tight_layout()
+    fig.savefig(path)
+    return path
@@ -1,38 +1,254 @@
 # src/report_generator.py
 
+import glob
+import gzip
+import hashlib
+import json
 import logging
 import os
-from typing import Dict
+import re
+import threading
+import time
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
 
 import pandas as pd
 
-from config import OUTPUT_DIR
+from config import OUTPUT_DIR, REPORT_FORMATS
+from data_loader import stats_from_summary
+from report_charts import CHART_KINDS, chart_data, chart_hash, render_chart
+from trends import PROPERTY_TREND_METRICS, city_trends, property_trends, trend_window
 from utils import ensure_dir
 
+# Formato -> (extensão, dependência opcional necessária ou None)
+SUPPORTED_FORMATS = {
+    "csv": (".csv", None),
+    "csv.gz": (".csv.gz", None),
+    "csv.zst": (".csv.zst", "zstandard"),
+    "parquet": (".parquet", "pyarrow"),
+    "xlsx": (".xlsx", "openpyxl"),
+}
+
+REPORT_NAMES = ["financial", "quality", "occupancy"]
+
+MANIFEST_FILENAME = "report_manifest.json"
+
+OWNER_STATEMENTS_DIR = "extratos_proprietarios"
+
+CHARTS_DIR = "graficos"
+
+# Linhas por tabela no anexo do PDF (tabelas menores paginam mais rápido)
+PDF_TABLE_CHUNK = 40
+
+FINANCIAL_COLUMNS = [
+    "property_id", "owner_name", "city", "state", "region", "month",
+    "reservations_count", "gross_revenue",
+    "platform_fee_amount", "extra_cost_total",
+    "net_revenue", "margin_value", "margin_percent"
+]
+
+
+def content_hash(df: pd.DataFrame, fmt: str) -> str:
+    """
+    Hash do conteúdo projetado/ordenado de um relatório (vetorizado via
+    hash_pandas_object), incluindo colunas e formato de saída.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([list(map(str, df.columns)), fmt]).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def owner_slug(owner: str) -> str:
+    """
+    Nome de arquivo seguro para um proprietário ("Condomínio Sol" -> "condominio_sol").
+    """
+    text = unicodedata.normalize("NFKD", str(owner)).encode("ascii", "ignore").decode()
+    return re.sub(r"[^a-z0-9]+", "_", text.lower()).strip("_") or "sem_nome"
+
+
+def parse_report_formats(value: str) -> Dict[str, str]:
+    """
+    Interpreta REPORT_FORMATS: um formato para todos ("csv.gz") ou por relatório
+    ("financial=xlsx,quality=csv,occupancy=csv.gz"). Relatórios omitidos usam csv.
+    """
+    value = (value or "csv").strip()
+    if "=" not in value:
+        return {name: value for name in REPORT_NAMES}
+
+    formats = {name: "csv" for name in REPORT_NAMES}
+    for item in value.split(","):
+        if "=" in item:
+            name, fmt = item.split("=", 1)
+            formats[name.strip()] = fmt.strip()
+    return formats
+
+
 class ReportGenerator:
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        formats: Optional[Dict[str, str]] = None,
+        max_workers: int = 3,
+        force: bool = False
+    ) -> None:
         ensure_dir(OUTPUT_DIR)
+        self.formats = {**parse_report_formats(REPORT_FORMATS), **(formats or {})}
+        self.max_workers = max_workers
+        # force=True ignora o manifesto e regenera todos os relatórios
+        self.force = force
+        # Bytes e tempo de escrita de cada arquivo do último generate()
+        self.write_stats: List[Dict] = []
+        self.manifest_path = os.path.join(OUTPUT_DIR, MANIFEST_FILENAME)
+        self._manifest_lock = threading.Lock()
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self) -> Dict[str, Dict]:
+        """
+        Manifesto dos relatórios já gerados: nome -> hash do conteúdo e caminho.
+        """
+        if not os.path.exists(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Manifesto de relatórios inválido, ignorando: {e}")
+            return {}
+
+    def _update_manifest(self, name: str, entry: Dict) -> None:
+        with self._manifest_lock:
+            self.manifest[name] = entry
+            tmp_path = self.manifest_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.manifest, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.manifest_path)
+
+    def _resolve_format(self, fmt: str) -> str:
+        if fmt not in SUPPORTED_FORMATS:
+            logging.warning(f"Formato de relatório desconhecido '{fmt}'. Usando csv.")
+            return "csv"
+        dependency = SUPPORTED_FORMATS[fmt][1]
+        if dependency:
+            try:
+                __import__(dependency)
+            except ImportError:
+                logging.warning(
+                    f"Biblioteca {dependency} não instalada. Relatório em '{fmt}' será salvo como csv."
+                )
+                return "csv"
+        return fmt
 
-    def _save_csv(self, df: pd.DataFrame, filename: str) -> str:
-        path = os.path.join(OUTPUT_DIR, filename)
-        df.to_csv(path, index=False)
-        logging.info(f"Relatório salvo em {path}")
+    def _write_frame(self, df: pd.DataFrame, path: str, fmt: str) -> None:
+        if fmt == "csv":
+            df.to_csv(path, index=False)
+        elif fmt == "csv.gz":
+            df.to_csv(path, index=False, compression="gzip")
+        elif fmt == "csv.zst":
+            df.to_csv(path, index=False, compression="zstd")
+        elif fmt == "parquet":
+            df.to_parquet(path, index=False)
+        elif fmt == "xlsx":
+            df.to_excel(path, index=False)
+
+    def _write_text(self, content: str, path: str, fmt: str) -> None:
+        data = content.encode("utf-8")
+        if fmt == "csv.gz":
+            data = gzip.compress(data)
+        with open(path, "wb") as f:
+            f.write(data)
+
+    @staticmethod
+    def _has_multiline_text(df: pd.DataFrame) -> bool:
+        text_cols = df.select_dtypes(include=["object", "string"]).columns
+        return any(
+            df[col].astype(str).str.contains("\n|\r", regex=True).any() for col in text_cols
+        )
+
+    def _cached_report(self, name: str, digest: str, path: str) -> bool:
+        entry = self.manifest.get(name)
+        return (
+            not self.force
+            and entry is not None
+            and entry.get("hash") == digest
+            and entry.get("path") == path
+            and os.path.exists(path)
+        )
+
+    def _remove_stale_formats(self, basename: str, path: str, name: Optional[str]) -> None:
+        """
+        Apaga o mesmo relatório gravado antes em outro formato (ex: o .csv
+        depois de trocar para .csv.gz) e o arquivo anterior do manifesto.
+        """
+        stale = {os.path.join(OUTPUT_DIR, basename + ext) for ext, _ in SUPPORTED_FORMATS.values()}
+        previous = self.manifest.get(name, {}).get("path") if name else None
+        if previous:
+            stale.add(previous)
+        for old_path in stale - {path}:
+            if os.path.isfile(old_path):
+                os.remove(old_path)
+                logging.info(f"Relatório em formato antigo removido: {old_path}")
+
+    def _save_report(
+        self,
+        df: pd.DataFrame,
+        basename: str,
+        fmt: str = "csv",
+        name: Optional[str] = None
+    ) -> str:
+        """
+        Grava o relatório no formato pedido. Com `name`, consulta o manifesto:
+        se o hash do conteúdo não mudou, reaproveita o arquivo existente.
+        """
+        fmt = self._resolve_format(fmt)
+        path = os.path.join(OUTPUT_DIR, basename + SUPPORTED_FORMATS[fmt][0])
+
+        digest = None
+        if name:
+            digest = content_hash(df, fmt)
+            if self._cached_report(name, digest, path):
+                self.write_stats.append({
+                    "path": path, "format": fmt, "rows": len(df),
+                    "bytes": os.path.getsize(path), "seconds": 0.0, "cached": True,
+                })
+                logging.info(f"Relatório '{name}' sem alterações (cache hit): reutilizando {path}")
+                return path
+            reason = "regeneração forçada" if self.force else "alterado ou sem cache"
+            logging.info(f"Relatório '{name}' {reason} (cache miss): gerando")
+
+        start = time.perf_counter()
+        self._write_frame(df, path, fmt)
+        elapsed = time.perf_counter() - start
+
+        size = os.path.getsize(path)
+        self.write_stats.append({
+            "path": path, "format": fmt, "rows": len(df), "bytes": size,
+            "seconds": elapsed, "cached": False,
+        })
+        logging.info(f"Relatório salvo em {path} ({size:,} bytes em {elapsed:.3f}s)")
+        self._remove_stale_formats(basename, path, name)
+
+        if name:
+            self._update_manifest(name, {
+                "hash": digest,
+                "path": path,
+                "format": fmt,
+                "rows": len(df),
+                "generated_at": datetime.now().isoformat(timespec="seconds"),
+            })
         return path
 
     def generate_financial_report(self, df: pd.DataFrame) -> str:
         """
         Relatório Financeiro geral e por imóvel.
         """
-        financial_cols = [
-            "property_id", "owner_name", "city", "state", "region", "month",
-            "reservations_count", "gross_revenue",
-            "platform_fee_amount", "extra_cost_total",
-            "net_revenue", "margin_value", "margin_percent"
-        ]
-        financial_df = df[financial_cols].sort_values(
+        financial_df = df[FINANCIAL_COLUMNS].sort_values(
             ["month", "city", "property_id"]
         )
-        return self._save_csv(financial_df, "relatorio_financeiro.csv")
+        return self._save_report(
+            financial_df, "relatorio_financeiro", self.formats.get("financial", "csv"), "financial"
+        )
 
     def generate_quality_report(self, df: pd.DataFrame) -> str:
         """
@@ -45,7 +261,9 @@ class ReportGenerator:
         quality_df = df[quality_cols].sort_values(
             ["month", "avg_rating"], ascending=[True, False]
         )
-        return self._save_csv(quality_df, "relatorio_qualidade.csv")
+        return self._save_report(
+            quality_df, "relatorio_qualidade", self.formats.get("quality", "csv"), "quality"
+        )
 
     def generate_occupancy_report(self, df: pd.DataFrame) -> str:
         """
@@ -58,19 +276,254 @@ class ReportGenerator:
         occupancy_df = df[occupancy_cols].sort_values(
             ["month", "occupancy_rate"], ascending=[True, False]
         )
-        return self._save_csv(occupancy_df, "relatorio_ocupacao.csv")
+        return self._save_report(
+            occupancy_df, "relatorio_ocupacao", self.formats.get("occupancy", "csv"), "occupancy"
+        )
+
+    def generate_owner_statements(self, df: pd.DataFrame) -> str:
+        """
+        Extrato financeiro por proprietário (owner_name): um arquivo por
+        proprietário com apenas os seus imóveis, gerado num único groupby e
+        gravado em paralelo. Extratos de proprietários ausentes do dataframe são
+        apagados. Retorna o caminho do índice (proprietário, arquivo, totais).
+        """
+        fmt = self._resolve_format(self.formats.get("owner_statements", "csv"))
+        extension = SUPPORTED_FORMATS[fmt][0]
+        statements_dir = os.path.join(OUTPUT_DIR, OWNER_STATEMENTS_DIR)
+        ensure_dir(statements_dir)
+        start = time.perf_counter()
+
+        statements = df[FINANCIAL_COLUMNS].copy()
+        statements["owner_name"] = statements["owner_name"].fillna("Sem proprietário")
+        statements = statements.sort_values(["owner_name", "month", "city", "property_id"])
+
+        # Totais de todos os proprietários numa única agregação
+        index = (
+            statements.groupby("owner_name", sort=False)
+            .agg(
+                property_count=("property_id", "nunique"),
+                reservations_count=("reservations_count", "sum"),
+                gross_revenue=("gross_revenue", "sum"),
+                platform_fee_amount=("platform_fee_amount", "sum"),
+                extra_cost_total=("extra_cost_total", "sum"),
+                net_revenue=("net_revenue", "sum"),
+            )
+            .reset_index()
+        )
+
+        # Nomes de arquivo únicos mesmo quando dois proprietários geram o mesmo slug
+        slugs = index["owner_name"].map(owner_slug)
+        duplicate_rank = slugs.groupby(slugs).cumcount()
+        slugs = slugs.where(duplicate_rank == 0, slugs + "_" + duplicate_rank.astype(str))
+        index["file"] = [os.path.join(statements_dir, slug + extension) for slug in slugs]
+        files = dict(zip(index["owner_name"], index["file"]))
+
+        with ThreadPoolExecutor(max_workers=max(self.max_workers, 4)) as pool:
+            if fmt in ("csv", "csv.gz") and not self._has_multiline_text(statements):
+                # Serializa o CSV uma única vez e fatia as linhas de cada proprietário
+                # (o frame está ordenado por owner_name); as threads só gravam bytes.
+                # Quebra só em "\n": splitlines() também corta em \x1c-\x1e, \x85
+                # e \u2028, que podem aparecer dentro de nomes entre aspas.
+                lines = statements.to_csv(index=False, lineterminator="\n").split("\n")[:-1]
+                header, body = lines[0], lines[1:]
+                sizes = statements.groupby("owner_name", sort=False).size()
+                futures, offset = [], 0
+                for owner, size in sizes.items():
+                    content = "\n".join([header] + body[offset:offset + size]) + "\n"
+                    offset += size
+                    futures.append(pool.submit(self._write_text, content, files[owner], fmt))
+            else:
+                futures = [
+                    pool.submit(self._write_frame, group, files[owner], fmt)
+                    for owner, group in statements.groupby("owner_name", sort=False)
+                ]
+            for future in futures:
+                future.result()
+
+        # Remove extratos de proprietários que saíram da carteira (ou de outro formato)
+        index_path = os.path.join(statements_dir, "indice_extratos.csv")
+        current = set(index["file"]) | {index_path}
+        for name in os.listdir(statements_dir):
+            path = os.path.join(statements_dir, name)
+            if path not in current and os.path.isfile(path):
+                os.remove(path)
+                logging.info(f"Extrato antigo removido: {path}")
+
+        index.to_csv(index_path, index=False)
+        logging.info(
+            f"Extratos por proprietário: {len(index)} arquivos em {statements_dir} "
+            f"({time.perf_counter() - start:.3f}s). Índice: {index_path}"
+        )
+        return index_path
+
+    def generate_trend_report(self, loader, month: str) -> Dict[str, str]:
+        """
+        Relatório de tendências (MoM, YoY, médias móveis de 3/12 meses e
+        mudança de ranking) por imóvel e por cidade. Lê a janela m-12..m do
+        histórico gravado numa única consulta por nível (monthly_summary e
+        city_monthly_rollup) e calcula tudo de forma vetorizada.
+        """
+        start_month = trend_window(month)[0]
+        start = time.perf_counter()
+        history = loader.get_summary_window(
+            start_month, month, ["city", "owner_name"] + PROPERTY_TREND_METRICS
+        )
+        city_history = loader.get_rollup_window("city", start_month, month)
+
+        by_property = property_trends(history, month)
+        by_city = city_trends(city_history, month)
+        logging.info(
+            f"Tendências calculadas em {time.perf_counter() - start:.3f}s "
+            f"({history['month'].nunique()} meses de histórico, {len(by_property)} imóveis)"
+        )
+
+        fmt = self.formats.get("trends", "csv")
+        return {
+            "trends": self._save_report(by_property, "relatorio_tendencias", fmt, "trends"),
+            "trends_city": self._save_report(
+                by_city, "relatorio_tendencias_cidades", fmt, "trends_city"
+            ),
+        }
+
+    def render_charts(self, unified_df: pd.DataFrame) -> Dict[str, str]:
+        """
+        Renderiza os gráficos do relatório executivo num pool de processos.
+        Gráficos cujo hash de dados já existe em disco são reaproveitados;
+        os de dados anteriores são apagados.
+        """
+        charts_dir = os.path.join(OUTPUT_DIR, CHARTS_DIR)
+        ensure_dir(charts_dir)
+        data = chart_data(unified_df)
+
+        paths = {
+            kind: os.path.join(charts_dir, f"{kind}_{chart_hash(kind, data[kind])[:16]}.png")
+            for kind in CHART_KINDS
+        }
+        pending = [kind for kind in CHART_KINDS if not os.path.exists(paths[kind])]
+        if len(pending) < len(CHART_KINDS):
+            logging.info(f"Gráficos em cache: {len(CHART_KINDS) - len(pending)} de {len(CHART_KINDS)}")
+
+        if pending:
+            start = time.perf_counter()
+            with ProcessPoolExecutor(max_workers=min(len(pending), os.cpu_count() or 1)) as pool:
+                futures = [
+                    pool.submit(render_chart, kind, data[kind], paths[kind]) for kind in pending
+                ]
+                for future in futures:
+                    future.result()
+            logging.info(
+                f"{len(pending)} gráfico(s) renderizado(s) em {time.perf_counter() - start:.3f}s"
+            )
+
+        # O nome leva o hash dos dados: versões anteriores de cada gráfico ficariam acumuladas
+        current = set(paths.values())
+        for kind in CHART_KINDS:
+            for old_path in glob.glob(os.path.join(charts_dir, f"{glob.escape(kind)}_*.png")):
+                if old_path not in current:
+                    os.remove(old_path)
+                    logging.info(f"Gráfico antigo removido: {old_path}")
+        return paths
+
+    def generate_executive_pdf(
+        self,
+        unified_df: pd.DataFrame,
+        month: str,
+        stats: Optional[Dict] = None
+    ) -> Optional[str]:
+        """
+        PDF executivo de várias páginas: indicadores, gráficos financeiro,
+        de ocupação e de qualidade, e a tabela de imóveis por receita líquida.
+        Retorna None se matplotlib/reportlab não estiverem instalados.
+        """
+        try:
+            import matplotlib  # noqa: F401
+            from reportlab.lib import colors
+            from reportlab.lib.pagesizes import A4
+            from reportlab.lib.styles import getSampleStyleSheet
+            from reportlab.lib.units import cm
+            from reportlab.platypus import (
+                Image, PageBreak, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+            )
+        except ImportError:
+            logging.warning("matplotlib/reportlab não instalados. PDF executivo não gerado.")
+            return None
+
+        start = time.perf_counter()
+        charts = self.render_charts(unified_df)
+        styles = getSampleStyleSheet()
+        path = os.path.join(OUTPUT_DIR, "relatorio_executivo.pdf")
+
+        stats = stats or stats_from_summary(unified_df)
+        summary = Table([
+            ["Imóveis ativos", f"{stats['total_properties']}"],
+            ["Faturamento bruto", f"R$ {stats['total_revenue']:,.2f}"],
+            ["Receita líquida", f"R$ {stats['net_revenue']:,.2f}"],
+            ["Ocupação média", f"{stats['avg_occupancy']:.1f}%"],
+            ["Nota média", f"{stats['avg_rating']:.2f}/5.0"],
+        ], colWidths=[6 * cm, 6 * cm])
+        summary.setStyle(TableStyle([
+            ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
+            ("ALIGN", (1, 0), (1, -1), "RIGHT"),
+        ]))
+
+        story = [
+            Paragraph(f"Fechamento Mensal - {month}", styles["Title"]),
+            summary,
+            Spacer(1, 0.5 * cm),
+        ]
+        for kind in CHART_KINDS:
+            story.append(Image(charts[kind], width=17 * cm, height=7.6 * cm))
+        story.append(PageBreak())
+        story.append(Paragraph("Imóveis por receita líquida", styles["Heading2"]))
+
+        table_df = unified_df.sort_values("net_revenue", ascending=False)
+        rows = list(zip(
+            table_df["property_id"].astype(str),
+            table_df["city"].astype(str),
+            (table_df["occupancy_rate"] * 100).map("{:.0f}%".format),
+            table_df["avg_rating"].map("{:.2f}".format),
+            table_df["gross_revenue"].map("{:,.2f}".format),
+            table_df["net_revenue"].map("{:,.2f}".format),
+            pd.to_numeric(table_df["margin_percent"], errors="coerce").map("{:.1f}%".format),
+        ))
+        header = ["Imóvel", "Cidade", "Ocup.", "Nota", "Bruto (R$)", "Líquido (R$)", "Margem"]
+        table_style = TableStyle([
+            ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#4CAF50")),
+            ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+            ("FONTSIZE", (0, 0), (-1, -1), 7),
+            ("ALIGN", (2, 1), (-1, -1), "RIGHT"),
+            ("LINEBELOW", (0, 0), (-1, -1), 0.25, colors.lightgrey),
+        ])
+        for i in range(0, len(rows), PDF_TABLE_CHUNK):
+            chunk = Table([header] + rows[i:i + PDF_TABLE_CHUNK])
+            chunk.setStyle(table_style)
+            story.append(chunk)
+
+        SimpleDocTemplate(path, pagesize=A4, title=f"Fechamento {month}").build(story)
+        logging.info(f"PDF executivo salvo em {path} ({time.perf_counter() - start:.3f}s)")
+        return path
 
     def generate(self, unified_df: pd.DataFrame) -> Dict[str, str]:
         """
-        Gera todos os relatórios principais e retorna os caminhos.
+        Gera todos os relatórios principais em paralelo e retorna os caminhos.
         """
         logging.info("Gerando relatórios...")
-        financial_path = self.generate_financial_report(unified_df)
-        quality_path = self.generate_quality_report(unified_df)
-        occupancy_path = self.generate_occupancy_report(unified_df)
+        self.write_stats = []
+        start = time.perf_counter()
 
-        return {
-            "financial": financial_path,
-            "quality": quality_path,
-            "occupancy": occupancy_path,
+        builders = {
+            "financial": self.generate_financial_report,
+            "quality": self.generate_quality_report,
+            "occupancy": self.generate_occupancy_report,
         }
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {name: pool.submit(build, unified_df) for name, build in builders.items()}
+            paths = {name: future.result() for name, future in futures.items()}
+
+        total_bytes = sum(s["bytes"] for s in self.write_stats)
+        hits = sum(1 for s in self.write_stats if s.get("cached"))
+        logging.info(
+            f"Relatórios gerados: {total_bytes:,} bytes em {time.perf_counter() - start:.3f}s "
+            f"(cache: {hits} hits, {len(self.write_stats) - hits} misses)"
+        )
+        return paths
@@ -0,0 +1,96 @@
+# src/trends.py
+
+"""
+Tendências mês a mês (MoM), ano a ano (YoY), médias móveis de 3 e 12 meses
+e mudança de ranking, calculadas de forma vetorizada sobre o histórico de
+monthly_summary (por imóvel) e do rollup de cidades (por cidade).
+"""
+
+from typing import List
+
+import pandas as pd
+
+from utils import shift_month
+
+# Janela de histórico necessária para o mês de referência: m-12 .. m
+TREND_WINDOW_MONTHS = 13
+
+PROPERTY_TREND_METRICS = ["net_revenue", "gross_revenue", "occupancy_rate", "avg_rating"]
+
+# Métrica do rollup de cidades -> nome no relatório
+CITY_TREND_METRICS = {
+    "net_revenue_sum": "net_revenue",
+    "gross_revenue_sum": "gross_revenue",
+    "occupancy_rate_mean": "occupancy_rate",
+    "avg_rating_mean": "avg_rating",
+}
+
+
+def trend_window(month: str) -> List[str]:
+    """
+    Meses (YYYY-MM) da janela de tendência, do mais antigo ao mês de referência.
+    """
+    return [shift_month(month, -offset) for offset in range(TREND_WINDOW_MONTHS - 1, -1, -1)]
+
+
+def compute_trends(
+    history: pd.DataFrame,
+    month: str,
+    key: str,
+    metrics: List[str],
+    rank_metric: str = "net_revenue"
+) -> pd.DataFrame:
+    """
+    Uma linha por `key` (imóvel ou cidade) com o valor do mês, deltas MoM/YoY
+    (absolutos e %), médias móveis de 3 e 12 meses e a mudança de posição no
+    ranking por `rank_metric` (positivo = subiu).
+
+    Cada métrica vira um painel chave x mês (pivot), e todas as colunas saem
+    de operações sobre o painel inteiro, sem loops por chave.
+    """
+    months = trend_window(month)
+    previous, last_year = months[-2], months[0]
+    current = history[history["month"] == month]
+    if current.empty:
+        return pd.DataFrame(columns=[key])
+    result = pd.DataFrame(index=pd.Index(current[key].unique(), name=key))
+
+    for metric in metrics:
+        panel = (
+            history.pivot_table(index=key, columns="month", values=metric, aggfunc="mean")
+            .reindex(index=result.index, columns=months)
+        )
+        value = panel[month]
+        result[metric] = value
+        result[f"{metric}_mom"] = value - panel[previous]
+        result[f"{metric}_mom_pct"] = result[f"{metric}_mom"] / panel[previous].abs() * 100
+        result[f"{metric}_yoy"] = value - panel[last_year]
+        result[f"{metric}_yoy_pct"] = result[f"{metric}_yoy"] / panel[last_year].abs() * 100
+        result[f"{metric}_avg_3m"] = panel[months[-3:]].mean(axis=1)
+        result[f"{metric}_avg_12m"] = panel[months[-12:]].mean(axis=1)
+
+        if metric == rank_metric:
+            ranks = panel[[previous, month]].rank(ascending=False, method="min")
+            result["rank"] = ranks[month]
+            result["rank_previous"] = ranks[previous]
+            result["rank_change"] = ranks[previous] - ranks[month]
+
+    result.insert(0, "month", month)
+    return result.reset_index().sort_values("rank" if "rank" in result else key)
+
+
+def property_trends(history: pd.DataFrame, month: str) -> pd.DataFrame:
+    trends = compute_trends(history, month, "property_id", PROPERTY_TREND_METRICS)
+    if trends.empty:
+        return trends
+    dims = (
+        history[history["month"] == month][["property_id", "city", "owner_name"]]
+        .drop_duplicates("property_id")
+    )
+    return dims.merge(trends, on="property_id", how="right")
+
+
+def city_trends(city_rollup: pd.DataFrame, month: str) -> pd.DataFrame:
+    history = city_rollup.rename(columns=CITY_TREND_METRICS)
+    return compute_trends(history, month, "city", list(CITY_TREND_METRICS.values()))
+
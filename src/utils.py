@@ -27,3 +27,11 @@ def get_days_in_month(month_str: str) -> int:
     else:
         next_month = datetime(year, month + 1, 1)
     return (next_month - first_day).days
+
+def shift_month(month_str: str, months: int) -> str:
+    """
+    Desloca 'YYYY-MM' em `months` meses (negativo para trás).
+    Ex: shift_month('2025-02', -3) -> '2024-11'
+    """
+    shifted = datetime.strptime(month_str, "%Y-%m") + relativedelta(months=months)
+    return shifted.strftime("%Y-%m")
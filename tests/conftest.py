@@ -0,0 +1,67 @@
+# tests/conftest.py
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Módulos ficam em src/ (mesmo layout usado por main.py e benchmark.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+# config.py exige API_TOKEN; os testes não acessam a API
+os.environ.setdefault("API_TOKEN", "test")
+# Sem chamadas reais de LLM nem dependência de .env local
+os.environ["OPENAI_API_KEY"] = ""
+os.environ["LLM_CACHE_ENABLED"] = "false"
+
+
+def make_summary(month: str, rows: int = 6, seed: int = 0) -> pd.DataFrame:
+    """
+    Dataframe no formato de DataTransformer.process com `rows` imóveis em duas cidades.
+    """
+    rng = np.random.default_rng(seed)
+    gross = rng.uniform(1000, 5000, rows).round(2)
+    fee = (gross * 0.15).round(2)
+    costs = rng.uniform(0, 500, rows).round(2)
+    net = gross - fee - costs
+    occupied = rng.integers(0, 31, rows)
+    cities = [("São Paulo", "SP", "Sudeste"), ("Salvador", "BA", "Nordeste")]
+    city = [cities[i % 2] for i in range(rows)]
+    return pd.DataFrame({
+        "property_id": [f"IMV-{i:03d}" for i in range(rows)],
+        "month": month,
+        "reservations_count": rng.integers(1, 10, rows),
+        "gross_revenue": gross,
+        "occupied_days": occupied,
+        "occupancy_rate": occupied / 30,
+        "condominium": [f"Condomínio {i % 3}" for i in range(rows)],
+        "city": [c[0] for c in city],
+        "state": [c[1] for c in city],
+        "region": [c[2] for c in city],
+        "status": "active",
+        "fee_percentage": 15.0,
+        "platform_fee_amount": fee,
+        "extra_cost_total": costs,
+        "net_revenue": net,
+        "margin_value": net,
+        "margin_percent": net / gross * 100,
+        "avg_rating": rng.uniform(3.0, 5.0, rows).round(2),
+        "complaints_list": "",
+        "owner_name": [f"Proprietário {i % 2}" for i in range(rows)],
+    })
+
+
+@pytest.fixture
+def summary_factory():
+    return make_summary
+
+
+@pytest.fixture(autouse=True)
+def fresh_query_cache():
+    from query_cache import query_cache
+
+    query_cache.clear()
+    yield
+    query_cache.clear()
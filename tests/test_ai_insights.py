@@ -0,0 +1,106 @@
+# tests/test_ai_insights.py
+
+import pandas as pd
+import pytest
+
+from ai_insights import AIInsightsGenerator, OfflineFeedbackClassifier, normalize_feedback_text
+
+# Corpus de referência do classificador por palavras-chave: (texto, categoria esperada).
+# Fixa a precedência documentada em ai_insights.KEYWORD_CATEGORIES.
+KEYWORD_CORPUS = [
+    ("O apartamento estava sujo quando chegamos", "limpeza"),
+    ("Wi-fi caiu todas as noites", "wifi"),
+    ("Internet lenta e o chuveiro sem água quente", "wifi"),
+    ("Chuveiro quebrado, banho frio", "água quente"),
+    ("Não havia vaga na garagem", "estacionamento"),
+    ("Muito barulho da rua à noite", "barulho"),
+    ("A TV não funcionava", "equipamentos"),
+    ("Geladeira com defeito", "equipamentos"),
+    ("Porta do armário quebrada e com defeito", "manutenção"),
+    ("Demoraram para entregar a chave no check-in", "check-in"),
+    ("Anfitrião sem resposta às mensagens", "comunicação"),
+    ("Localização distante de tudo", "localização"),
+    ("Entrada do prédio com sujeira", "limpeza"),
+    ("Tudo ótimo, voltaria com certeza", "outro"),
+    ("", "outro"),
+    (None, "outro"),
+]
+
+
+@pytest.fixture
+def ai():
+    return AIInsightsGenerator()
+
+
+def test_keyword_corpus_categories(ai):
+    # Repetido para passar também pelo espalhamento dos códigos do factorize
+    texts = [text for text, _ in KEYWORD_CORPUS] * 2
+    classified = ai._classify_by_keywords(pd.DataFrame({"feedback_text": texts}))
+
+    expected = [category for _, category in KEYWORD_CORPUS] * 2
+    assert classified["ai_category"].tolist() == expected
+    assert (classified["ai_source"] == "keywords").all()
+
+
+def test_keywords_match_row_by_row_reference(ai):
+    from ai_insights import DEFAULT_CATEGORY, KEYWORD_CATEGORIES
+
+    # Mesma precedência de um laço linha a linha com iterrows() sobre
+    # KEYWORD_CATEGORIES, inclusive para textos que casam com várias categorias
+    texts = [text for text, _ in KEYWORD_CORPUS] + [
+        "TV quebrada e wifi lento", "Barulho na garagem", "Check-in sem contato", "acesso ao local",
+    ]
+    df = pd.DataFrame({"feedback_text": texts * 3})
+
+    expected = []
+    for _, row in df.iterrows():
+        text = str(row["feedback_text"] or "").lower()
+        category = next(
+            (category for category, keywords in KEYWORD_CATEGORIES if any(k in text for k in keywords)),
+            DEFAULT_CATEGORY,
+        )
+        expected.append(category)
+
+    assert ai._classify_by_keywords(df)["ai_category"].tolist() == expected
+
+
+def test_keywords_read_api_text_column(ai):
+    df = pd.DataFrame({"comentarios_qualitativos": ["Sem WIFI no quarto", "Ótima estadia"]})
+    assert ai._classify_by_keywords(df)["ai_category"].tolist() == ["wifi", "outro"]
+
+
+def test_keywords_empty_frame(ai):
+    classified = ai._classify_by_keywords(pd.DataFrame({"feedback_text": []}))
+    assert classified.empty
+    assert "ai_category" in classified
+
+
+def test_offline_holdout_splits_by_normalized_text(ai, tmp_path, monkeypatch):
+    ai.offline_model_path = str(tmp_path / "offline.npz")
+    seen = {}
+    fit, accuracy = OfflineFeedbackClassifier.fit.__func__, OfflineFeedbackClassifier.accuracy
+
+    def spy_fit(cls, texts, labels):
+        seen.setdefault("train", texts)
+        return fit(cls, texts, labels)
+
+    def spy_accuracy(self, texts, labels):
+        seen["test"] = texts
+        return accuracy(self, texts, labels)
+
+    monkeypatch.setattr(OfflineFeedbackClassifier, "fit", classmethod(spy_fit))
+    monkeypatch.setattr(OfflineFeedbackClassifier, "accuracy", spy_accuracy)
+
+    # Cada texto aparece várias vezes, com variações de caixa e pontuação
+    base = [text for text, category in KEYWORD_CORPUS if text and category != "outro"]
+    texts = [variant for text in base for variant in (text, text.upper(), text + "!!")] * 4
+    labelled = pd.DataFrame({"feedback_text": texts})
+    labelled["ai_category"] = ai._classify_by_keywords(labelled)["ai_category"]
+
+    result = ai.train_offline_classifier(labelled, min_samples=10)
+
+    train = set(normalize_feedback_text(seen["train"]))
+    test = set(normalize_feedback_text(seen["test"]))
+    assert train and test
+    assert not train & test
+    assert result["holdout"] == len(seen["test"])
@@ -0,0 +1,136 @@
+# tests/test_chatbot_sql.py
+
+import sqlite3
+
+import pytest
+
+from chatbot_sql import (
+    QueryTimeoutError,
+    SQLTemplateCache,
+    connect_read_only,
+    fill_sql_template,
+    question_template,
+    run_bounded_query,
+    sql_to_template,
+    validate_select,
+    with_time_limit,
+)
+
+CITIES = ["São Paulo", "Salvador"]
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "db.sqlite")
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE t (id INTEGER, city TEXT, value REAL)")
+        conn.executemany(
+            "INSERT INTO t VALUES (?, ?, ?)",
+            [(i, CITIES[i % 2], float(i)) for i in range(10)],
+        )
+    return path
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM t",
+    "  select id from t;  ",
+    "WITH x AS (SELECT 1) SELECT * FROM x",
+])
+def test_validate_select_accepts_single_select(sql):
+    assert not validate_select(sql).endswith(";")
+
+
+def test_validate_select_strips_comments_outside_literals():
+    sql = "/* total */ SELECT '--x' AS a FROM t; -- fim"
+    assert validate_select(sql) == "SELECT '--x' AS a FROM t"
+
+
+@pytest.mark.parametrize("sql", [
+    "DELETE FROM t",
+    "DROP TABLE t",
+    "SELECT 1; DROP TABLE t",
+    "PRAGMA query_only = OFF",
+])
+def test_validate_select_rejects_other_statements(sql):
+    with pytest.raises(ValueError):
+        validate_select(sql)
+
+
+def test_question_template_extracts_values():
+    template, params = question_template("Receita de são paulo em 2025-10 acima de 1500,5?", CITIES)
+    assert template == "receita de <city> em <month> acima de <num>"
+    assert params == [("city", "São Paulo"), ("month", "2025-10"), ("num", "1500.5")]
+
+
+def test_sql_template_roundtrip():
+    _, params = question_template("Top 5 de Salvador em 2025-10", CITIES)
+    sql = "SELECT * FROM t WHERE city = 'Salvador' AND month = '2025-10' LIMIT 5"
+    template = sql_to_template(sql, params)
+    assert template == "SELECT * FROM t WHERE city = {p1} AND month = {p2} LIMIT {p0}"
+
+    _, other = question_template("Top 3 de São Paulo em 2025-09", CITIES)
+    assert fill_sql_template(template, other) == (
+        "SELECT * FROM t WHERE city = 'São Paulo' AND month = '2025-09' LIMIT 3"
+    )
+
+
+def test_sql_template_rejects_ambiguous_values():
+    _, params = question_template("Imóveis de Salvador em 2025-10", CITIES)
+    # Valor da pergunta ausente no SQL: template não é confiável
+    assert sql_to_template("SELECT * FROM t WHERE city = 'Salvador'", params) is None
+
+
+def test_template_cache_lru():
+    cache = SQLTemplateCache(max_entries=1)
+    cache.put("a", "SELECT 1")
+    cache.put("b", "SELECT 2")
+    assert cache.get("a") is None
+    assert cache.get("b") == "SELECT 2"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_read_only_connection_blocks_writes(db_path):
+    conn = connect_read_only(db_path)
+    with pytest.raises(sqlite3.Error):
+        conn.execute("DELETE FROM t")
+    conn.close()
+
+
+def test_bounded_query_truncates_and_summarizes(db_path):
+    conn = connect_read_only(db_path)
+    df, summary = run_bounded_query(conn, db_path, "SELECT id, value FROM t ORDER BY id", max_rows=3)
+    assert df["id"].tolist() == [0, 1, 2]
+    assert summary["total_rows"] == 10
+    assert summary["value_max"] == 9.0
+
+    df, summary = run_bounded_query(conn, db_path, "SELECT * FROM t WHERE id < 2", max_rows=3)
+    assert len(df) == 2 and summary is None
+
+    df, _ = run_bounded_query(conn, db_path, "SELECT id FROM t WHERE id < 2 -- ids", max_rows=3)
+    assert df["id"].tolist() == [0, 1]
+    conn.close()
+
+
+def test_chatbot_without_database_answers_no_data(tmp_path, monkeypatch):
+    from ai_insights import PropertyChatbot
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    path = tmp_path / "ausente.sqlite"
+    chatbot = PropertyChatbot(str(path))
+
+    assert chatbot.query("Qual a receita de 2025-10?").startswith("Sem dados")
+    assert not path.exists()
+    chatbot.close()
+
+
+def test_time_limit_interrupts_query(db_path):
+    conn = connect_read_only(db_path)
+    slow = (
+        "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) "
+        "SELECT COUNT(*) FROM n"
+    )
+    with pytest.raises(QueryTimeoutError):
+        with_time_limit(conn, 0.2, lambda: conn.execute(slow).fetchall())
+    # O handler é removido depois da consulta
+    assert conn.execute("SELECT COUNT(*) FROM t").fetchone() == (10,)
+    conn.close()
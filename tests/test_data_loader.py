@@ -0,0 +1,157 @@
+# tests/test_data_loader.py
+
+import pandas as pd
+import pytest
+
+from data_loader import DataLoader, diff_summary_runs, stats_from_summary
+
+
+@pytest.fixture
+def loader(tmp_path):
+    return DataLoader(str(tmp_path / "db.sqlite"))
+
+
+def test_rollups_match_property_rows(loader, summary_factory):
+    df = summary_factory("2025-10")
+    loader.save_all(df)
+
+    portfolio = loader.get_rollup("portfolio", "2025-10").iloc[0]
+    assert portfolio["property_count"] == len(df)
+    assert portfolio["net_revenue_sum"] == pytest.approx(df["net_revenue"].sum())
+    assert portfolio["avg_rating_mean"] == pytest.approx(df["avg_rating"].mean())
+    assert portfolio["low_rating_count"] == (df["avg_rating"] < 4.0).sum()
+
+    city = loader.get_rollup("city", "2025-10").set_index("city")
+    expected = df.groupby("city")["gross_revenue"].sum()
+    assert city["gross_revenue_sum"].to_dict() == pytest.approx(expected.to_dict())
+
+    stats = loader.get_portfolio_stats("2025-10")
+    assert stats["total_properties"] == len(df)
+    assert stats["avg_occupancy"] == pytest.approx(df["occupancy_rate"].mean() * 100)
+
+
+def test_rollups_refresh_only_saved_month(loader, summary_factory):
+    loader.save_all(summary_factory("2025-09", seed=1))
+    loader.save_all(summary_factory("2025-10", seed=2))
+    september = loader.get_rollup("portfolio", "2025-09")
+
+    loader.save_all(summary_factory("2025-10", rows=3, seed=3))
+
+    pd.testing.assert_frame_equal(loader.get_rollup("portfolio", "2025-09"), september)
+    assert loader.get_rollup("portfolio", "2025-10").iloc[0]["property_count"] == 3
+    assert loader.get_portfolio_stats("2030-01") is None
+
+
+def test_stats_fallback_matches_portfolio_rollup(loader, summary_factory):
+    df = summary_factory("2025-10")
+    df.loc[0, ["avg_rating", "occupancy_rate"]] = [3.5, 0.9]
+    loader.save_all(df)
+
+    assert stats_from_summary(df) == pytest.approx(loader.get_portfolio_stats("2025-10"))
+
+
+def test_invalid_rollup_level(loader):
+    with pytest.raises(ValueError):
+        loader.get_rollup("condominium")
+
+
+def test_reclose_appends_run_and_diff(loader, summary_factory):
+    first = summary_factory("2025-10")
+    assert loader.save_all(first) == {"2025-10": 1}
+
+    corrected = first.copy()
+    corrected.loc[0, "net_revenue"] += 100.0
+    corrected = corrected.drop(index=5)
+    assert loader.save_all(corrected) == {"2025-10": 2}
+
+    runs = loader.list_runs("2025-10")
+    assert runs["run_id"].tolist() == [1, 2]
+    assert runs["row_count"].tolist() == [6, 5]
+    assert len(loader.get_run("2025-10", 1)) == 6
+    assert len(loader.get_run("2025-10")) == 5
+
+    diff = loader.diff_runs("2025-10", 1).set_index("property_id")
+    assert diff["change"].to_dict() == {"IMV-000": "changed", "IMV-005": "removed"}
+    assert diff.loc["IMV-000", "net_revenue_delta"] == pytest.approx(100.0)
+
+
+def test_diff_summary_runs_detects_added_and_unchanged(summary_factory):
+    after = summary_factory("2025-10", rows=3)
+    before = after.head(2)
+
+    diff = diff_summary_runs(before, after, only_changed=False).set_index("property_id")
+    assert diff["change"].to_dict() == {
+        "IMV-000": "unchanged", "IMV-001": "unchanged", "IMV-002": "added",
+    }
+
+
+def test_retention_keeps_latest_runs(loader, summary_factory):
+    for seed in range(4):
+        loader.save_all(summary_factory("2025-10", seed=seed))
+    loader.save_all(summary_factory("2025-09"))
+
+    assert loader.compact_history(keep_runs=2) == 2
+    assert loader.list_runs("2025-10")["run_id"].tolist() == [3, 4]
+    assert loader.list_runs("2025-09")["run_id"].tolist() == [1]
+    assert loader.get_run("2025-10", 1).empty
+    assert len(loader.get_run("2025-10")) == 6
+
+
+def _feedback(texts, properties):
+    return pd.DataFrame({
+        "property_id": properties,
+        "rating": [3.0] * len(texts),
+        "complaint_category": ["manutencao"] * len(texts),
+        "feedback_text": texts,
+        "ai_category": ["manutencao"] * len(texts),
+        "ai_source": ["keywords"] * len(texts),
+    })
+
+
+def test_feedback_search_ignores_accents_and_filters_month(loader):
+    loader.save_feedback(_feedback(
+        ["Chuveiro sem água quente", "Wi-fi caiu várias vezes"], ["IMV-001", "IMV-002"]
+    ), "2025-09")
+    loader.save_feedback(_feedback(["Faltou agua no banho"], ["IMV-003"]), "2025-10")
+
+    found = loader.search_feedback("agua")
+    assert sorted(found["property_id"]) == ["IMV-001", "IMV-003"]
+    assert loader.search_feedback("agua", since_month="2025-10")["property_id"].tolist() == ["IMV-003"]
+    assert loader.search_feedback("chuv*")["property_id"].tolist() == ["IMV-001"]
+    # Hífen e aspas no texto livre não são operadores FTS5
+    assert loader.search_feedback('wi-fi "caiu')["property_id"].tolist() == ["IMV-002"]
+
+    complaints = loader.properties_with_complaint("agua", last_months=2)
+    assert complaints.set_index("property_id")["mentions"].to_dict() == {"IMV-001": 1, "IMV-003": 1}
+
+
+@pytest.mark.parametrize("query", ["", "   ", "*", '""'])
+def test_feedback_search_without_terms_returns_empty_frame(loader, query):
+    loader.save_feedback(_feedback(["Chuveiro sem água quente"], ["IMV-001"]), "2025-10")
+
+    found = loader.search_feedback(query)
+    assert found.empty
+    assert list(found.columns) == list(loader.search_feedback("chuveiro").columns)
+
+    complaints = loader.properties_with_complaint(query)
+    assert complaints.empty
+    assert list(complaints.columns) == list(loader.properties_with_complaint("chuveiro").columns)
+
+
+def test_save_feedback_replaces_month(loader):
+    loader.save_feedback(_feedback(["Chuveiro quebrado"], ["IMV-001"]), "2025-10")
+    loader.save_feedback(_feedback(["Cama desconfortável"], ["IMV-002"]), "2025-10")
+
+    assert loader.search_feedback("chuveiro").empty
+    assert loader.search_feedback("cama")["property_id"].tolist() == ["IMV-002"]
+
+
+def test_recurring_issues_use_issue_index(loader):
+    for month in ("2025-08", "2025-09", "2025-10"):
+        loader.save_feedback(_feedback(["Chuveiro quebrado"] * 2, ["IMV-001"] * 2), month)
+
+    recurring = loader.get_recurring_issues("2025-10", window_months=3, min_count=5, min_months=3)
+    assert recurring[["property_id", "category", "total_count"]].values.tolist() == [
+        ["IMV-001", "manutencao", 6]
+    ]
+    assert loader.get_recurring_issues("2025-10", window_months=2, min_count=5).empty
@@ -0,0 +1,93 @@
+# tests/test_llm_cache.py
+
+from types import SimpleNamespace
+
+import pytest
+
+import llm_client
+from llm_cache import LLMResponseCache, prompt_hash
+
+RESPONSE = {"content": "ok", "prompt_tokens": 10, "completion_tokens": 5}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return LLMResponseCache(str(tmp_path / "llm_cache.sqlite"), ttl_hours=1, max_entries=2)
+
+
+def test_prompt_hash_covers_messages_and_max_tokens():
+    messages = [{"role": "user", "content": "Olá"}]
+    assert prompt_hash(messages, 100) == prompt_hash(list(messages), 100)
+    assert prompt_hash(messages, 100) != prompt_hash(messages, 200)
+    assert prompt_hash(messages, 100) != prompt_hash([{"role": "user", "content": "Ola"}], 100)
+
+
+def test_roundtrip_keyed_by_model_and_temperature(cache):
+    cache.put("gpt-4", "k1", 0.0, RESPONSE, latency=1.5)
+
+    assert cache.get("gpt-4", "k1", 0.0) == RESPONSE
+    assert cache.get("gpt-4", "k1", 0.7) is None
+    assert cache.get("gpt-3.5", "k1", 0.0) is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+    assert stats["saved_seconds"] == pytest.approx(1.5)
+    assert stats["saved_tokens"] == 15
+
+
+def test_expired_entries_are_ignored(cache, monkeypatch):
+    import llm_cache
+
+    now = 1_000_000.0
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now)
+    cache.put("gpt-4", "k1", 0.0, RESPONSE, latency=1.0)
+    now += 3601
+    assert cache.get("gpt-4", "k1", 0.0) is None
+
+
+def test_lru_eviction_by_last_use(cache, monkeypatch):
+    import llm_cache
+
+    clock = iter(range(1_000_000, 1_000_100))
+    monkeypatch.setattr(llm_cache.time, "time", lambda: float(next(clock)))
+    cache.put("gpt-4", "a", 0.0, RESPONSE, 1.0)
+    cache.put("gpt-4", "b", 0.0, RESPONSE, 1.0)
+    assert cache.get("gpt-4", "a", 0.0) is not None
+    cache.put("gpt-4", "c", 0.0, RESPONSE, 1.0)
+
+    assert cache.get("gpt-4", "b", 0.0) is None
+    assert cache.get("gpt-4", "a", 0.0) is not None
+    assert cache.get("gpt-4", "c", 0.0) is not None
+
+
+def test_should_cache_policy(tmp_path):
+    default = LLMResponseCache(str(tmp_path / "a.sqlite"))
+    assert default.should_cache(0.0) and not default.should_cache(0.7)
+    assert LLMResponseCache(str(tmp_path / "b.sqlite"), all_temperatures=True).should_cache(0.7)
+    assert not LLMResponseCache(str(tmp_path / "c.sqlite"), enabled=False).should_cache(0.0)
+
+
+def test_chat_completion_served_from_cache(cache, monkeypatch):
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=" resposta "))],
+            usage=SimpleNamespace(prompt_tokens=7, completion_tokens=3),
+        )
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(llm_client, "llm_cache", cache)
+    monkeypatch.setattr(llm_client, "get_client", lambda: client)
+    llm_client.llm_metrics.reset()
+    messages = [{"role": "user", "content": "Resuma"}]
+
+    first = llm_client.chat_completion(messages, "gpt-4", 50, call_site="teste")
+    second = llm_client.chat_completion(messages, "gpt-4", 50, call_site="teste")
+
+    assert len(calls) == 1
+    assert (first["content"], first["cached"]) == ("resposta", False)
+    assert (second["content"], second["cached"]) == ("resposta", True)
+    summary = llm_client.llm_metrics.summary()["teste"]
+    assert (summary["ok"], summary["cached"], summary["prompt_tokens"]) == (1, 1, 7)
+    llm_client.llm_metrics.reset()
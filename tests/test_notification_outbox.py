@@ -0,0 +1,117 @@
+# tests/test_notification_outbox.py
+
+import pytest
+
+import notification_outbox
+from notification_outbox import NotificationOutbox
+
+
+class Clock:
+    def __init__(self, now: float = 1_000_000.0) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(notification_outbox.time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def outbox(tmp_path, clock):
+    outbox = NotificationOutbox(
+        str(tmp_path / "outbox.sqlite"), max_attempts=3, retry_base=10, retry_max=25, lease_seconds=60
+    )
+    yield outbox
+    outbox.close()
+
+
+def test_enqueue_is_idempotent(outbox):
+    assert outbox.enqueue("k1", "email", {"subject": "a"})
+    assert not outbox.enqueue("k1", "email", {"subject": "b"})
+
+    (row,) = outbox.claim()
+    assert (row["key"], row["channel"], row["payload"]) == ("k1", "email", {"subject": "a"})
+
+
+def test_claim_leases_rows_until_expiry(outbox, clock):
+    outbox.enqueue("k1", "email", {})
+    assert len(outbox.claim()) == 1
+    assert outbox.claim() == []
+    assert outbox.stats() == {"sending": 1}
+
+    # Processo que reservou morreu: a reserva expira e outro worker retoma
+    clock.now += 61
+    assert [row["key"] for row in outbox.claim()] == ["k1"]
+
+
+def test_claim_respects_limit_and_order(outbox, clock):
+    for key in ("a", "b", "c"):
+        outbox.enqueue(key, "slack", {})
+        clock.now += 1
+    assert [row["key"] for row in outbox.claim(limit=2)] == ["a", "b"]
+    assert [row["key"] for row in outbox.claim(limit=2)] == ["c"]
+
+
+def test_success_marks_sent(outbox):
+    outbox.enqueue("k1", "email", {})
+    (row,) = outbox.claim()
+    outbox.complete(row["id"])
+
+    assert outbox.stats() == {"sent": 1}
+    assert outbox.claim() == []
+    assert not outbox.enqueue("k1", "email", {})
+
+
+def test_failures_back_off_then_give_up(outbox, clock):
+    outbox.enqueue("k1", "email", {})
+
+    (row,) = outbox.claim()
+    outbox.complete(row["id"], "timeout")
+    assert outbox.stats() == {"pending": 1}
+    clock.now += 9
+    assert outbox.claim() == []
+    clock.now += 1
+    (row,) = outbox.claim()
+    assert row["attempts"] == 1
+
+    outbox.complete(row["id"], "timeout")
+    clock.now += 19
+    assert outbox.claim() == []
+    clock.now += 1
+    (row,) = outbox.claim()
+
+    outbox.complete(row["id"], "timeout")
+    assert outbox.stats() == {"failed": 1}
+    clock.now += 3600
+    assert outbox.claim() == []
+
+    assert outbox.retry_failed() == 1
+    (row,) = outbox.claim()
+    assert row["attempts"] == 0
+
+
+def test_backoff_is_capped(tmp_path, clock):
+    outbox = NotificationOutbox(str(tmp_path / "o.sqlite"), max_attempts=10, retry_base=10, retry_max=25)
+    outbox.enqueue("k1", "email", {})
+    for _ in range(3):
+        (row,) = outbox.claim()
+        outbox.complete(row["id"], "erro")
+        clock.now += 25
+    assert len(outbox.claim()) == 1
+    outbox.close()
+
+
+def test_state_survives_reopen(tmp_path, clock):
+    path = str(tmp_path / "o.sqlite")
+    first = NotificationOutbox(path)
+    first.enqueue("k1", "email", {"subject": "Fechamento"})
+    first.close()
+
+    second = NotificationOutbox(path)
+    assert [row["payload"] for row in second.claim()] == [{"subject": "Fechamento"}]
+    second.close()
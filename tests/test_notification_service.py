@@ -0,0 +1,120 @@
+# tests/test_notification_service.py
+
+import os
+import smtplib
+import socket
+
+import pytest
+
+from notification_service import NotificationService, ReportAttachments, SMTPSessionPool
+
+
+@pytest.fixture
+def notifier(tmp_path, monkeypatch):
+    monkeypatch.setenv("NOTIFY_OUTBOX_PATH", str(tmp_path / "outbox.sqlite"))
+    monkeypatch.setenv("NOTIFY_WORKERS", "0")
+    monkeypatch.setenv("NOTIFY_OUTBOX_INLINE", "false")
+    monkeypatch.setenv("SMTP_USER", "user")
+    monkeypatch.setenv("SMTP_PASSWORD", "secret")
+    monkeypatch.setenv("SLACK_WEBHOOK_URL", "https://hooks.example/slack")
+    notifier = NotificationService()
+    yield notifier
+    notifier.close()
+
+
+def test_deliver_outbox_records_each_channel(notifier, monkeypatch):
+    monkeypatch.setattr(
+        notifier, "_deliver_emails",
+        lambda messages: [None if m["subject"] != "b" else "SMTPDataError: recusado" for m in messages],
+    )
+    monkeypatch.setattr(notifier, "_send_slack_notification", lambda message, color="good": color == "good")
+
+    for subject in ("a", "b"):
+        notifier._notify("email", f"email:{subject}", to_emails=["x@example.com"], subject=subject, html_body="")
+    notifier._notify("slack", "slack:ok", message="ok", color="good")
+    notifier._notify("slack", "slack:erro", message="erro", color="danger")
+
+    assert notifier.deliver_outbox() == (2, 2)
+    # Um lote de emails e uma medida por mensagem do Slack
+    assert len(notifier.dispatcher.latencies["email"]) == 1
+    assert len(notifier.dispatcher.latencies["slack"]) == 2
+    assert notifier.dispatcher.failures == {"email": 1, "slack": 1}
+
+
+def test_closing_notifications_are_keyed_per_run(notifier):
+    def close_month(run_id):
+        notifier.send_success_notification("2025-10", {}, run_id)
+        notifier.send_daily_summary("2025-10", {}, run_id)
+
+    close_month("run-1")
+    close_month("run-1")
+    assert notifier.outbox.stats() == {"pending": 3}
+
+    # Novo fechamento do mesmo mês: email e Slack de sucesso e o resumo de novo
+    close_month("run-2")
+    keys = {row["key"] for row in notifier.outbox.claim()}
+    assert keys == {
+        f"fechamento:2025-10:{run_id}:{kind}"
+        for run_id in ("run-1", "run-2")
+        for kind in ("sucesso:email", "sucesso:slack", "resumo:email")
+    }
+
+
+def test_retry_does_not_attach_reports_rewritten_since_enqueue(notifier, monkeypatch, tmp_path):
+    sent = []
+    monkeypatch.setattr(
+        notifier.smtp_pool, "send_many", lambda messages: sent.extend(messages) or [None] * len(messages)
+    )
+    monkeypatch.setattr(notifier, "_send_slack_notification", lambda message, color="good": True)
+    report = tmp_path / "relatorio_financeiro.csv"
+
+    report.write_text("month\n2025-10\n")
+    notifier.send_success_notification("2025-10", {"financial": str(report)}, "run-1")
+    assert notifier.deliver_outbox() == (2, 0)
+    assert len(sent) == 1
+
+    # O fechamento seguinte regrava o relatório antes da nova tentativa
+    notifier.send_success_notification("2025-10", {"financial": str(report)}, "run-2")
+    report.write_text("month\n2025-11\n")
+    assert notifier.deliver_outbox() == (1, 1)
+    assert len(sent) == 1
+
+
+@pytest.mark.parametrize("error, lost", [
+    (smtplib.SMTPServerDisconnected("fechou"), True),
+    (smtplib.SMTPResponseException(421, b"servico indisponivel"), True),
+    (ConnectionResetError(), True),
+    (socket.timeout(), True),
+    (smtplib.SMTPRecipientsRefused({"x@example.com": (550, b"nao existe")}), False),
+    (smtplib.SMTPDataError(554, b"mensagem rejeitada"), False),
+    (smtplib.SMTPSenderRefused(553, b"remetente", "a@example.com"), False),
+    (smtplib.SMTPException("erro"), False),
+])
+def test_connection_lost_only_for_dropped_sessions(error, lost):
+    assert SMTPSessionPool._connection_lost(error) is lost
+
+
+def test_large_attachments_reuse_one_zip_per_report_set(tmp_path):
+    reports = [tmp_path / "financeiro.csv", tmp_path / "qualidade.csv"]
+    attachments = ReportAttachments(max_bytes=1024, base_url="https://arquivos.example")
+
+    for run in range(3):
+        for i, path in enumerate(reports):
+            path.write_bytes(os.urandom(2048 + run + i))
+        parts, note = attachments.prepare([str(path) for path in reports])
+        assert parts == [] and "https://arquivos.example/relatorios_" in note
+
+    assert attachments.encoded == 3
+    zips = sorted(name for name in os.listdir(tmp_path) if name.endswith(".zip"))
+    assert len(zips) == 1 and note.count(zips[0]) == 2
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def test_small_attachments_leave_no_file(tmp_path):
+    report = tmp_path / "financeiro.csv"
+    report.write_text("a,b\n" * 2000)
+
+    parts, note = ReportAttachments(max_bytes=4096).prepare([str(report)])
+
+    assert len(parts) == 1 and note is None
+    assert os.listdir(tmp_path) == ["financeiro.csv"]
@@ -0,0 +1,117 @@
+# tests/test_postgres_loader.py
+
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from postgres_loader import _to_copy_buffer
+
+DATABASE_URL = os.getenv("DATABASE_URL", "")
+
+
+def test_copy_buffer_writes_missing_and_empty_as_null_fields():
+    df = pd.DataFrame({
+        "property_id": ["IMV-001", "IMV-002"],
+        "reservations_count": [3.0, np.nan],
+        "complaints_list": ["", 'limpeza, "wi-fi"'],
+        "owner_name": [None, "Ana"],
+    })
+    columns = {
+        "property_id": "TEXT",
+        "reservations_count": "INTEGER",
+        "complaints_list": "TEXT",
+        "owner_name": "TEXT",
+    }
+
+    lines = _to_copy_buffer(df, columns).getvalue().splitlines()
+
+    # Campos vazios sem aspas: o COPY (FORMAT csv) os lê como NULL
+    assert lines == ["IMV-001,3,,", 'IMV-002,,"limpeza, ""wi-fi""",Ana']
+
+
+@pytest.fixture
+def pg_loader():
+    if not DATABASE_URL:
+        pytest.skip("DATABASE_URL não configurada")
+    psycopg2 = pytest.importorskip("psycopg2")
+    from postgres_loader import PostgresDataLoader
+
+    # Schema descartável, para não tocar nas tabelas reais do banco
+    schema = f"test_fechamento_{uuid.uuid4().hex[:8]}"
+    admin = psycopg2.connect(DATABASE_URL)
+    admin.autocommit = True
+    admin.cursor().execute(f"CREATE SCHEMA {schema}")
+    sep = "&" if "?" in DATABASE_URL else "?"
+    if "://" in DATABASE_URL:
+        dsn = f"{DATABASE_URL}{sep}options=-csearch_path%3D{schema}"
+    else:
+        dsn = f"{DATABASE_URL} options='-csearch_path={schema}'"
+    loader = PostgresDataLoader(dsn)
+    try:
+        yield loader
+    finally:
+        loader.pool.closeall()
+        admin.cursor().execute(f"DROP SCHEMA {schema} CASCADE")
+        admin.close()
+
+
+def test_pg_save_all_history_and_rollups(pg_loader, summary_factory):
+    first = summary_factory("2025-10")
+    assert pg_loader.save_all(first) == {"2025-10": 1}
+
+    portfolio = pg_loader.get_rollup("portfolio", "2025-10").iloc[0]
+    assert portfolio["property_count"] == len(first)
+    assert portfolio["net_revenue_sum"] == pytest.approx(first["net_revenue"].sum())
+    city = pg_loader.get_rollup("city", "2025-10").set_index("city")
+    expected = first.groupby("city")["gross_revenue"].sum()
+    assert city["gross_revenue_sum"].to_dict() == pytest.approx(expected.to_dict())
+
+    corrected = first.copy()
+    corrected.loc[0, "net_revenue"] += 100.0
+    corrected = corrected.drop(index=5)
+    assert pg_loader.save_all(corrected) == {"2025-10": 2}
+
+    runs = pg_loader.list_runs("2025-10")
+    assert runs["run_id"].tolist() == [1, 2]
+    assert runs["row_count"].tolist() == [6, 5]
+    assert len(pg_loader.get_run("2025-10", 1)) == 6
+    assert pg_loader.get_portfolio_stats("2025-10")["total_properties"] == 5
+
+    diff = pg_loader.diff_runs("2025-10", 1).set_index("property_id")
+    assert diff["change"].to_dict() == {"IMV-000": "changed", "IMV-005": "removed"}
+
+
+@pytest.fixture(params=["sqlite", "postgres"])
+def any_loader(request, tmp_path):
+    if request.param == "postgres":
+        return request.getfixturevalue("pg_loader")
+    from data_loader import DataLoader
+
+    return DataLoader(str(tmp_path / "db.sqlite"))
+
+
+def test_save_all_keeps_last_duplicate_on_every_backend(any_loader, summary_factory):
+    df = summary_factory("2025-10", rows=3)
+    repeated = df.iloc[[0]].assign(net_revenue=999.0)
+
+    assert any_loader.save_all(pd.concat([df, repeated], ignore_index=True)) == {"2025-10": 1}
+
+    saved = any_loader.get_run("2025-10").set_index("property_id")
+    assert list(saved.index.sort_values()) == ["IMV-000", "IMV-001", "IMV-002"]
+    assert saved.loc["IMV-000", "net_revenue"] == pytest.approx(999.0)
+    assert any_loader.get_portfolio_stats("2025-10")["total_properties"] == 3
+
+
+def test_pg_save_all_writes_missing_values_as_null(pg_loader, summary_factory):
+    df = summary_factory("2025-10", rows=3)
+    df["complaints_list"] = ""
+    df.loc[1, "owner_name"] = np.nan
+
+    pg_loader.save_all(df)
+
+    saved = pg_loader.get_run("2025-10").set_index("property_id")
+    assert saved["complaints_list"].isna().all()
+    assert pd.isna(saved.loc["IMV-001", "owner_name"])
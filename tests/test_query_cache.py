@@ -0,0 +1,102 @@
+# tests/test_query_cache.py
+
+import sqlite3
+
+import pandas as pd
+
+from data_loader import DataLoader
+from query_cache import QueryCache, bump_data_versions, fetch_data_versions, normalize_sql, query_cache
+
+
+def test_normalize_sql():
+    assert normalize_sql("SELECT  *\n  FROM t ;") == "SELECT * FROM t"
+
+
+def test_entries_invalidated_by_month_version():
+    cache = QueryCache(max_entries=8, version_ttl=3600)
+    versions = {"2025-10": 1, "2025-09": 1, "*": 1}
+    calls = []
+
+    def read(month):
+        def execute():
+            calls.append(month)
+            return pd.DataFrame({"month": [month], "version": [versions[month]]})
+        return cache.get_or_execute("db", "SELECT ?", (month,), [month], execute, lambda: dict(versions))
+
+    read("2025-10")
+    read("2025-09")
+    read("2025-10")
+    assert calls == ["2025-10", "2025-09"]
+
+    # Gravação de outubro neste processo: só as consultas de outubro expiram
+    cache.invalidate("db", ["2025-10"])
+    read("2025-10")
+    read("2025-09")
+    assert calls == ["2025-10", "2025-09", "2025-10"]
+    assert cache.stats()["hits"] == 2
+
+
+def test_lru_eviction():
+    cache = QueryCache(max_entries=2, version_ttl=3600)
+    for sql in ("SELECT 1", "SELECT 2", "SELECT 3"):
+        cache.get_or_execute("db", sql, (), None, pd.DataFrame, dict)
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cached_result_is_a_copy():
+    cache = QueryCache(version_ttl=3600)
+    first = cache.get_or_execute("db", "SELECT 1", (), None, lambda: pd.DataFrame({"a": [1]}), dict)
+    first.loc[0, "a"] = 99
+    again = cache.get_or_execute("db", "SELECT 1", (), None, lambda: pd.DataFrame({"a": [2]}), dict)
+    assert again.loc[0, "a"] == 1
+
+
+def test_invalidate_matches_relative_and_absolute_db_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    cache = QueryCache(version_ttl=3600)
+    absolute = str(tmp_path / "db.sqlite")
+    cache.get_or_execute(absolute, "SELECT 1", (), ["2025-10"], lambda: pd.DataFrame({"a": [1]}), dict)
+
+    cache.invalidate("db.sqlite", ["2025-10"])
+
+    again = cache.get_or_execute(absolute, "SELECT 1", (), ["2025-10"], lambda: pd.DataFrame({"a": [2]}), dict)
+    assert again.loc[0, "a"] == 2
+
+
+def test_save_all_invalidates_only_saved_month(tmp_path, summary_factory):
+    loader = DataLoader(str(tmp_path / "db.sqlite"))
+    loader.save_all(summary_factory("2025-09"))
+    loader.save_all(summary_factory("2025-10"))
+
+    loader.get_top_properties("2025-09")
+    loader.get_top_properties("2025-10")
+    misses = query_cache.misses
+
+    corrected = summary_factory("2025-10")
+    corrected.loc[corrected["property_id"] == "IMV-000", "net_revenue"] = 1e9
+    loader.save_all(corrected)
+
+    assert loader.get_top_properties("2025-10", n=1) == ["IMV-000"]
+    loader.get_top_properties("2025-09")
+    assert query_cache.misses == misses + 1
+
+
+def test_external_write_seen_after_version_ttl(tmp_path, summary_factory):
+    db_path = str(tmp_path / "db.sqlite")
+    loader = DataLoader(db_path)
+    loader.save_all(summary_factory("2025-10"))
+    ttl = query_cache.version_ttl
+    query_cache.version_ttl = 0
+    try:
+        assert len(loader.get_run("2025-10")) == 6
+
+        # Outro processo grava direto no banco e incrementa a versão do mês
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("DELETE FROM monthly_summary_history WHERE property_id = 'IMV-000'")
+            bump_data_versions(conn.cursor(), ["2025-10"])
+            assert fetch_data_versions(conn)["2025-10"] == 2
+
+        assert len(loader.get_run("2025-10")) == 5
+    finally:
+        query_cache.version_ttl = ttl
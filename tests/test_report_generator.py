@@ -0,0 +1,66 @@
+# tests/test_report_generator.py
+
+import os
+
+import pandas as pd
+import pytest
+
+import report_generator
+from report_generator import ReportGenerator
+
+
+@pytest.fixture
+def generator(tmp_path, monkeypatch):
+    monkeypatch.setattr(report_generator, "OUTPUT_DIR", str(tmp_path))
+    return ReportGenerator(formats={"owner_statements": "csv"})
+
+
+def test_switching_format_removes_report_in_old_format(tmp_path, monkeypatch, summary_factory):
+    monkeypatch.setattr(report_generator, "OUTPUT_DIR", str(tmp_path))
+    df = summary_factory("2025-10")
+    csv_path = ReportGenerator(formats={"financial": "csv"}).generate_financial_report(df)
+
+    gz_path = ReportGenerator(formats={"financial": "csv.gz"}).generate_financial_report(df)
+
+    assert gz_path.endswith(".csv.gz") and os.path.exists(gz_path)
+    assert not os.path.exists(csv_path)
+    assert sorted(os.listdir(tmp_path)) == sorted(
+        [os.path.basename(gz_path), report_generator.MANIFEST_FILENAME]
+    )
+
+
+def test_render_charts_removes_charts_of_previous_data(generator, summary_factory):
+    pytest.importorskip("matplotlib")
+    generator.render_charts(summary_factory("2025-10"))
+
+    paths = generator.render_charts(summary_factory("2025-10", seed=1))
+
+    charts_dir = os.path.dirname(paths["financial"])
+    assert sorted(os.listdir(charts_dir)) == sorted(os.path.basename(p) for p in paths.values())
+
+
+def test_owner_statements_keep_separator_chars_in_names(generator, summary_factory):
+    df = summary_factory("2025-10", rows=4)
+    df["owner_name"] = ["Ana\x1cSilva", "Ana\x1cSilva", "Bruno Lima", "Carla\x85Souza"]
+
+    index = pd.read_csv(generator.generate_owner_statements(df))
+
+    for owner, path in zip(index["owner_name"], index["file"]):
+        statement = pd.read_csv(path)
+        assert statement["owner_name"].unique().tolist() == [owner]
+        assert sorted(statement["property_id"]) == sorted(df.loc[df["owner_name"] == owner, "property_id"])
+
+
+def test_owner_statements_remove_owners_that_left(generator, summary_factory):
+    df = summary_factory("2025-10")
+    first = pd.read_csv(generator.generate_owner_statements(df))
+    assert len(first) == 2
+
+    df["owner_name"] = "Proprietário 0"
+    index_path = generator.generate_owner_statements(df)
+
+    statements_dir = os.path.dirname(index_path)
+    assert sorted(os.listdir(statements_dir)) == sorted(
+        [os.path.basename(index_path)] + [os.path.basename(f) for f in pd.read_csv(index_path)["file"]]
+    )
+    assert len(os.listdir(statements_dir)) == 2